@@ -0,0 +1,311 @@
+"""
+
+    Latency and throughput benchmarks for the recommenders.
+
+    Author: Explore Data Science Academy.
+
+    Description: Drives `content_model` and `collab_model` with
+    reproducible movie_list workloads drawn from the same selectbox ranges
+    the Streamlit app offers, against the real dataset and synthetic
+    scaled-up copies of it. Each dataset scale runs in a fresh worker
+    process so start-up cost and peak RSS are measured in isolation.
+    Results (p50/p95/p99 latency, throughput, peak RSS, allocations) are
+    printed as a table and written as JSON for comparison across releases.
+
+    Usage (from the repository root):
+
+        python benchmarks/bench_recommenders.py --scales 1 10 100 \
+            --requests 200 --output bench_results.json
+
+"""
+# Script dependencies
+import argparse
+import json
+import os
+import platform
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join('resources', 'data')
+MODEL_DIR = os.path.join('resources', 'models')
+# Selectbox ranges of `title_list` offered by the app's Recommender page
+APP_RANGES = ((14930, 15200), (25055, 25255), (21100, 21200))
+ALGORITHMS = ('content', 'collab')
+
+
+def make_workload(title_list, n_requests, seed=0):
+    """Reproducible movie_list workloads drawn from the app's selectbox ranges.
+
+    Parameters
+    ----------
+    title_list : list (str)
+        Output of `load_movie_titles`.
+    n_requests : int
+        Number of three-movie requests to generate.
+    seed : int
+        Random seed.
+
+    Returns
+    -------
+    list (list (str))
+        One favourite-movie list per request.
+
+    """
+    rng = np.random.default_rng(seed)
+    options = [title_list[lo:hi] for lo, hi in APP_RANGES]
+    return [[opts[rng.integers(len(opts))] for opts in options] for _ in range(n_requests)]
+
+
+def _scaled_title(title, copy):
+    """Title of the `copy`-th synthetic duplicate, keeping the trailing year."""
+    if copy == 0:
+        return title
+    match = re.match(r'^(.*?)(\s*\(\d{4}\))?\s*$', title)
+    return f"{match.group(1)} {copy}{match.group(2) or ''}"
+
+
+def make_dataset(root, scale, movie_scale=1, seed=0):
+    """Write a synthetic scaled copy of the datasets under `root`.
+
+    Ratings are scaled by replicating every user `scale` times under new
+    user ids with jittered ratings; the catalogue is scaled by
+    `movie_scale` duplicated blocks of movies, with duplicated users
+    spread across the blocks.
+
+    Parameters
+    ----------
+    root : str
+        Directory laid out like the repository (resources/data, ...).
+    scale : int
+        Ratings multiplier.
+    movie_scale : int
+        Catalogue multiplier.
+    seed : int
+        Random seed.
+
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(os.path.join(root, DATA_DIR), exist_ok=True)
+    os.makedirs(os.path.join(root, MODEL_DIR), exist_ok=True)
+    movies = pd.read_csv(os.path.join(REPO_ROOT, DATA_DIR, 'movies.csv'))
+    ratings = pd.read_csv(os.path.join(REPO_ROOT, DATA_DIR, 'ratings.csv'))
+    movie_span = int(movies['movieId'].max()) + 1
+    user_span = int(ratings['userId'].max()) + 1
+    blocks = []
+    for copy in range(movie_scale):
+        block = movies.copy()
+        block['movieId'] += copy * movie_span
+        block['title'] = [_scaled_title(t, copy) for t in block['title']]
+        blocks.append(block)
+    pd.concat(blocks).to_csv(os.path.join(root, DATA_DIR, 'movies.csv'), index=False)
+    with open(os.path.join(root, DATA_DIR, 'ratings.csv'), 'w') as f:
+        f.write('userId,movieId,rating,timestamp\n')
+        for copy in range(scale):
+            chunk = ratings.copy()
+            if copy:
+                chunk['userId'] += copy * user_span
+                jitter = rng.choice([-0.5, 0.0, 0.0, 0.5], size=len(chunk))
+                chunk['rating'] = np.clip(chunk['rating'] + jitter, 0.5, 5.0)
+            chunk['movieId'] += (copy % movie_scale) * movie_span
+            chunk.to_csv(f, header=False, index=False)
+
+
+def make_model(root, n_factors=100, seed=0):
+    """Write a synthetic factor artifact matching the dataset under `root`.
+
+    Training is not what is being measured, so factors and biases are
+    drawn at random with the shapes a trained model would have.
+
+    """
+    sys.path.insert(0, REPO_ROOT)
+    from recommenders.model_store import export_factors
+    from recommenders.svd_scorer import SVDScorer
+    rng = np.random.default_rng(seed)
+    ratings = pd.read_csv(os.path.join(root, DATA_DIR, 'ratings.csv'),
+                          usecols=['userId', 'movieId', 'rating'])
+    users = ratings['userId'].unique()
+    items = ratings['movieId'].unique()
+    scorer = SVDScorer(ratings['rating'].mean(),
+                       rng.normal(0, 0.3, len(users)), rng.normal(0, 0.3, len(items)),
+                       rng.normal(0, 0.1, (len(users), n_factors)),
+                       rng.normal(0, 0.1, (len(items), n_factors)),
+                       users, items, (0.5, 5.0))
+    export_factors(scorer, os.path.join(root, MODEL_DIR, 'SVD.factors'))
+
+
+def _percentiles(latencies):
+    lat = np.asarray(latencies) * 1000.0
+    return {'p50_ms': float(np.percentile(lat, 50)), 'p95_ms': float(np.percentile(lat, 95)),
+            'p99_ms': float(np.percentile(lat, 99)), 'mean_ms': float(lat.mean()),
+            'max_ms': float(lat.max())}
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_worker(root, n_requests, warmup, threads, seed, alloc_requests):
+    """Benchmark both recommenders against the dataset under `root`.
+
+    Runs inside a fresh process whose working directory is `root`, so the
+    recommenders' relative resource paths resolve to that dataset.
+
+    Returns
+    -------
+    dict
+        Load times and per-algorithm measurements.
+
+    """
+    os.chdir(root)
+    sys.path.insert(0, REPO_ROOT)
+    result = {'load_s': {}}
+    t0 = time.perf_counter()
+    from utils.data_loader import load_movie_titles
+    title_list = load_movie_titles(os.path.join(DATA_DIR, 'movies.csv'))
+    result['load_s']['titles'] = time.perf_counter() - t0
+    models = {}
+    t0 = time.perf_counter()
+    from recommenders.content_based import content_model
+    models['content'] = content_model
+    result['load_s']['content'] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    from recommenders.collaborative_based import collab_model
+    models['collab'] = collab_model
+    result['load_s']['collab'] = time.perf_counter() - t0
+    result['rss_after_load_mb'] = _peak_rss_mb()
+    result['n_movies'] = len(title_list)
+
+    workload = make_workload(title_list, n_requests + warmup, seed)
+    for name, model in models.items():
+        for movie_list in workload[:warmup]:
+            model(movie_list, 10)
+        latencies = []
+
+        def timed(movie_list):
+            start = time.perf_counter()
+            model(movie_list, 10)
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        if threads > 1:
+            with ThreadPoolExecutor(threads) as pool:
+                latencies = list(pool.map(timed, workload[warmup:]))
+        else:
+            latencies = [timed(m) for m in workload[warmup:]]
+        elapsed = time.perf_counter() - start
+        stats = _percentiles(latencies)
+        stats['throughput_rps'] = n_requests / elapsed
+        # Allocation profile over a short, separate pass (tracemalloc is slow)
+        tracemalloc.start()
+        for movie_list in workload[warmup:warmup + alloc_requests]:
+            model(movie_list, 10)
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        stats['alloc_peak_mb'] = peak / 2 ** 20
+        stats['alloc_blocks_per_request'] = sum(
+            s.count for s in snapshot.statistics('filename')) / max(alloc_requests, 1)
+        stats['peak_rss_mb'] = _peak_rss_mb()
+        result[name] = stats
+    return result
+
+
+def run_scale(scale, args):
+    """Prepare the dataset for one scale and benchmark it in a subprocess."""
+    root = tempfile.mkdtemp(prefix=f'bench-{scale}x-')
+    try:
+        t0 = time.perf_counter()
+        if scale == 1 and args.movie_scale == 1:
+            os.makedirs(os.path.join(root, DATA_DIR))
+            for name in ('movies.csv', 'ratings.csv'):
+                shutil.copy(os.path.join(REPO_ROOT, DATA_DIR, name), os.path.join(root, DATA_DIR))
+            shutil.copytree(os.path.join(REPO_ROOT, MODEL_DIR), os.path.join(root, MODEL_DIR),
+                            ignore=shutil.ignore_patterns('*.py', '__pycache__'))
+            if not os.path.isdir(os.path.join(root, MODEL_DIR, 'SVD.factors')) and \
+                    not os.path.exists(os.path.join(root, MODEL_DIR, 'SVD.pkl')):
+                make_model(root, args.factors, args.seed)
+        else:
+            make_dataset(root, scale, args.movie_scale, args.seed)
+            make_model(root, args.factors, args.seed)
+        prepare_s = time.perf_counter() - t0
+        cmd = [sys.executable, os.path.abspath(__file__), '--worker', root,
+               '--requests', str(args.requests), '--warmup', str(args.warmup),
+               '--threads', str(args.threads), '--seed', str(args.seed),
+               '--alloc-requests', str(args.alloc_requests)]
+        # Measure the recommenders themselves, not the result cache
+        env = dict(os.environ, RESULT_CACHE_SIZE='0', RESULT_CACHE_PATH='')
+        out = subprocess.run(cmd, check=True, capture_output=True, text=True, env=env)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        result['scale'] = scale
+        result['movie_scale'] = args.movie_scale
+        result['prepare_s'] = prepare_s
+        return result
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+def format_table(results):
+    """Human-readable summary of benchmark results."""
+    lines = [f"{'scale':>6} {'algo':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+             f"{'req/s':>9} {'RSS MB':>8} {'alloc MB':>9}"]
+    for result in results:
+        for name in ALGORITHMS:
+            s = result[name]
+            lines.append(f"{result['scale']:>5}x {name:>8} {s['p50_ms']:9.2f} {s['p95_ms']:9.2f} "
+                         f"{s['p99_ms']:9.2f} {s['throughput_rps']:9.1f} {s['peak_rss_mb']:8.1f} "
+                         f"{s['alloc_peak_mb']:9.2f}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('Usage')[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=[1],
+                        help='ratings multipliers to benchmark (e.g. 1 10 100)')
+    parser.add_argument('--movie-scale', type=int, default=1,
+                        help='catalogue multiplier applied to every scaled dataset')
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--threads', type=int, default=1,
+                        help='concurrent callers used for the throughput run')
+    parser.add_argument('--alloc-requests', type=int, default=5)
+    parser.add_argument('--factors', type=int, default=100,
+                        help='factors of the synthetic models used for scaled datasets')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--keep', action='store_true', help='keep the generated datasets')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        result = run_worker(args.worker, args.requests, args.warmup, args.threads,
+                            args.seed, args.alloc_requests)
+        print(json.dumps(result))
+        return
+
+    results = [run_scale(scale, args) for scale in args.scales]
+    report = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+              'machine': platform.machine(), 'cpus': os.cpu_count(), 'args': vars(args),
+              'results': results}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=1)
+    print(format_table(results))
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""
+
+    Cold-start profile of the Streamlit entry point.
+
+    Author: Explore Data Science Academy.
+
+    Description: Replays, in fresh Python processes, what a cold start of
+    edsa_recommender.py costs: the app's own top-level imports (read from
+    the script, Streamlit itself excluded), then each lazily imported
+    recommender module in the order the background preload imports them.
+    Every run is made with `-X importtime`, so besides the wall time and
+    resident memory of each stage the report lists the modules with the
+    largest self import time and the data and model loads recorded in
+    `TRACER.loads`. Results are printed as tables and written as JSON;
+    the median over `--runs` processes is reported.
+
+    Usage (from the repository root):
+
+        python benchmarks/startup_profile.py --runs 3 --output startup_profile.json
+
+"""
+# Script dependencies
+import argparse
+import ast
+import importlib
+import json
+import os
+import platform
+import re
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(REPO_ROOT, 'edsa_recommender.py')
+# Imported lazily by the app, in preload order
+LAZY_STAGES = ('recommenders.popularity_based', 'recommenders.content_based',
+               'recommenders.collaborative_based', 'recommenders.hybrid_based')
+# "import time:      self [us] |  cumulative | imported package"
+_IMPORTTIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)')
+
+
+def app_imports(path=APP, exclude=('streamlit',)):
+    """Modules imported at the top level of the app script.
+
+    Parameters
+    ----------
+    path : str
+        Path to the Streamlit script.
+    exclude : tuple (str)
+        Top-level packages left out, e.g. Streamlit, which is not part of
+        the app's own start-up.
+
+    Returns
+    -------
+    list (str)
+        Module names, in import order.
+
+    """
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            names = [node.module]
+        else:
+            continue
+        modules += [n for n in names if n.split('.')[0] not in exclude and n not in modules]
+    return modules
+
+
+def _rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_worker(stages):
+    """Import each stage's modules in turn, timing every stage.
+
+    Runs inside a fresh process started with `-X importtime`.
+
+    Returns
+    -------
+    dict
+        Per-stage seconds and peak RSS, plus `TRACER.loads`.
+
+    """
+    os.chdir(REPO_ROOT)
+    sys.path.insert(0, REPO_ROOT)
+    result = {'stages': []}
+    for name, modules in stages:
+        start = time.perf_counter()
+        for module in modules:
+            importlib.import_module(module)
+        result['stages'].append({'stage': name, 'seconds': time.perf_counter() - start,
+                                 'rss_mb': _rss_mb()})
+    from utils.tracing import TRACER
+    result['loads'] = dict(TRACER.loads)
+    return result
+
+
+def parse_importtime(stderr):
+    """Self and cumulative import time (seconds) of each module in an
+    `-X importtime` log."""
+    times = {}
+    for line in stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if match:
+            times[match.group(4)] = (int(match.group(1)) / 1e6, int(match.group(2)) / 1e6)
+    return times
+
+
+def run_once(stages):
+    """Profile one cold start in a fresh interpreter."""
+    cmd = [sys.executable, '-X', 'importtime', os.path.abspath(__file__),
+           '--worker', json.dumps(stages)]
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True, env=env)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result['imports'] = parse_importtime(out.stderr)
+    return result
+
+
+def summarize(runs, top):
+    """Median stage times, loads and slowest modules over several runs."""
+    stages = [{'stage': s['stage'],
+               'seconds': float(np.median([r['stages'][i]['seconds'] for r in runs])),
+               'rss_mb': float(np.median([r['stages'][i]['rss_mb'] for r in runs]))}
+              for i, s in enumerate(runs[0]['stages'])]
+    loads = {name: float(np.median([r['loads'].get(name, np.nan) for r in runs]))
+             for name in runs[0]['loads']}
+    modules = {name: [float(np.median([r['imports'].get(name, (np.nan, np.nan))[k] for r in runs]))
+                      for k in (0, 1)]
+               for name in runs[0]['imports']}
+    slowest = sorted(modules.items(), key=lambda item: -item[1][0])[:top]
+    return {'stages': stages, 'loads': loads,
+            'slowest_imports': [{'module': m, 'self_s': s, 'cumulative_s': c}
+                                for m, (s, c) in slowest]}
+
+
+def format_report(summary):
+    """Human-readable tables of a summary."""
+    lines = [f"{'stage':<40} {'seconds':>8} {'total':>8} {'RSS MB':>8}"]
+    total = 0.0
+    for s in summary['stages']:
+        total += s['seconds']
+        lines.append(f"{s['stage']:<40} {s['seconds']:8.3f} {total:8.3f} {s['rss_mb']:8.1f}")
+    lines += ['', f"{'load (TRACER.loads)':<52} {'seconds':>8}"]
+    lines += [f"{name:<52} {seconds:8.3f}" for name, seconds in summary['loads'].items()]
+    lines += ['', f"{'module':<52} {'self s':>8} {'cumul s':>8}"]
+    lines += [f"{m['module']:<52} {m['self_s']:8.3f} {m['cumulative_s']:8.3f}"
+              for m in summary['slowest_imports']]
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('Usage')[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3, help='fresh processes to profile')
+    parser.add_argument('--top', type=int, default=15, help='slowest modules listed')
+    parser.add_argument('--output', default='startup_profile.json')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_worker(json.loads(args.worker))))
+        return
+
+    stages = [('app imports', app_imports())]
+    stages += [(f'import {module}', [module]) for module in LAZY_STAGES]
+    runs = [run_once(stages) for _ in range(args.runs)]
+    summary = summarize(runs, args.top)
+    report = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+              'machine': platform.machine(), 'cpus': os.cpu_count(), 'args': vars(args),
+              'summary': summary, 'runs': runs}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=1)
+    print(format_report(summary))
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
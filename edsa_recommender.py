@@ -28,14 +28,79 @@
 # Streamlit dependencies
 import streamlit as st
 
+# Start-up is timed from here; see the Diagnostics page
+import time
+_script_started = time.perf_counter()
+
 # Data handling dependencies
+import os
+import threading
 import pandas as pd
 import numpy as np
 
 # Custom Libraries
-from utils.data_loader import load_movie_titles
-from recommenders.collaborative_based import collab_model
-from recommenders.content_based import content_model
+from utils.data_loader import load_catalogue, load_genre_index, load_movie_titles
+from utils.lazy import lazy_module, preload
+from utils.model_registry import REGISTRIES, refresh_all, start_watcher
+from utils.executor import CancelToken, DeadlineExecutor, with_deadline
+from utils.tracing import TRACER
+from utils.result_cache import RESULT_CACHE, popular_combinations, warm_up
+from utils.memory import memory_report, process_rss
+from utils.title_search import TitleSearch
+from utils.eda_cube import load_eda_cube
+from service.client import RecommenderClient, ServiceError, ServiceUnavailable
+
+# The recommender modules load their data and models (and scikit-learn or
+# surprise) when imported, so they are only imported once first needed; one
+# instance per module and process, shared by every rerun and the preload
+popularity_based = lazy_module('recommenders.popularity_based')
+content_based = lazy_module('recommenders.content_based')
+collaborative_based = lazy_module('recommenders.collaborative_based')
+hybrid_based = lazy_module('recommenders.hybrid_based')
+
+# Set RECOMMENDER_SERVICE (e.g. http://127.0.0.1:8765 or unix:/tmp/recommender.sock)
+# to have a running `python -m service serve` recommend instead of this process
+RECOMMENDER_SERVICE = os.environ.get('RECOMMENDER_SERVICE')
+service_client = RecommenderClient(RECOMMENDER_SERVICE,
+                                   timeout=float(os.environ.get('RECOMMEND_TIMEOUT', 5))) \
+    if RECOMMENDER_SERVICE else None
+
+def recommend_remotely(algorithm, movie_list, top_n):
+    """Recommendations from the service; popular picks while it is unreachable."""
+    try:
+        return service_client.recommend(algorithm, movie_list, top_n)
+    except ServiceUnavailable:
+        return popularity_model(movie_list, top_n)
+
+def content_recommender(movie_list, top_n=10):
+    if service_client is not None:
+        return recommend_remotely('content', movie_list, top_n)
+    return content_based.content_model(movie_list, top_n)
+
+def collab_recommender(movie_list, top_n=10):
+    if service_client is not None:
+        return recommend_remotely('collab', movie_list, top_n)
+    return collaborative_based.collab_model(movie_list, top_n)
+
+def hybrid_recommender(movie_list, top_n=10):
+    if service_client is not None:
+        return recommend_remotely('hybrid', movie_list, top_n)
+    return hybrid_based.hybrid_model(movie_list, top_n)
+
+def popularity_model(movie_list, top_n=10):
+    return popularity_based.popularity_model(movie_list, top_n)
+
+# Background import of the recommenders once a page has been drawn: 'always',
+# 'recommender' (on the first visit to a page that recommends) or 'never'
+PRELOAD = os.environ.get('RECOMMENDER_PRELOAD', 'recommender')
+
+@st.cache(allow_output_mutation=True)
+def start_preload():
+    """Import the recommenders in the background, once per process."""
+    if service_client is not None:
+        # Only the fallback runs in this process
+        return preload([popularity_based])
+    return preload([popularity_based, content_based, collaborative_based, hybrid_based])
 
 # Changing the background
 import base64
@@ -63,15 +128,108 @@ def set_png_as_page_bg(png_file):
 set_png_as_page_bg('resources/imgs/Back_F.jpg')
 
 
-# Data Loading
-title_list = load_movie_titles('resources/data/movies.csv')
+# Data Loading, once per process rather than on every rerun
+@st.cache(allow_output_mutation=True)
+def get_title_list():
+    return load_movie_titles('resources/data/movies.csv')
+
+title_list = get_title_list()
+
+@st.cache(allow_output_mutation=True)
+def get_title_search(version=None):
+    """Type-ahead search over every title, most rated first (rebuilt for each
+    version of the rating data)."""
+    models = popularity_based.registry.current
+    popularity = models.rating_stats.lookup(models.title_index.ids, 'count')
+    return TitleSearch(title_list, popularity)
+
+# EDA aggregates, kept in a holder so a rebuilt cube can replace the cached one
+@st.cache(allow_output_mutation=True)
+def get_eda_cube():
+    return {'cube': load_eda_cube('resources/data/movies.csv', 'resources/data/ratings.csv',
+                                  load_catalogue('resources/data/movies.csv'),
+                                  load_genre_index('resources/data/movies.csv'))}
+
+def refresh_eda_cube():
+    """The EDA aggregates, caught up with ratings added since they were built."""
+    holder = get_eda_cube()
+    try:
+        holder['cube'].refresh('resources/data/ratings.csv')
+    except ValueError:
+        # The ratings file was rewritten: rebuild from scratch
+        holder['cube'] = load_eda_cube('resources/data/movies.csv', 'resources/data/ratings.csv',
+                                       load_catalogue('resources/data/movies.csv'),
+                                       load_genre_index('resources/data/movies.csv'))
+    return holder['cube']
+
+# Recommendations run on a bounded, process-wide pool under a deadline
+RECOMMEND_TIMEOUT = float(os.environ.get('RECOMMEND_TIMEOUT', 5))
+
+@st.cache(allow_output_mutation=True)
+def get_executor():
+    return DeadlineExecutor(max_workers=int(os.environ.get('RECOMMEND_WORKERS', 4)),
+                            max_pending=int(os.environ.get('RECOMMEND_QUEUE', 16)))
+
+def new_session_token():
+    """Cancel token of a new request, cancelling this session's previous one."""
+    previous = st.session_state.get('recommendation_token')
+    if previous is not None:
+        previous.cancel()
+    token = CancelToken()
+    st.session_state['recommendation_token'] = token
+    return token
+
+def notify_fallback(reason):
+    st.info("The recommender is busy right now, so here are some popular picks instead.")
+
+# The fallback answers when a deadline has already passed, so its (light) data
+# is loaded up front rather than in a request that is out of time
+popularity_based.load()
+
+# The Recommender page calls these: background versions of the recommenders
+# that fall back to the popularity list when the deadline passes
+content_model = with_deadline(content_recommender, get_executor(), RECOMMEND_TIMEOUT,
+                              popularity_model, new_session_token, notify_fallback)
+collab_model = with_deadline(collab_recommender, get_executor(), RECOMMEND_TIMEOUT,
+                             popularity_model, new_session_token, notify_fallback)
+hybrid_model = with_deadline(hybrid_recommender, get_executor(), RECOMMEND_TIMEOUT,
+                             popularity_model, new_session_token, notify_fallback)
+
+# Slices of title_list offered by the Recommender page's selection boxes
+SELECTION_RANGES = ((14930, 15200), (25055, 25255), (21100, 21200))
+
+@st.cache(allow_output_mutation=True)
+def start_cache_warm_up():
+    """Precompute the most popular combinations in the background, once per process."""
+    models = popularity_based.registry.current
+    popularity = models.rating_stats.lookup(models.title_index.ids, 'count')
+    combinations = popular_combinations(title_list, SELECTION_RANGES, popularity)
+    return warm_up([content_recommender, collab_recommender, hybrid_recommender], combinations)
+
+if os.environ.get('RESULT_CACHE_WARMUP') == '1':
+    start_cache_warm_up()
+
+# Seconds between checks for new data and model files, swapped in without a
+# restart (0 disables the checks)
+MODEL_RELOAD_INTERVAL = float(os.environ.get('MODEL_RELOAD_INTERVAL', 60))
+
+@st.cache(allow_output_mutation=True)
+def start_model_watcher():
+    """Check the loaded recommenders for new versions in the background, once per process."""
+    return start_watcher(MODEL_RELOAD_INTERVAL)
+
+if MODEL_RELOAD_INTERVAL > 0:
+    start_model_watcher()
+
+# Kept from the first script run of this process only
+TRACER.loads.setdefault('app start-up', time.perf_counter() - _script_started)
 
 # App declaration
 def main():
 
     # DO NOT REMOVE the 'Recommender System' option below, however,
     # you are welcome to add more options to enrich your app.
-    page_options = ["Home","Exploratory Data Analysis","Recommender System","Solution Overview","About The App"]
+    page_options = ["Home","Exploratory Data Analysis","Recommender System","Search the Catalogue","Solution Overview","About The App","Diagnostics"]
 
     # -------------------------------------------------------------------
     # ----------- !! THIS CODE MUST NOT BE ALTERED !! -------------------
@@ -124,6 +282,43 @@ def main():
     # -------------------------------------------------------------------
 
     # ------------- SAFE FOR ALTERING/EXTENSION -------------------
+    if page_selection == "Search the Catalogue":
+        st.write('# Movie Recommender Engine')
+        st.write('### Search the whole catalogue for your three favourite movies')
+        search = get_title_search(popularity_based.registry.current.tag)
+        algorithm = st.radio("Select an algorithm",
+                             ('Content Based Filtering',
+                              'Collaborative Based Filtering',
+                              'Hybrid Filtering'), key='search_algorithm',
+                             help="Hybrid Filtering blends content similarity, the "
+                                  "collaborative model and ratings.")
+
+        # Only the best matches of each query are sent to the page
+        fav_movies = []
+        for i, label in enumerate(('First', 'Second', 'Third')):
+            query = st.text_input(f'{label} movie', key=f'search_query_{i}',
+                                  help="Start typing a title; typos are fine.")
+            matches = search.search(query, limit=20)
+            if matches:
+                fav_movies.append(st.selectbox(f'{label} option', matches,
+                                               key=f'search_option_{i}'))
+            else:
+                st.warning("No movie matches that title.")
+
+        if len(fav_movies) == 3 and st.button("Recommend", key='search_recommend'):
+            recommend = {'Content Based Filtering': content_model,
+                         'Collaborative Based Filtering': collab_model,
+                         'Hybrid Filtering': hybrid_model}[algorithm]
+            try:
+                with st.spinner('Crunching the numbers...'):
+                    top_recommendations = recommend(movie_list=fav_movies, top_n=10)
+                st.title("We think you'll like:")
+                for i,j in enumerate(top_recommendations):
+                    st.subheader(str(i+1)+'. '+j)
+            except Exception:
+                st.error("Oops! Looks like this algorithm does't work.\
+                          We'll need to fix it!")
+
     if page_selection == "Solution Overview":
         title_SO = """
 	    <div style="background-color:#464e5f00;padding:10px;border-radius:10px;margin:10px;border-style:solid; border-color:#000000; padding: 1em;">
@@ -222,6 +417,8 @@ def main():
 
         sys_eda = st.radio("Choose an EDA section",
         ('Ratings','Movies','Directors','Genres','Actors'))
+        # Live aggregates of movies.csv and ratings.csv
+        cube = refresh_eda_cube()
         # Ratings option
         if sys_eda == "Ratings":
 
@@ -229,11 +426,14 @@ def main():
             op_ratings = st.radio("Choose an option under ratings",("User Rating distribution","Average rating per genre"))
 
             if op_ratings == "User Rating distribution":
-                st.image("resources/imgs/Ratings_Distribution_from_Users.png")
-                st.write("The ratings seems to be following a normal distribution with a mean of only 3.533395 and a median of 3.500000 and a mode of 4.000 but maximum values reaching as high as 5, which is almost 2 times greater than the mean. However, as can be seen from the distribution plot, almost all movies have a ratings score less than 5 (the 75th percentile is at 4.000000). It appears that Users are extremely generous in their ratings. The mean rating is only a 3.533395 on a scale of 5. Half the movies have a rating of greater than or equal to 3.0.")
+                st.bar_chart(cube.rating_distribution())
+                summary = cube.rating_summary()
+                st.write(f"The {summary['ratings']:,} ratings have a mean of {summary['mean']:.2f}, a median of {summary['median']:.1f} and a mode of {summary['mode']:.1f}, on a scale of 0.5 to 5. As can be seen from the distribution plot, users are generous in their ratings: whole-star ratings are far more common than half stars, and most ratings sit at 3 stars or above.")
 
             if op_ratings == "Average rating per genre":
-                st.image("resources/imgs/the_average_rating_per_genre_using_a_box-plot.png")
+                genres = cube.genre_summary()
+                st.bar_chart(genres['mean_rating'])
+                st.dataframe(genres[['ratings', 'mean_rating', 'q1', 'median', 'q3']].round(2))
                 st.write("Almost all the genres had the same distribution for rating on the box plot except for the  Firm Noir one which has a bigger distribution than the rest for some reason I haven't figured right now. ")
 
         # Genres option
@@ -244,7 +444,7 @@ def main():
 
             if op_genre == "Treemap of movie genres":
             
-                st.image('resources/imgs/Treemap_G1.png',use_column_width=True)
+                st.bar_chart(cube.genre_summary()['movies'].sort_values(ascending=False))
                 st.write("The dominance of drama as a genre is not surprising when we consider the following:Drama is the cheapest genre to produce as movies don’t necessarily require special sets, costumes, locations, props, special/visual effects, etc. Drama has the broadest definition of all genres – everything that happens anywhere ever is a drama. Conversely, other genres have a higher bar for classification, such as the need for high-octane events for a movie to be classed as Action, scary events to be Horror, funny elements to be a Comedy, etc")
 
 
@@ -268,11 +468,12 @@ def main():
 
 
             if op_movie == "Total movies released per year":
-                st.image("resources/imgs/Total_movies_released_per_year.png")
+                st.line_chart(cube.releases_per_year())
                 st.write("It appears that 2015, 2016, 2014, 2017 and 2013 are the most popular years when it comes to movie releases in that order. In Hollywood circles, this is also known as the the dump years when sub par movies are released by the dozen. Global film production is booming, thanks in large part to new technologies. It’s cheaper and easier than ever before to shoot, edit and distribute a feature film, not to mention the effect of the internet in sharing ideas, knowledge and advice. It’s not possible to give a definitive figure for the exact number of films made each year but the growth can be seen from the graph above. And the consumption of movies is way higher than before so to meet the demand then more movies are released.")
 
             if op_movie == "All time Popular Movies by ratings":
-                st.image("resources/imgs/Top_15_All_time_Popular_Movies_by_ratings.png")
+                st.table(cube.top_movies(15, title_index=popularity_based.registry.current.title_index)
+                         .round(2).reset_index(drop=True))
                 st.write("The Shawshank Redemption(1994) Is a hollywood classic. It is a simple movie with a deep and everlasting message. Not only do the performance of Freeman and Robbins rank among the best of all time, but Shawshank is filled with brilliantly realised supporting characters who surprise and enthrall in equal measures. Tim Robbins and Morgan Freeman have given an outstanding performance which enhance the overall impact of the movie. Meanwhile, Pulp Fiction and The Shawshank Redemption each received seven awards. Forrest Gump is a timeless classic and it is deservedly so. It is the perfect movie to watch when you're in the mood for a little soul-searching. The story about one man's incredible and unexpected life journey is as significant now as it was when the film was first released in 1994. This movie is superbly acted, has great themes, some hilarious humor, a well written and interesting story, beautiful music by Alan Silvestri, a fantastic late twentieth century themed soundtrack and meaningful characters. The movie won the best picture Oscar, earned 677 million dollars around the world and is hailed by many as a modern classic filled with homespun catchphrases like 'My momma always said life was like a box of chocolates. you never know what you're gonna get'")
 
             if op_movie == "Wordcloud of the titles of the movies":
@@ -293,6 +494,105 @@ def main():
 
 
 
+    # Diagnostics
+    if page_selection == "Diagnostics":
+        st.title("Diagnostics")
+        st.write("Timings recorded by the recommenders since this app process started.")
+
+        if service_client is not None:
+            st.subheader("Recommendation service")
+            try:
+                st.write(f"Recommendations come from {RECOMMENDER_SERVICE}:",
+                         service_client.health())
+            except ServiceError as e:
+                st.warning(f"{RECOMMENDER_SERVICE} is unreachable ({e}); "
+                           "popular picks are served instead.")
+
+        st.subheader("Start-up, imports and loading")
+        st.write("Recommender modules are imported on first use or by the background "
+                 f"preload (RECOMMENDER_PRELOAD={PRELOAD}).")
+        loads = pd.DataFrame({'seconds': pd.Series(TRACER.loads)}).round(3)
+        st.table(loads)
+
+        st.subheader("Result cache")
+        st.table(pd.DataFrame([RESULT_CACHE.stats()]))
+
+        st.subheader("Deadline fallbacks")
+        st.table(pd.DataFrame([get_executor().stats()]))
+
+        st.subheader("Memory")
+        st.write(f"Process resident memory: {process_rss() / 2 ** 20:.1f} MB. "
+                 "Memory-mapped data is shared by every app process on the host.")
+        # Only what has been loaded so far
+        structures = {'catalogue': load_catalogue('resources/data/movies.csv'),
+                      'title_list': title_list,
+                      'genre_index': load_genre_index('resources/data/movies.csv')}
+        if popularity_based.loaded:
+            models = popularity_based.registry.current
+            structures.update(title_index=models.title_index, rating_stats=models.rating_stats,
+                              title_search=get_title_search(models.tag))
+        if content_based.loaded:
+            structures.update(content_similarity=content_based.registry.current.content_similarity)
+        if collaborative_based.loaded:
+            models = collaborative_based.registry.current
+            structures.update(rating_matrix=models.rating_matrix, svd_scorer=models.scorer)
+        if hybrid_based.loaded:
+            structures.update(hybrid_ranker=hybrid_based.registry.current.ranker)
+        st.table(memory_report(structures))
+
+        st.subheader("Model versions")
+        if MODEL_RELOAD_INTERVAL > 0:
+            st.write(f"New data and model files are checked for every {MODEL_RELOAD_INTERVAL:g} s "
+                     "and swapped in once loaded and validated; requests already running "
+                     "finish on the version they started with.")
+        else:
+            st.write("Checks for new data and model files are off (MODEL_RELOAD_INTERVAL=0).")
+        if REGISTRIES:
+            st.table(pd.DataFrame([registry.status() for registry in REGISTRIES])
+                     .set_index('registry'))
+            if st.button("Check for new models now"):
+                # Built in the background; the table shows them once swapped in
+                threading.Thread(target=refresh_all, name='model-refresh', daemon=True).start()
+                st.info("Checking for new versions; refresh the page in a moment.")
+            history = [dict(registry=registry.name, **event)
+                       for registry in REGISTRIES for event in registry.history]
+            st.dataframe(pd.DataFrame(history).sort_values('time', ascending=False))
+        else:
+            st.info("No recommender has been loaded yet.")
+
+        window = st.slider("Recent requests to include", 10, TRACER.requests.maxlen, 200)
+        algorithm = st.radio("Algorithm", ('content_model', 'collab_model', 'hybrid_model'))
+        durations = TRACER.stage_durations(algorithm, window)
+        if not durations:
+            st.info("No requests recorded yet. Generate some recommendations first.")
+        else:
+            summary = pd.DataFrame({stage: {'requests': len(values),
+                                            'p50_ms': np.percentile(values, 50),
+                                            'p95_ms': np.percentile(values, 95),
+                                            'max_ms': values.max()}
+                                    for stage, values in durations.items()}).T.round(2)
+            st.table(summary)
+
+            stage = st.selectbox("Stage", list(durations))
+            counts, edges = TRACER.histogram(stage, algorithm, window)
+            labels = [f'{lo:.2f}-{hi:.2f} ms' for lo, hi in zip(edges[:-1], edges[1:])]
+            st.bar_chart(pd.DataFrame({'requests': counts}, index=labels))
+
+            st.subheader("Slowest recent requests")
+            slowest = TRACER.slowest(10, algorithm, window)
+            st.dataframe(pd.DataFrame([t.as_dict() for t in slowest]))
+
+        errors = TRACER.errors()
+        if errors:
+            st.subheader("Recent errors")
+            st.dataframe(pd.DataFrame([t.as_dict() for t in errors]))
+
+    # The page is drawn: import the recommenders in the background
+    if PRELOAD == 'always' or (PRELOAD == 'recommender' and
+                               page_selection in ("Recommender System", "Search the Catalogue")):
+        start_preload()
+    TRACER.loads.setdefault('first page', time.perf_counter() - _script_started)
+
 
 if __name__ == '__main__':
     main()
@@ -28,25 +28,68 @@
 """
 
 # Script dependencies
+import os
 import pandas as pd
 import numpy as np
-import scipy as sp
-import pickle
-import copy
-from surprise import Reader, Dataset
-from surprise import SVD, NormalPredictor, BaselineOnly, KNNBasic, NMF
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import CountVectorizer
-
-# Importing data
-movies_df = pd.read_csv('resources/data/movies.csv',sep = ',')
-ratings_df = pd.read_csv('resources/data/ratings.csv')
-ratings_df.drop(['timestamp'], axis=1,inplace=True)
-
-# We make use of an SVD model trained on a subset of the MovieLens 10k dataset.
-model=pickle.load(open('resources/models/SVD.pkl', 'rb'))
-
-def prediction_item(item_id):
+from utils.data_loader import load_title_index
+from recommenders.svd_scorer import top_k
+from recommenders.model_store import load_model_artifact
+from utils.rating_matrix import load_rating_matrix, cosine_to_columns
+from utils.tracing import TRACER, stage, traced
+from utils.model_registry import ModelRegistry, file_fingerprint
+from utils.result_cache import cached
+
+# Scoring mode used by `collab_model`: 'fold_in' solves for the app user's own
+# latent vector, 'neighbourhood' goes through similar dataset users instead.
+COLLAB_MODE = os.environ.get('COLLAB_MODE', 'fold_in')
+# Regularization of the fold-in least-squares solve
+FOLD_IN_REG = 0.1
+
+def load_models():
+    """Title index, rating matrix and SVD model."""
+    # Importing data (shared with the rest of the app, loaded once per version)
+    # Title lookups shared with the content-based recommender
+    title_index = load_title_index('resources/data/movies.csv')
+    # Sparse user-by-item ratings, persisted and rebuilt only when ratings.csv changes
+    with TRACER.load('rating matrix'):
+        rating_matrix = load_rating_matrix('resources/data/ratings.csv')
+    # We make use of an SVD model trained on a subset of the MovieLens 10k dataset.
+    # Only its biases, factors and id maps are kept, memory-mapped read-only from a
+    # compact artifact (converted once from SVD.pkl whenever the pickle is newer).
+    with TRACER.load('SVD model'):
+        scorer = load_model_artifact('resources/models/SVD.factors', 'resources/models/SVD.pkl')
+    # Rated movies missing from the catalogue can never be recommended by title
+    uncatalogued = scorer.item_ids[title_index.rows(scorer.item_ids) < 0]
+    return {'title_index': title_index, 'rating_matrix': rating_matrix, 'scorer': scorer,
+            'uncatalogued': uncatalogued}
+
+def data_fingerprint():
+    return file_fingerprint('resources/data/movies.csv', 'resources/data/ratings.csv',
+                            'resources/models/SVD.pkl', 'resources/models/SVD.factors/meta.json')
+
+def validate(models):
+    """Reject an SVD model that is broken or does not fit the catalogue."""
+    scorer = models.scorer
+    if scorer.n_items == 0 or not (np.isfinite(scorer.qi).all() and np.isfinite(scorer.bi).all()):
+        raise ValueError("SVD model has no items or non-finite parameters")
+    known = scorer.item_ids[models.title_index.rows(scorer.item_ids) >= 0]
+    if len(known) == 0:
+        raise ValueError("no movie of the SVD model is in the catalogue")
+    # A request for a few known movies must come back with recommendations
+    bu, pu = scorer.fold_in(known[:3].tolist(), reg=FOLD_IN_REG)
+    top_ids, _ = scorer.top_items_for_vector(bu, pu, k=10, exclude=known[:3].tolist())
+    if len(top_ids) == 0:
+        raise ValueError("SVD model recommends nothing")
+
+# Swapped for a new version when the data files or the SVD model change
+registry = ModelRegistry('collab', load_models, data_fingerprint, validate)
+registry.load()
+
+def model_version():
+    """Version token of the data, model and scoring mode behind results."""
+    return f"{registry.current.tag}/{COLLAB_MODE}"
+
+def prediction_item(item_id, models=None):
     """Map a given favourite movie to users within the
        MovieLens dataset with the same preference.
 
@@ -54,24 +97,21 @@ def prediction_item(item_id):
     ----------
     item_id : int
         A MovieLens Movie ID.
+    models : ModelVersion, optional
+        Collaborative models to use; the active version by default.
 
     Returns
     -------
-    list
-        User IDs of users with similar high ratings for the given movie.
+    Pandas Dataframe
+        Predicted rating ('est') of the movie for every user ('uid').
 
     """
-    # Data preprosessing
-    reader = Reader(rating_scale=(0, 5))
-    load_df = Dataset.load_from_df(ratings_df,reader)
-    a_train = load_df.build_full_trainset()
+    scorer = (registry.current if models is None else models).scorer
+    # Score the movie for every user of the trainset in one batch
+    est = scorer.score_items([item_id])[:, 0]
+    return pd.DataFrame({'uid': scorer.user_ids, 'est': est})
 
-    predictions = []
-    for ui in a_train.all_users():
-        predictions.append(model.predict(iid=item_id,uid=ui, verbose = False))
-    return predictions
-
-def pred_movies(movie_list):
+def pred_movies(movie_list, models=None):
     """Maps the given favourite movies selected within the app to corresponding
     users within the MovieLens dataset.
 
@@ -79,6 +119,8 @@ def pred_movies(movie_list):
     ----------
     movie_list : list
         Three favourite movies selected by the app user.
+    models : ModelVersion, optional
+        Collaborative models to use; the active version by default.
 
     Returns
     -------
@@ -86,21 +128,163 @@ def pred_movies(movie_list):
         User-ID's of users with similar high ratings for each movie.
 
     """
+    models = registry.current if models is None else models
+    title_index, scorer = models.title_index, models.scorer
     # Store the id of users
     id_store=[]
     # For each movie selected by a user of the app,
     # predict a corresponding user within the dataset with the highest rating
     for i in movie_list:
-        predictions = prediction_item(item_id = i)
-        predictions.sort(key=lambda x: x.est, reverse=True)
         # Take the top 10 user id's from each movie with highest rankings
-        for pred in predictions[:10]:
-            id_store.append(pred.uid)
+        top_users, _ = scorer.top_users(title_index.movie_id(i), k=10)
+        id_store.extend(top_users.tolist())
     # Return a list of user id's
     return id_store
 
+def fold_in_model(movie_list, top_n=10, models=None):
+    """Recommends movies from a latent vector folded in for the app user.
+
+    The favourite movies are treated as top-rated items, a user bias and
+    factor vector are solved for against their (fixed) item factors, and
+    every item is ranked with one matrix-vector product.
+
+    Parameters
+    ----------
+    movie_list : list (str)
+        Favorite movies chosen by the app user.
+    top_n : int
+        Number of top recommendations to return to the user.
+    models : ModelVersion, optional
+        Collaborative models to use; the active version by default.
+
+    Returns
+    -------
+    list (str)
+        Titles of the top-n movie recommendations to the user.
+
+    """
+    models = registry.current if models is None else models
+    title_index, scorer = models.title_index, models.scorer
+    with stage('preprocessing') as s:
+        chosen_ids = [title_index.movie_id(j) for j in movie_list]
+        # Every catalogue entry sharing a chosen title is excluded
+        excluded = [m for j in movie_list for m in title_index.movie_ids(j)]
+        excluded.extend(models.uncatalogued.tolist())
+        s.rows = len(excluded)
+    with stage('model scoring') as s:
+        # Fold in, then score and select over every item in one pass
+        bu, pu = scorer.fold_in(chosen_ids, reg=FOLD_IN_REG)
+        top_ids, _ = scorer.top_items_for_vector(bu, pu, k=top_n, exclude=excluded)
+        s.rows = scorer.n_items
+    with stage('ranking'):
+        return title_index.titles_of(top_ids)
+
+@traced('fold_in_batch')
+def fold_in_batch(movie_lists, top_n=10, models=None):
+    """`fold_in_model` for several requests at once.
+
+    Each request is folded in on its own, but every item is scored for all
+    of them with one matrix product, which is cheaper than one
+    matrix-vector product per request.
+
+    Parameters
+    ----------
+    movie_lists : list (list (str))
+        Favorite movies of each request.
+    top_n : int
+        Number of top recommendations per request.
+    models : ModelVersion, optional
+        Collaborative models to use; the active version by default.
+
+    Returns
+    -------
+    list (list (str))
+        Titles of the top-n movie recommendations of each request.
+
+    """
+    models = registry.current if models is None else models
+    title_index, scorer = models.title_index, models.scorer
+    with stage('preprocessing') as s:
+        vectors = [scorer.fold_in([title_index.movie_id(j) for j in movie_list], reg=FOLD_IN_REG)
+                   for movie_list in movie_lists]
+        s.rows = len(vectors)
+    with stage('model scoring') as s:
+        scores = scorer.score_vectors([bu for bu, _ in vectors], [pu for _, pu in vectors],
+                                     clip=False)
+        s.rows = scores.size
+    with stage('ranking'):
+        recommended = []
+        for movie_list, row in zip(movie_lists, scores):
+            # Every catalogue entry sharing a chosen title is excluded
+            excluded = [m for j in movie_list for m in title_index.movie_ids(j)]
+            excluded.extend(models.uncatalogued.tolist())
+            rows = scorer.item_rows(excluded)
+            row[rows[rows >= 0]] = -np.inf
+            best = top_k(row, top_n)
+            best = best[np.isfinite(row[best])]
+            recommended.append(title_index.titles_of(scorer.item_ids[best]))
+        return recommended
+
+def neighbourhood_model(movie_list, top_n=10, models=None):
+    """Recommends movies rated by dataset users predicted to like the
+       app user's favourites, ranked by item-item similarity.
+
+    Parameters
+    ----------
+    movie_list : list (str)
+        Favorite movies chosen by the app user.
+    top_n : int
+        Number of top recommendations to return to the user.
+    models : ModelVersion, optional
+        Collaborative models to use; the active version by default.
+
+    Returns
+    -------
+    list (str)
+        Titles of the top-n movie recommendations to the user.
+
+    """
+    models = registry.current if models is None else models
+    title_index, scorer, rating_matrix = models.title_index, models.scorer, models.rating_matrix
+    with stage('model scoring') as s:
+        users_ids = pred_movies(movie_list, models)
+        chosen_ids = [title_index.movie_id(j) for j in movie_list]
+        s.rows = len(users_ids)
+    with stage('candidate filtering') as s:
+        # Slice the neighbour users' ratings straight out of the sparse matrix
+        neighbours = np.unique(users_ids)
+        rows = rating_matrix.user_rows(neighbours)
+        neighbours, rows = neighbours[rows >= 0], rows[rows >= 0]
+        util_matrix = rating_matrix.csr[rows]
+        # Chosen movies over the same users: actual ratings, else the model's predictions
+        query = scorer.score_items(chosen_ids, neighbours)
+        cols = rating_matrix.item_cols(chosen_ids)
+        known = cols >= 0
+        rated = util_matrix[:, cols[known]].toarray()
+        query[:, known] = np.where(rated > 0, rated, query[:, known])
+        s.rows = util_matrix.nnz
+    with stage('similarity') as s:
+        # Item-item cosine similarity of every candidate against the chosen movies,
+        # computed sparsely over the neighbours' ratings
+        similarity = cosine_to_columns(util_matrix, query).max(axis=1)
+        s.rows = len(similarity)
+    with stage('ranking'):
+        # Removing chosen movies, movies none of the neighbours rated and
+        # movies missing from the catalogue
+        similarity[cols[known]] = -np.inf
+        similarity[util_matrix.getnnz(axis=0) == 0] = -np.inf
+        similarity[title_index.rows(rating_matrix.item_ids) < 0] = -np.inf
+        top_cols = top_k(similarity, top_n)
+        top_cols = top_cols[np.isfinite(similarity[top_cols])]
+        # Get titles of recommended movies
+        recommended_movies = title_index.titles_of(rating_matrix.item_ids[top_cols])
+    # Return list of movies
+    return recommended_movies
+
 # !! DO NOT CHANGE THIS FUNCTION SIGNATURE !!
 # You are, however, encouraged to change its content.  
+@traced('collab_model')
+@cached('collab_model', model_version)
 def collab_model(movie_list,top_n=10):
     """Performs Collaborative filtering based upon a list of movies supplied
        by the app user.
@@ -118,62 +302,30 @@ def collab_model(movie_list,top_n=10):
         Titles of the top-n movie recommendations to the user.
 
     """
-    
-    names = movies_df.copy()
-    names.set_index('movieId',inplace=True)
-    indices = pd.Series(names['title'])
-    users_ids = pred_movies(movie_list)
-    # Get movie IDs and ratings for top users
-    df_init_users = ratings_df[ratings_df['userId']==users_ids[0]]
-    for i in users_ids[1:]:
-        df_init_users = df_init_users.append(ratings_df[ratings_df['userId']==i])
-    # Include predictions for chosen movies
-    for j in movie_list:
-        a = pd.DataFrame(prediction_item(j))
-        for i in set(df_init_users['userId']):
-            mid = indices[indices == j].index[0]
-            est = a['est'][a['uid']==i].values[0]
-            df_init_users = df_init_users.append(pd.Series([int(i),int(mid),est], index=['userId','movieId','rating']), ignore_index=True)
-    # Remove duplicate entries
-    df_init_users.drop_duplicates(inplace=True)
-    #Create pivot table
-    util_matrix = df_init_users.pivot_table(index=['userId'], columns=['movieId'], values='rating')
-    # Fill Nan values with 0's and save the utility matrix in scipy's sparse matrix format
-    util_matrix.fillna(0, inplace=True)
-    util_matrix_sparse = sp.sparse.csr_matrix(util_matrix.values)
-    # Compute the similarity matrix using the cosine similarity metric
-    user_similarity = cosine_similarity(util_matrix_sparse.T)
-    # Save the matrix as a dataframe to allow for easier indexing
-    user_sim_df = pd.DataFrame(user_similarity, index = util_matrix.columns, columns = util_matrix.columns)
-    user_similarity = cosine_similarity(np.array(df_init_users), np.array(df_init_users))
-    user_sim_df = pd.DataFrame(user_similarity, index = df_init_users['movieId'].values.astype(int), columns = df_init_users['movieId'].values.astype(int))
-    # Remove duplicate rows from matrix
-    user_sim_df = user_sim_df.loc[~user_sim_df.index.duplicated(keep='first')]
-    # Transpose matrix
-    user_sim_df = user_sim_df.T
-    # Find IDs of chosen load_movie_titles
-    idx_1 = indices[indices == movie_list[0]].index[0]
-    idx_2 = indices[indices == movie_list[1]].index[0]
-    idx_3 = indices[indices == movie_list[2]].index[0]
-    # Creating a Series with the similarity scores in descending order
-    rank_1 = user_sim_df[idx_1]
-    rank_2 = user_sim_df[idx_2]
-    rank_3 = user_sim_df[idx_3]
-    # Calculating the scores
-    score_series_1 = pd.Series(rank_1).sort_values(ascending = False)
-    score_series_2 = pd.Series(rank_2).sort_values(ascending = False)
-    score_series_3 = pd.Series(rank_3).sort_values(ascending = False)
-    # Appending the names of movies
-    listings = score_series_1.append(score_series_2).append(score_series_3).sort_values(ascending = False)
-    # Choose top 50
-    top_50_indexes = list(listings.iloc[1:50].index)
-    # Removing chosen movies
-    top_indexes = np.setdiff1d(top_50_indexes,[idx_1,idx_2,idx_3])
-    # Get titles of recommended movies
-    recommended_movies = []
-    for i in top_indexes[:top_n]:
-        recommended_movies.append(list(movies_df[movies_df['movieId']==i]['title']))
-    # Return list of movies
-    recommended_movies = [val for sublist in recommended_movies for val in sublist]
-    return recommended_movies
+    # The version is held until the request is done, even if a newer one is swapped in
+    with registry.use() as models:
+        if COLLAB_MODE == 'neighbourhood':
+            return neighbourhood_model(movie_list, top_n, models)
+        return fold_in_model(movie_list, top_n, models)
+
+def collab_model_batch(movie_lists, top_n=10):
+    """`collab_model` for several requests; in fold-in mode they share one
+    scoring pass (bypassing the result cache).
 
+    Parameters
+    ----------
+    movie_lists : list (list (str))
+        Favorite movies of each request.
+    top_n : int
+        Number of top recommendations per request.
+
+    Returns
+    -------
+    list (list (str))
+        Titles of the top-n movie recommendations of each request.
+
+    """
+    if COLLAB_MODE == 'neighbourhood':
+        return [collab_model(movie_list, top_n) for movie_list in movie_lists]
+    with registry.use() as models:
+        return fold_in_batch(movie_lists, top_n, models)
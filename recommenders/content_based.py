@@ -29,15 +29,57 @@
 
 # Script dependencies
 import os
-import pandas as pd
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import CountVectorizer
+from utils.data_loader import load_catalogue, load_genre_index, load_title_index
+from utils.tracing import TRACER, stage, traced
+from utils.model_registry import ModelRegistry, file_fingerprint
+from utils.result_cache import cached
+from recommenders.content_similarity import ContentSimilarity, load_neighbour_table
+from recommenders import popularity_based
 
-# Importing data
-movies = pd.read_csv('resources/data/movies.csv', sep = ',')#,delimiter=',')
-ratings = pd.read_csv('resources/data/ratings.csv')
-movies.dropna(inplace=True)
+def load_models():
+    """Catalogue, title and genre indexes and content features."""
+    # Importing data (shared with the rest of the app, loaded once per version);
+    # the compact catalogue keeps titles memory-mapped and genres dictionary-encoded
+    catalogue = load_catalogue('resources/data/movies.csv')
+    # Title lookups shared with the collaborative recommender
+    title_index = load_title_index('resources/data/movies.csv')
+    # Genre bitmasks built once at load time; rows follow the order of `catalogue`
+    genre_index = load_genre_index('resources/data/movies.csv')
+    # TF-IDF content features; rows follow the order of `catalogue`. The precomputed
+    # neighbour table is used when present (build it with
+    # `python -m recommenders.content_similarity`)
+    with TRACER.load('content similarity'):
+        content_similarity = ContentSimilarity.from_movies(catalogue.titles, catalogue.genres)
+        content_similarity.neighbours = load_neighbour_table(
+            'resources/models/content_neighbours.npz', title_index.ids)
+    return {'catalogue': catalogue, 'title_index': title_index, 'genre_index': genre_index,
+            'content_similarity': content_similarity}
+
+def data_fingerprint():
+    return file_fingerprint('resources/data/movies.csv', 'resources/models/content_neighbours.npz')
+
+def validate(models):
+    """Reject content features that do not line up with the catalogue."""
+    if len(models.catalogue) == 0 or models.content_similarity.n_movies != len(models.catalogue):
+        raise ValueError("content features do not match the catalogue")
+
+# Swapped for a new version when movies.csv or the neighbour table change; the
+# rating aggregates come from the popularity recommender's active version
+registry = ModelRegistry('content', load_models, data_fingerprint, validate)
+registry.load()
+
+# Scoring mode used by `content_model`: 'similarity' ranks by content
+# similarity, 'genre' narrows the catalogue by the favourites' genres instead.
+CONTENT_MODE = os.environ.get('CONTENT_MODE', 'similarity')
+# Most similar movies re-ranked with their ratings
+SIMILARITY_POOL = 50
+# Weight of the damped mean rating (relative to the global mean) in that re-ranking
+RATING_WEIGHT = 0.1
+
+def content_version():
+    """Version token of the data and scoring mode behind results."""
+    return f"{registry.current.tag}/{popularity_based.registry.current.tag}/{CONTENT_MODE}"
 
 #def data_preprocessing(subset_size):
 #    """Prepare data for use within Content filtering algorithm.
@@ -129,8 +171,102 @@ def data_preprocessing(df):
     movies['genres'] = movies['genres'].apply(str).apply(lambda x: x.split('|'))
     return movies
 
+def genre_filter_model(movie_list, top_n=10, models=None, rating_stats=None):
+    """Recommends the best rated movies sharing the favourites' genres.
+
+    Parameters
+    ----------
+    movie_list : list (str)
+        Favorite movies chosen by the app user.
+    top_n : int
+        Number of top recommendations to return to the user.
+    models : ModelVersion, optional
+        Content models to use; the active version by default.
+    rating_stats : RatingStats, optional
+        Rating aggregates to use; the popularity recommender's by default.
+
+    Returns
+    -------
+    list (str)
+        Titles of the top-n movie recommendations to the user.
+
+    """
+    models = registry.current if models is None else models
+    if rating_stats is None:
+        rating_stats = popularity_based.registry.current.rating_stats
+    catalogue, title_index, genre_index = models.catalogue, models.title_index, models.genre_index
+    with stage('preprocessing') as s:
+        # Sorted union of the favourite movies' genres
+        genre_list = genre_index.genres_of([title_index.title_row(i) for i in movie_list])
+        # Exclude every row sharing a chosen title
+        remaining = np.ones(len(catalogue), dtype=bool)
+        remaining[[r for i in movie_list for r in title_index.title_rows(i)]] = False
+        candidates = np.flatnonzero(remaining)
+        s.rows = len(candidates)
+    with stage('candidate filtering') as s:
+        # Narrow the remaining catalogue genre by genre via posting-list intersections
+        candidates = genre_index.narrow(genre_list, candidates, top_n)
+        candidate_ids = title_index.ids[candidates]
+        s.rows = len(candidates)
+
+    with stage('model scoring') as s:
+        # Score rated candidates by damped mean rating and genre overlap
+        rated = candidates[rating_stats.lookup(candidate_ids, 'count') > 0]
+        scores = rating_stats.lookup(title_index.ids[rated], 'damped_mean')
+        overlap = genre_index.overlap(genre_list, rated)
+        s.rows = len(rated)
+    with stage('ranking'):
+        # Highest damped mean first, breaking ties on genre overlap
+        order = np.lexsort((-overlap, -scores))[:top_n]
+        return list(title_index.titles[rated[order]])
+
+def similarity_model(movie_list, top_n=10, models=None, rating_stats=None):
+    """Recommends the movies most similar in content to the favourites.
+
+    Movies are ranked by mean TF-IDF cosine similarity (genres, title
+    words and release year) to the favourite movies; the most similar
+    ones are nudged by their damped mean rating so that, among equally
+    similar movies, the better rated come first.
+
+    Parameters
+    ----------
+    movie_list : list (str)
+        Favorite movies chosen by the app user.
+    top_n : int
+        Number of top recommendations to return to the user.
+    models : ModelVersion, optional
+        Content models to use; the active version by default.
+    rating_stats : RatingStats, optional
+        Rating aggregates to use; the popularity recommender's by default.
+
+    Returns
+    -------
+    list (str)
+        Titles of the top-n movie recommendations to the user.
+
+    """
+    models = registry.current if models is None else models
+    if rating_stats is None:
+        rating_stats = popularity_based.registry.current.rating_stats
+    title_index, content_similarity = models.title_index, models.content_similarity
+    with stage('preprocessing') as s:
+        chosen = [title_index.title_row(i) for i in movie_list]
+        # Exclude every row sharing a chosen title
+        excluded = [r for i in movie_list for r in title_index.title_rows(i)]
+        s.rows = len(excluded)
+    with stage('similarity') as s:
+        rows, similarity = content_similarity.top_similar(chosen, SIMILARITY_POOL, exclude=excluded)
+        s.rows = len(rows)
+    with stage('ranking'):
+        damped = rating_stats.lookup(title_index.ids[rows], 'damped_mean')
+        scores = similarity + RATING_WEIGHT * (damped - rating_stats.global_mean)
+        order = np.argsort(-scores, kind='stable')[:top_n]
+        return list(title_index.titles[rows[order]])
+
 # !! DO NOT CHANGE THIS FUNCTION SIGNATURE !!
 # You are, however, encouraged to change its content.  
+@traced('content_model')
+@cached('content_model', content_version)
 def content_model(movie_list,top_n=10):
     """
     Performs Content filtering using a list of movies supplied
@@ -146,29 +282,8 @@ def content_model(movie_list,top_n=10):
     list (str)
         Titles of the top-n movie recommendations to the user.
     """
-    #global movies
-    # removing the favorite movie list
-    nmovies = data_preprocessing(movies)
-    genre_list = []
-    for i in movie_list:
-        genre_list.append(list(nmovies[nmovies['title']==i]['genres'])[0])
-    
-
-
-    from sklearn.preprocessing import MultiLabelBinarizer
-    mlb2 =  MultiLabelBinarizer()
-    mlb2.fit_transform(genre_list)
-    genre_list = mlb2.classes_
-    nmovies = nmovies[~nmovies['title'].isin(movie_list)]
-    mgen = nmovies
-    for gen in genre_list:
-        mgen = mgen[mgen['keyWords'].str.contains(gen)]
-        if len(mgen)<=top_n:
-            break
-            
-        mgen2 = mgen
-        
-        
-    asscr = ratings[ratings['movieId'].isin(mgen2['movieId'].values)][['movieId', 'rating']]
-    top_movies = (asscr.groupby(['movieId']).mean().reset_index()).sort_values('rating', ascending =False)[:top_n]
-    return list((nmovies[nmovies['movieId'].isin(top_movies['movieId'].values)]['title']).values)
\ No newline at end of file
+    # Both versions are held until the request is done, even if newer ones are swapped in
+    with registry.use() as models, popularity_based.registry.use() as popularity:
+        if CONTENT_MODE == 'genre':
+            return genre_filter_model(movie_list, top_n, models, popularity.rating_stats)
+        return similarity_model(movie_list, top_n, models, popularity.rating_stats)
@@ -0,0 +1,276 @@
+"""
+
+    Sparse TF-IDF content similarity with bounded memory.
+
+    Author: Explore Data Science Academy.
+
+    Description: Every movie is described by its genre tokens, the words
+    of its title and its release year and decade (parsed from the title),
+    weighted by TF-IDF and per-field weights and L2-normalized into a
+    sparse float32 matrix. Similarities to a query are one sparse
+    matrix-vector product over the catalogue; all-pairs nearest
+    neighbours are computed in blocks of rows, so no n x n similarity
+    matrix is ever materialized. The top-k neighbours of every movie can
+    be precomputed once into a compact on-disk table.
+
+    Run as `python -m recommenders.content_similarity` from the repository
+    root to (re)build the neighbour table.
+
+"""
+# Script dependencies
+import os
+import re
+import sys
+
+import numpy as np
+import scipy.sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+from recommenders.svd_scorer import top_k
+
+# Relative weight of each feature field after TF-IDF
+FIELD_WEIGHTS = {'genre': 1.0, 'title': 0.35, 'year': 0.3, 'decade': 0.3}
+# Title words carrying no content
+STOP_WORDS = frozenset(('the', 'a', 'an', 'of', 'and', 'in', 'on', 'to', 'for', 'la', 'le',
+                        'les', 'el', 'de', 'der', 'die', 'das', 'il', 'aka'))
+
+_YEAR = re.compile(r'\((\d{4})(?:[-–]\d{0,4})?\)\s*$')
+_WORD = re.compile(r'[^\W\d_]{2,}|\d+')
+
+
+def parse_year(title):
+    """Release year at the end of a MovieLens title, or None."""
+    match = _YEAR.search(title)
+    return int(match.group(1)) if match else None
+
+
+def movie_tokens(title, genres):
+    """Feature tokens of one movie, prefixed with their field name.
+
+    Parameters
+    ----------
+    title : str
+        MovieLens title, e.g. 'Matrix, The (1999)'.
+    genres : str
+        Pipe-separated genres, e.g. 'Action|Sci-Fi|Thriller'.
+
+    Returns
+    -------
+    list (str)
+        e.g. ['genre:action', 'genre:sci-fi', 'genre:thriller',
+        'title:matrix', 'year:1999', 'decade:1990'].
+
+    """
+    tokens = [f'genre:{g.lower()}' for g in genres.split('|')
+              if g and g != '(no genres listed)']
+    year = parse_year(title)
+    text = _YEAR.sub('', title).lower()
+    tokens.extend(f'title:{w}' for w in _WORD.findall(text) if w not in STOP_WORDS)
+    if year is not None:
+        tokens.append(f'year:{year}')
+        tokens.append(f'decade:{year // 10 * 10}')
+    return tokens
+
+
+def _identity(tokens):
+    return tokens
+
+
+class ContentSimilarity:
+    """Row-normalized TF-IDF features of the catalogue.
+
+    Parameters
+    ----------
+    features : scipy.sparse.csr_matrix
+        L2-normalized features, one row per movie.
+    vocabulary : list (str)
+        Feature token of each column.
+
+    """
+
+    def __init__(self, features, vocabulary):
+        self.features = scipy.sparse.csr_matrix(features, dtype=np.float32)
+        self.vocabulary = list(vocabulary)
+        self._features_t = None
+        self.neighbours = None
+
+    @classmethod
+    def from_movies(cls, titles, genres, field_weights=FIELD_WEIGHTS):
+        """Build the features from aligned title and genre columns."""
+        docs = [movie_tokens(t, g) for t, g in zip(titles, genres)]
+        vectorizer = TfidfVectorizer(analyzer=_identity, dtype=np.float32, sublinear_tf=True)
+        tfidf = vectorizer.fit_transform(docs)
+        vocabulary = vectorizer.get_feature_names_out()
+        weights = np.array([field_weights[token.split(':', 1)[0]] for token in vocabulary],
+                           dtype=np.float32)
+        features = normalize(tfidf @ scipy.sparse.diags(weights), norm='l2', copy=False)
+        return cls(features.tocsr(), vocabulary)
+
+    @property
+    def n_movies(self):
+        return self.features.shape[0]
+
+    def similarity_to(self, rows, candidates=None):
+        """Mean cosine similarity of every movie to the given movie rows.
+
+        Parameters
+        ----------
+        rows : array-like (int)
+            Row positions of the query movies.
+        candidates : array-like (int), optional
+            Only score these rows.
+
+        Returns
+        -------
+        numpy.ndarray
+            One float32 score per movie (or per candidate).
+
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        features = self.features if candidates is None else \
+            self.features[np.asarray(candidates, dtype=np.intp)]
+        if len(rows) == 0:
+            return np.zeros(features.shape[0], dtype=np.float32)
+        query = np.asarray(self.features[rows].mean(axis=0)).ravel()
+        return features @ query.astype(np.float32)
+
+    def top_similar(self, rows, k=10, exclude=()):
+        """The `k` movies most similar to the given rows.
+
+        Uses the precomputed neighbour table when one is attached: the
+        candidates are then the union of the query rows' neighbours,
+        scored by their tabulated similarities (0 where not tabulated).
+
+        Returns
+        -------
+        tuple (numpy.ndarray, numpy.ndarray)
+            Row positions and their similarities, highest first.
+
+        """
+        if self.neighbours is not None:
+            candidates, scores = self.neighbours.similarity_to(rows)
+        else:
+            scores = self.similarity_to(rows)
+            candidates = None
+        masked = np.concatenate([np.asarray(rows, dtype=np.intp),
+                                 np.asarray(exclude, dtype=np.intp)])
+        if candidates is None:
+            scores[masked] = -np.inf
+            candidates = np.arange(self.n_movies)
+        else:
+            scores[np.isin(candidates, masked)] = -np.inf
+        best = top_k(scores, k)
+        best = best[np.isfinite(scores[best])]
+        return candidates[best], scores[best]
+
+    def neighbour_blocks(self, k=50, block_size=256, rows=None):
+        """Top-k neighbours of each movie, computed a block of rows at a time.
+
+        Peak memory is one dense (block_size x n_movies) float32 block.
+
+        Parameters
+        ----------
+        k : int
+            Neighbours kept per movie.
+        block_size : int
+            Rows multiplied against the catalogue at a time.
+        rows : array-like (int), optional
+            Rows to compute neighbours for; defaults to every movie.
+
+        Yields
+        ------
+        tuple (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+            Block rows, their neighbour rows (len(rows) x k) and
+            similarities, highest first.
+
+        """
+        rows = np.arange(self.n_movies) if rows is None else np.asarray(rows, dtype=np.intp)
+        k = min(k, self.n_movies - 1)
+        if self._features_t is None:
+            # Transposed copy for the blocked products, only needed offline
+            self._features_t = self.features.T.tocsr()
+        for start in range(0, len(rows), block_size):
+            block = rows[start:start + block_size]
+            sims = (self.features[block] @ self._features_t).toarray()
+            sims[np.arange(len(block)), block] = -np.inf
+            part = np.argpartition(-sims, k - 1, axis=1)[:, :k] if k > 0 else \
+                np.empty((len(block), 0), dtype=np.intp)
+            part_sims = np.take_along_axis(sims, part, axis=1)
+            # Highest first, ties by row position
+            order = np.lexsort((part, -part_sims), axis=1)
+            yield (block, np.take_along_axis(part, order, axis=1),
+                   np.take_along_axis(part_sims, order, axis=1))
+
+
+class NeighbourTable:
+    """Precomputed top-k content neighbours of every movie.
+
+    Parameters
+    ----------
+    movie_ids : numpy.ndarray (int)
+        MovieLens Movie ID of each row, for validating against the catalogue.
+    indices : numpy.ndarray (int32)
+        (n_movies x k) neighbour rows, most similar first.
+    scores : numpy.ndarray (float16)
+        Matching similarities.
+
+    """
+
+    def __init__(self, movie_ids, indices, scores):
+        self.movie_ids = np.asarray(movie_ids)
+        self.indices = indices
+        self.scores = scores
+
+    @classmethod
+    def build(cls, similarity, movie_ids, k=50, block_size=256):
+        """Compute the table from a `ContentSimilarity`, block by block."""
+        n = similarity.n_movies
+        k = min(k, n - 1)
+        indices = np.empty((n, k), dtype=np.int32)
+        scores = np.empty((n, k), dtype=np.float16)
+        for block, nbrs, sims in similarity.neighbour_blocks(k, block_size):
+            indices[block] = nbrs
+            scores[block] = sims
+        return cls(movie_ids, indices, scores)
+
+    def similarity_to(self, rows):
+        """Candidate rows and their mean tabulated similarity to the given rows."""
+        rows = np.asarray(rows, dtype=np.intp)
+        candidates, inverse = np.unique(self.indices[rows].ravel(), return_inverse=True)
+        scores = np.bincount(inverse.ravel(), weights=self.scores[rows].ravel().astype(np.float64),
+                             minlength=len(candidates))
+        return candidates, (scores / max(len(rows), 1)).astype(np.float32)
+
+    def matches(self, movie_ids):
+        """Whether the table was built for this exact catalogue."""
+        return np.array_equal(self.movie_ids, np.asarray(movie_ids))
+
+    def save(self, path):
+        tmp = f"{path}.tmp.npz"
+        np.savez(tmp, movie_ids=self.movie_ids, indices=self.indices, scores=self.scores)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load a table written by `save`."""
+        with np.load(path) as data:
+            return cls(data['movie_ids'], data['indices'], data['scores'])
+
+
+def load_neighbour_table(path, movie_ids):
+    """The neighbour table at `path` if it exists and matches the catalogue."""
+    if not os.path.exists(path):
+        return None
+    table = NeighbourTable.load(path)
+    return table if table.matches(movie_ids) else None
+
+
+if __name__ == '__main__':
+    from utils.data_loader import load_catalogue
+    catalogue = load_catalogue('resources/data/movies.csv')
+    k = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    similarity = ContentSimilarity.from_movies(catalogue.titles, catalogue.genres)
+    table = NeighbourTable.build(similarity, catalogue.ids, k)
+    table.save('resources/models/content_neighbours.npz')
+    print(f"Saved {table.indices.shape[1]} neighbours for {len(table.movie_ids)} movies")
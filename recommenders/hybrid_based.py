@@ -0,0 +1,81 @@
+"""
+
+    Hybrid recommendations combining the content and collaborative models.
+
+    Author: Explore Data Science Academy.
+
+    Description: Reuses the active versions of the data and models the
+    content-based and collaborative recommenders loaded, and ranks with a
+    `HybridRanker`: a few hundred candidates nominated by content
+    neighbours, genres, SVD item factors and popularity, re-ranked by a
+    blend of content similarity, the SVD estimate for the folded-in app
+    user and the damped mean rating.
+
+"""
+# Script dependencies
+from recommenders import collaborative_based, content_based, popularity_based
+from recommenders.collaborative_based import FOLD_IN_REG
+from recommenders.popularity_based import POPULAR_MIN_COUNT
+from recommenders.hybrid_ranker import POOL_SIZES, WEIGHTS, HybridRanker
+from utils.model_registry import ModelRegistry
+from utils.result_cache import cached
+from utils.tracing import TRACER, traced
+
+_SOURCES = (content_based.registry, collaborative_based.registry, popularity_based.registry)
+
+
+def load_models():
+    """A ranker over the active content, collaborative and popularity versions."""
+    content = content_based.registry.current
+    collab = collaborative_based.registry.current
+    popularity = popularity_based.registry.current
+    with TRACER.load('hybrid ranker'):
+        ranker = HybridRanker(content.catalogue.ids, content.content_similarity, collab.scorer,
+                              content.genre_index, popularity.rating_stats,
+                              WEIGHTS, POOL_SIZES, POPULAR_MIN_COUNT, FOLD_IN_REG)
+    # Rows of the ranker follow the content catalogue
+    return {'ranker': ranker, 'title_index': content.title_index}
+
+
+def sources_fingerprint():
+    # Rebuilt whenever one of the recommenders it blends swaps in a new version
+    return '/'.join(registry.current.tag for registry in _SOURCES)
+
+
+# Created after (so refreshed after) the registries it is built from
+registry = ModelRegistry('hybrid', load_models, sources_fingerprint)
+registry.load()
+
+
+def hybrid_version():
+    """Version token of the data, models and blend behind results."""
+    ranker = registry.current.ranker
+    return f"{registry.current.tag}/{sorted(ranker.weights.items())}"
+
+
+@traced('hybrid_model')
+@cached('hybrid_model', hybrid_version)
+def hybrid_model(movie_list, top_n=10):
+    """Recommends movies by blending the content, collaborative and
+    popularity signals over a small candidate set.
+
+    Parameters
+    ----------
+    movie_list : list (str)
+        Favorite movies chosen by the app user.
+    top_n : int
+        Number of top recommendations to return to the user.
+
+    Returns
+    -------
+    list (str)
+        Titles of the top-n movie recommendations to the user.
+
+    """
+    with registry.use() as models:
+        title_index = models.title_index
+        chosen = [title_index.title_row(i) for i in movie_list]
+        # Exclude every row sharing a chosen title
+        excluded = [r for i in movie_list for r in title_index.title_rows(i)]
+        rows, _ = models.ranker.rank(chosen, top_n, exclude=excluded)
+        return list(title_index.titles[rows])
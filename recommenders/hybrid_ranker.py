@@ -0,0 +1,171 @@
+"""
+
+    Two-stage hybrid ranking: candidate generation, then re-ranking.
+
+    Author: Explore Data Science Academy.
+
+    Description: Cheap generators each nominate a bounded pool of
+    movies similar to the favourites: content neighbours (the neighbour
+    table when one is built), the best rated movies sharing the
+    favourites' genres (genre index posting lists), the nearest movies in
+    the SVD item-factor space and the most popular movies. Only the few
+    hundred candidates in their union are then scored by every model:
+    TF-IDF content similarity, the SVD estimate of a folded-in user and
+    the damped mean rating. The scores are standardized over the
+    candidates and blended with fixed weights, so no expensive scoring
+    touches the whole catalogue.
+
+"""
+# Script dependencies
+import numpy as np
+
+from recommenders.svd_scorer import top_k
+from utils.tracing import stage
+
+# Blend weights of the standardized signals
+WEIGHTS = {'content': 0.5, 'collab': 0.35, 'popularity': 0.15}
+# Candidates nominated by each generator
+POOL_SIZES = {'content': 200, 'genre': 100, 'factors': 200, 'popularity': 50}
+
+
+def _standardize(scores):
+    """Z-scores over the finite entries; 0 (the average) elsewhere."""
+    scores = np.asarray(scores, dtype=np.float64)
+    finite = np.isfinite(scores)
+    out = np.zeros(len(scores))
+    if finite.sum() > 1:
+        values = scores[finite]
+        spread = values.std()
+        out[finite] = (values - values.mean()) / spread if spread > 0 else 0.0
+    return out
+
+
+class HybridRanker:
+    """Candidate generation plus blended re-ranking over a movie catalogue.
+
+    Parameters
+    ----------
+    movie_ids : array-like (int)
+        MovieLens Movie ID of each catalogue row.
+    content : ContentSimilarity
+        Content features; rows follow the catalogue.
+    scorer : SVDScorer
+        Trained collaborative model.
+    genre_index : GenreIndex
+        Genre index; rows follow the catalogue.
+    rating_stats : RatingStats
+        Per-movie rating aggregates.
+    weights : dict
+        Blend weight of the 'content', 'collab' and 'popularity' signals.
+    pool_sizes : dict
+        Candidates nominated by the 'content', 'genre', 'factors' and
+        'popularity' generators.
+    min_count : int
+        Fewest ratings a movie needs to be nominated as popular.
+    fold_in_reg : float
+        Regularization of the fold-in least-squares solve.
+
+    """
+
+    def __init__(self, movie_ids, content, scorer, genre_index, rating_stats,
+                 weights=WEIGHTS, pool_sizes=POOL_SIZES, min_count=50, fold_in_reg=0.1):
+        self.movie_ids = np.asarray(movie_ids)
+        self.content = content
+        self.scorer = scorer
+        self.genre_index = genre_index
+        self.weights = dict(weights)
+        self.pool_sizes = dict(pool_sizes)
+        self.fold_in_reg = fold_in_reg
+        # Catalogue row -> model inner id, and back
+        self.item_rows = scorer.item_rows(self.movie_ids)
+        self.catalogue_rows = np.full(scorer.n_items, -1, dtype=np.intp)
+        known = self.item_rows >= 0
+        self.catalogue_rows[self.item_rows[known]] = np.flatnonzero(known)
+        # Item-factor norms for cosine neighbours
+        self._item_norms = np.linalg.norm(np.asarray(scorer.qi, dtype=np.float32), axis=1)
+        self._item_norms[self._item_norms == 0] = 1
+        # Rating signals per catalogue row
+        self.damped_mean = rating_stats.lookup(self.movie_ids, 'damped_mean')
+        counts = rating_stats.lookup(self.movie_ids, 'count')
+        popular = np.where(counts >= min_count, self.damped_mean, -np.inf)
+        self.popular = top_k(popular, self.pool_sizes['popularity'])
+        self.popular = self.popular[np.isfinite(popular[self.popular])]
+
+    def genre_candidates(self, rows, n):
+        """Best rated movies sharing the most of the favourites' genres."""
+        genres = self.genre_index.genres_of(rows)
+        selected = self.genre_index.narrow(genres, np.arange(len(self.movie_ids)), n)
+        return selected[top_k(self.damped_mean[selected], n)]
+
+    def factor_candidates(self, rows, n):
+        """Movies nearest the favourites in the item-factor space (cosine)."""
+        inner = self.item_rows[rows]
+        inner = inner[inner >= 0]
+        if len(inner) == 0:
+            return np.array([], dtype=np.intp)
+        qi = self.scorer.qi
+        query = (qi[inner] / self._item_norms[inner, None]).mean(axis=0)
+        scores = (qi @ query.astype(qi.dtype)) / self._item_norms
+        best = self.catalogue_rows[top_k(scores, n + len(inner))]
+        return best[best >= 0]
+
+    def candidates(self, rows, exclude=()):
+        """Union of every generator's candidates, minus the query and
+        excluded rows."""
+        rows = np.asarray(rows, dtype=np.intp)
+        pools = [self.content.top_similar(rows, self.pool_sizes['content'])[0],
+                 self.genre_candidates(rows, self.pool_sizes['genre']),
+                 self.factor_candidates(rows, self.pool_sizes['factors']),
+                 self.popular]
+        candidates = np.unique(np.concatenate(pools).astype(np.intp))
+        masked = np.concatenate([rows, np.asarray(exclude, dtype=np.intp)])
+        return candidates[~np.isin(candidates, masked)]
+
+    def scores(self, rows, candidates):
+        """Standardized content, collaborative and popularity signals of
+        the candidates.
+
+        Returns
+        -------
+        dict (str, numpy.ndarray)
+            One z-scored signal per blend weight.
+
+        """
+        content = self.content.similarity_to(rows, candidates)
+        bu, pu = self.scorer.fold_in(self.movie_ids[rows], reg=self.fold_in_reg)
+        inner = self.item_rows[candidates]
+        collab = self.scorer.score_vector(bu, pu, inner, clip=False)
+        # The model has no opinion on movies it was not trained on
+        collab[inner < 0] = np.nan
+        return {'content': _standardize(content), 'collab': _standardize(collab),
+                'popularity': _standardize(self.damped_mean[candidates])}
+
+    def rank(self, rows, k=10, exclude=()):
+        """The `k` best movies for the favourite rows.
+
+        Parameters
+        ----------
+        rows : array-like (int)
+            Catalogue rows of the favourite movies.
+        k : int
+            Number of movies returned.
+        exclude : array-like (int)
+            Catalogue rows never to return.
+
+        Returns
+        -------
+        tuple (numpy.ndarray, numpy.ndarray)
+            Catalogue rows and their blended scores, highest first.
+
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        with stage('candidate generation') as s:
+            candidates = self.candidates(rows, exclude)
+            s.rows = len(candidates)
+        with stage('model scoring') as s:
+            signals = self.scores(rows, candidates)
+            s.rows = len(candidates)
+        with stage('ranking'):
+            blended = sum(w * signals[name] for name, w in self.weights.items())
+            best = top_k(blended, k)
+            return candidates[best], blended[best]
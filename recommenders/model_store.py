@@ -0,0 +1,164 @@
+"""
+
+    Compact, memory-mappable SVD model artifacts.
+
+    Author: Explore Data Science Academy.
+
+    Description: Instead of pickling the whole `surprise` SVD object (and
+    the trainset it drags along), only the global mean, biases, factor
+    matrices and raw id maps are stored, as typed .npy arrays under a
+    directory with a small JSON metadata header. Loading memory-maps the
+    arrays read-only, so start-up is a few `open` calls and every app
+    process serving the same artifact shares the same physical pages.
+    Factors can optionally be stored as float16 to halve their size again.
+
+"""
+# Script dependencies
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from recommenders.svd_scorer import SVDScorer, load_id_maps
+
+# Bumped whenever the on-disk layout changes
+FORMAT_VERSION = 1
+# Arrays making up an artifact
+_ARRAYS = ('bu', 'bi', 'pu', 'qi', 'user_ids', 'item_ids')
+
+
+def export_factors(scorer, path, dtype=np.float32, **extra_meta):
+    """Write a scorer's parameters as a compact artifact directory.
+
+    Parameters
+    ----------
+    scorer : SVDScorer
+        Parameters to export, e.g. `SVDScorer.from_model(model)`.
+    path : str
+        Destination directory; replaced atomically if it exists.
+    dtype : numpy dtype
+        Storage type of biases and factors: float64, float32 or float16.
+    **extra_meta
+        Additional JSON-serializable fields for the metadata header
+        (e.g. training hyperparameters).
+
+    Returns
+    -------
+    dict
+        The artifact's metadata header.
+
+    """
+    dtype = np.dtype(dtype)
+    if dtype not in (np.float16, np.float32, np.float64):
+        raise ValueError(f"Unsupported factor dtype: {dtype}")
+    parent = os.path.dirname(os.path.abspath(path))
+    tmp_dir = tempfile.mkdtemp(prefix='.factors-', dir=parent)
+    arrays = {'bu': scorer.bu.astype(dtype), 'bi': scorer.bi.astype(dtype),
+              'pu': np.ascontiguousarray(scorer.pu, dtype=dtype),
+              'qi': np.ascontiguousarray(scorer.qi, dtype=dtype),
+              'user_ids': np.asarray(scorer.user_ids), 'item_ids': np.asarray(scorer.item_ids)}
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, f'{name}.npy'), array)
+    meta = {'format_version': FORMAT_VERSION, 'global_mean': scorer.global_mean,
+            'rating_scale': list(scorer.rating_scale), 'biased': bool(scorer.biased),
+            'n_users': int(scorer.n_users), 'n_items': int(scorer.n_items),
+            'n_factors': int(scorer.qi.shape[1]), 'dtype': dtype.name,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'), **extra_meta}
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=1)
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_dir, path)
+    return meta
+
+
+def read_meta(path):
+    """Metadata header of an artifact directory."""
+    with open(os.path.join(path, 'meta.json')) as f:
+        return json.load(f)
+
+
+def load_factors(path, mmap=True):
+    """Open an artifact written by `export_factors` as a batch scorer.
+
+    Parameters
+    ----------
+    path : str
+        Artifact directory.
+    mmap : bool
+        Memory-map the arrays read-only instead of reading them in.
+
+    Returns
+    -------
+    SVDScorer
+        Scorer over the artifact's parameters.
+
+    Raises
+    ------
+    ValueError
+        If the artifact was written in an unknown format or its arrays
+        do not match the header.
+
+    """
+    meta = read_meta(path)
+    if meta.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported model artifact format in {path}")
+    mode = 'r' if mmap else None
+    arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mode)
+              for name in _ARRAYS}
+    expected = {'pu': (meta['n_users'], meta['n_factors']),
+                'qi': (meta['n_items'], meta['n_factors']),
+                'bu': (meta['n_users'],), 'bi': (meta['n_items'],)}
+    for name, shape in expected.items():
+        if arrays[name].shape != shape:
+            raise ValueError(f"{name} in {path} has shape {arrays[name].shape}, expected {shape}")
+    scorer = SVDScorer(meta['global_mean'], arrays['bu'], arrays['bi'], arrays['pu'],
+                       arrays['qi'], arrays['user_ids'], arrays['item_ids'],
+                       meta['rating_scale'], meta['biased'])
+    scorer.meta = meta
+    return scorer
+
+
+def artifact_size(path):
+    """Total size in bytes of the files of an artifact directory."""
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def load_model_artifact(path_to_factors, path_to_pickle=None, dtype=np.float32):
+    """Load the compact artifact, converting a newer pickled model first.
+
+    A pickled `surprise` SVD (as written by `train_colbased.py`) that is
+    newer than the artifact, or has no artifact yet, is converted once;
+    every later start-up only memory-maps the arrays.
+
+    Parameters
+    ----------
+    path_to_factors : str
+        Artifact directory.
+    path_to_pickle : str, optional
+        Pickled `surprise` SVD model, with its `<name>_ids.npz` id maps
+        alongside when available.
+    dtype : numpy dtype
+        Factor storage type used when converting.
+
+    Returns
+    -------
+    SVDScorer
+        Memory-mapped scorer over the artifact.
+
+    """
+    meta_path = os.path.join(path_to_factors, 'meta.json')
+    if path_to_pickle and os.path.exists(path_to_pickle) and (
+            not os.path.exists(meta_path)
+            or os.path.getmtime(path_to_pickle) > os.path.getmtime(meta_path)):
+        with open(path_to_pickle, 'rb') as f:
+            model = pickle.load(f)
+        ids_path = os.path.splitext(path_to_pickle)[0] + '_ids.npz'
+        id_maps = load_id_maps(ids_path) if os.path.exists(ids_path) else None
+        export_factors(SVDScorer.from_model(model, id_maps), path_to_factors, dtype,
+                       source=os.path.basename(path_to_pickle))
+    return load_factors(path_to_factors)
@@ -0,0 +1,72 @@
+"""
+
+    Popularity-based recommendations.
+
+    Author: Explore Data Science Academy.
+
+    Description: Recommends the best rated among the most rated movies.
+    It needs only the per-movie rating aggregates and the title index,
+    both cheap to load, so it answers straight away: it is the fallback
+    whenever a recommender misses its deadline, including while the
+    content and collaborative models are still loading.
+
+"""
+# Script dependencies
+from utils.data_loader import load_title_index
+from utils.model_registry import ModelRegistry, file_fingerprint
+from utils.rating_stats import load_rating_stats
+from utils.tracing import TRACER
+
+# Movies needing this many ratings to appear in the popularity fallback
+POPULAR_MIN_COUNT = 50
+
+
+def load_models():
+    """Title index, rating aggregates and the precomputed popular titles."""
+    # Title lookups shared with the other recommenders
+    title_index = load_title_index('resources/data/movies.csv')
+    # Per-movie rating aggregates, persisted and kept in step with ratings.csv
+    with TRACER.load('rating stats'):
+        rating_stats = load_rating_stats('resources/data/ratings.csv')
+    # Best rated popular titles, precomputed for `popularity_model`
+    popular_titles = title_index.titles_of(rating_stats.top(200, min_count=POPULAR_MIN_COUNT))
+    return {'title_index': title_index, 'rating_stats': rating_stats,
+            'popular_titles': popular_titles}
+
+
+def data_fingerprint():
+    return file_fingerprint('resources/data/movies.csv', 'resources/data/ratings.csv')
+
+
+def validate(models):
+    if len(models.title_index.ids) == 0 or len(models.rating_stats) == 0:
+        raise ValueError("no movies or no ratings")
+
+
+# Swapped for a new version when movies.csv or ratings.csv change
+registry = ModelRegistry('popularity', load_models, data_fingerprint, validate)
+registry.load()
+
+
+def popularity_model(movie_list, top_n=10):
+    """Best rated popular movies other than the favourites.
+
+    Needs no per-request computation, so it serves as the fallback when a
+    recommender misses its deadline.
+
+    Parameters
+    ----------
+    movie_list : list (str)
+        Favorite movies chosen by the app user.
+    top_n : int
+        Number of top recommendations to return to the user.
+
+    Returns
+    -------
+    list (str)
+        Titles of the top-n popular movies.
+
+    """
+    chosen = set(movie_list)
+    with registry.use() as models:
+        return [title for title in models.popular_titles if title not in chosen][:top_n]
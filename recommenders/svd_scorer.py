@@ -0,0 +1,403 @@
+"""
+
+    Vectorized batch scoring for a trained SVD model.
+
+    Author: Explore Data Science Academy.
+
+    Description: Pulls the biases and factor matrices out of a trained
+    `surprise` SVD model once, and scores whole user-by-item blocks with a
+    single NumPy matrix product instead of one `model.predict` call per
+    (user, item) pair. Estimates follow `SVD.estimate` exactly, including
+    the handling of unknown users/items and the clipping to the rating
+    scale applied by `model.predict`.
+
+"""
+# Script dependencies
+import numpy as np
+
+
+def top_k(scores, k):
+    """Indices of the `k` largest scores, highest first.
+
+    Ties are broken by position, as a stable descending sort would, but
+    only the entries that can make the cut are sorted.
+
+    Parameters
+    ----------
+    scores : numpy.ndarray
+        One-dimensional array of scores.
+    k : int
+        Number of indices to return.
+
+    Returns
+    -------
+    numpy.ndarray (int)
+        Positions of the top-k scores.
+
+    """
+    n = len(scores)
+    if k <= 0:
+        return np.array([], dtype=np.intp)
+    if k >= n:
+        return np.argsort(-scores, kind='stable')
+    kth = np.partition(scores, n - k)[n - k]
+    candidates = np.flatnonzero(scores >= kth)
+    return candidates[np.argsort(-scores[candidates], kind='stable')][:k]
+
+
+def raw_id_maps(trainset):
+    """Raw user and item ids of a `surprise` trainset, indexed by inner id."""
+    user_ids = np.array([trainset.to_raw_uid(u) for u in range(trainset.n_users)])
+    item_ids = np.array([trainset.to_raw_iid(i) for i in range(trainset.n_items)])
+    return user_ids, item_ids
+
+
+def save_id_maps(trainset, path):
+    """Persist the raw<->inner id maps of a trainset next to its model.
+
+    Parameters
+    ----------
+    trainset : surprise.Trainset
+        Trainset the model was fitted on.
+    path : str
+        Destination .npz file.
+
+    """
+    user_ids, item_ids = raw_id_maps(trainset)
+    np.savez(path, user_ids=user_ids, item_ids=item_ids)
+
+
+def load_id_maps(path):
+    """Load id maps written by `save_id_maps`.
+
+    Returns
+    -------
+    tuple (numpy.ndarray, numpy.ndarray)
+        Raw user ids and raw item ids, each indexed by inner id.
+
+    """
+    with np.load(path) as data:
+        return data['user_ids'], data['item_ids']
+
+
+class _RowLookup:
+    """Raw id -> inner id lookups.
+
+    Integer ids are resolved with a binary search over a sorted copy of
+    the id array, so memory-mapped id arrays stay shared between
+    processes; other ids fall back to a dictionary.
+
+    """
+
+    def __init__(self, ids):
+        self.ids = ids
+        self.numeric = np.issubdtype(ids.dtype, np.integer)
+        if self.numeric:
+            self.order = np.argsort(ids, kind='stable')
+            self.sorted = ids[self.order]
+        else:
+            self.rows = {v: r for r, v in enumerate(ids.tolist())}
+
+    def __call__(self, raw_ids):
+        if not self.numeric:
+            return np.array([self.rows.get(v, -1) for v in raw_ids], dtype=np.intp)
+        raw = np.asarray(list(raw_ids) if not hasattr(raw_ids, '__len__') else raw_ids)
+        if len(self.sorted) == 0 or len(raw) == 0 or not np.issubdtype(raw.dtype, np.integer):
+            return np.array([self._scalar(v) for v in raw.tolist()], dtype=np.intp)
+        pos = np.searchsorted(self.sorted, raw)
+        pos[pos == len(self.sorted)] = 0
+        return np.where(self.sorted[pos] == raw, self.order[pos], -1).astype(np.intp)
+
+    def _scalar(self, value):
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            return -1
+        pos = np.searchsorted(self.sorted, value)
+        if pos < len(self.sorted) and self.sorted[pos] == value:
+            return int(self.order[pos])
+        return -1
+
+
+class SVDScorer:
+    """Batch scorer over the parameters of a biased (or unbiased) SVD model.
+
+    Parameters
+    ----------
+    global_mean : float
+        Mean rating of the training set.
+    bu, bi : numpy.ndarray
+        User and item biases, indexed by inner id.
+    pu, qi : numpy.ndarray
+        User and item factor matrices, indexed by inner id.
+    user_ids, item_ids : array-like
+        Raw user and item ids, indexed by inner id.
+    rating_scale : tuple (float, float)
+        Bounds estimates are clipped to.
+    biased : bool
+        Whether the model was trained with baselines.
+
+    """
+
+    def __init__(self, global_mean, bu, bi, pu, qi, user_ids, item_ids,
+                 rating_scale, biased=True):
+        self.global_mean = float(global_mean)
+        self.bu = np.asarray(bu)
+        self.bi = np.asarray(bi)
+        self.pu = np.asarray(pu)
+        self.qi = np.asarray(qi)
+        self.user_ids = np.asarray(user_ids)
+        self.item_ids = np.asarray(item_ids)
+        self.rating_scale = tuple(rating_scale)
+        self.biased = biased
+        # Artifact metadata header, when loaded from one
+        self.meta = {}
+        self._user_rows = _RowLookup(self.user_ids)
+        self._item_rows = _RowLookup(self.item_ids)
+
+    @classmethod
+    def from_model(cls, model, id_maps=None):
+        """Extract the scorer parameters from a fitted `surprise.SVD`.
+
+        Parameters
+        ----------
+        model : surprise.SVD
+            Fitted model.
+        id_maps : tuple (numpy.ndarray, numpy.ndarray), optional
+            Raw user and item ids by inner id, as returned by
+            `load_id_maps`. Read from the model's trainset when omitted or
+            when they do not match the model's dimensions.
+
+        """
+        trainset = model.trainset
+        if id_maps is None or (len(id_maps[0]), len(id_maps[1])) != (len(model.pu), len(model.qi)):
+            id_maps = raw_id_maps(trainset)
+        user_ids, item_ids = id_maps
+        return cls(trainset.global_mean, model.bu, model.bi, model.pu, model.qi,
+                   user_ids, item_ids, trainset.rating_scale, model.biased)
+
+    @property
+    def n_users(self):
+        return len(self.user_ids)
+
+    @property
+    def n_items(self):
+        return len(self.item_ids)
+
+    def user_rows(self, uids):
+        """Inner ids of raw user ids; -1 for users unknown to the model."""
+        return self._user_rows(uids)
+
+    def item_rows(self, iids):
+        """Inner ids of raw item ids; -1 for items unknown to the model."""
+        return self._item_rows(iids)
+
+    def _gather(self, rows, biases, factors):
+        """Biases and factors for inner ids, zeroed where the id is unknown.
+
+        `rows=None` selects every id without copying. Quantized (float16)
+        parameters are widened to float32 before they reach the BLAS call.
+
+        """
+        dtype = np.result_type(factors.dtype, np.float32)
+        if rows is None:
+            return (np.ones(len(biases), dtype=bool), biases.astype(dtype, copy=False),
+                    factors.astype(dtype, copy=False))
+        known = rows >= 0
+        safe = np.where(known, rows, 0)
+        b = np.where(known, biases[safe], 0.0)
+        f = factors[safe].astype(dtype, copy=False) * known[:, None]
+        return known, b, f
+
+    def _clip(self, est):
+        lower, upper = self.rating_scale
+        return np.clip(est, lower, upper, out=est)
+
+    def score_rows(self, user_rows=None, item_rows=None):
+        """Estimates for every (user, item) pair of the given inner ids.
+
+        Parameters
+        ----------
+        user_rows, item_rows : array-like (int), optional
+            Inner ids (-1 for unknown); all users/items when omitted.
+
+        Returns
+        -------
+        numpy.ndarray
+            Clipped estimates of shape (len(user_rows), len(item_rows)).
+
+        """
+        user_rows = None if user_rows is None else np.asarray(user_rows, dtype=np.intp)
+        item_rows = None if item_rows is None else np.asarray(item_rows, dtype=np.intp)
+        known_u, bu, pu = self._gather(user_rows, self.bu, self.pu)
+        known_i, bi, qi = self._gather(item_rows, self.bi, self.qi)
+        est = (pu @ qi.T).astype(np.float64)
+        if self.biased:
+            est += self.global_mean + bu[:, None] + bi[None, :]
+        else:
+            # Unbiased SVD cannot predict for unknown ids and falls back to the mean
+            est[~(known_u[:, None] & known_i[None, :])] = self.global_mean
+        return self._clip(est)
+
+    def score_items(self, iids, uids=None):
+        """Estimates for raw item ids, for all (or the given raw) users.
+
+        Returns
+        -------
+        numpy.ndarray
+            Clipped estimates of shape (n_users, len(iids)).
+
+        """
+        user_rows = None if uids is None else self.user_rows(uids)
+        return self.score_rows(user_rows, self.item_rows(iids))
+
+    def predict(self, uids, iids):
+        """Element-wise estimates for paired raw user and item ids."""
+        known_u, bu, pu = self._gather(self.user_rows(uids), self.bu, self.pu)
+        known_i, bi, qi = self._gather(self.item_rows(iids), self.bi, self.qi)
+        est = np.einsum('ij,ij->i', pu, qi).astype(np.float64)
+        if self.biased:
+            est += self.global_mean + bu + bi
+        else:
+            est[~(known_u & known_i)] = self.global_mean
+        return self._clip(est)
+
+    def top_users(self, iid, k=10):
+        """The `k` users with the highest estimate for a raw item id.
+
+        Returns
+        -------
+        tuple (numpy.ndarray, numpy.ndarray)
+            Raw user ids and their estimates, highest first.
+
+        """
+        scores = self.score_rows(None, self.item_rows([iid]))[:, 0]
+        best = top_k(scores, k)
+        return self.user_ids[best], scores[best]
+
+    def top_items(self, uid, k=10, exclude=()):
+        """The `k` items with the highest estimate for a raw user id.
+
+        Parameters
+        ----------
+        uid : raw user id
+            User to rank items for.
+        k : int
+            Number of items to return.
+        exclude : iterable
+            Raw item ids never to return (e.g. already rated).
+
+        Returns
+        -------
+        tuple (numpy.ndarray, numpy.ndarray)
+            Raw item ids and their estimates, highest first.
+
+        """
+        scores = self.score_rows(self.user_rows([uid]), None)[0]
+        return self._top_items(scores, k, exclude)
+
+    def _top_items(self, scores, k, exclude):
+        excluded = self.item_rows(exclude)
+        scores[excluded[excluded >= 0]] = -np.inf
+        best = top_k(scores, k)
+        best = best[np.isfinite(scores[best])]
+        return self.item_ids[best], scores[best]
+
+    def fold_in(self, iids, ratings=None, reg=0.1):
+        """Latent vector of a new user from a few rated items.
+
+        Solves the regularized least-squares problem the model's own
+        users were fitted against, with the item parameters held fixed:
+        min over (b_u, p_u) of sum_i (r_i - mu - b_i - b_u - q_i.p_u)^2
+        + reg * (b_u^2 + |p_u|^2).
+
+        Parameters
+        ----------
+        iids : array-like
+            Raw ids of the items the user rated; unknown ids are ignored.
+        ratings : array-like (float), optional
+            The user's ratings of `iids`. Defaults to the top of the
+            rating scale, i.e. the items are favourites.
+        reg : float
+            Regularization strength.
+
+        Returns
+        -------
+        tuple (float, numpy.ndarray)
+            The user's bias and latent factor vector.
+
+        """
+        rows = self.item_rows(iids)
+        if ratings is None:
+            ratings = np.full(len(rows), self.rating_scale[1])
+        ratings = np.asarray(ratings, dtype=np.float64)[rows >= 0]
+        rows = rows[rows >= 0]
+        n_factors = self.qi.shape[1]
+        if len(rows) == 0:
+            return 0.0, np.zeros(n_factors)
+        q = self.qi[rows].astype(np.float64)
+        residual = ratings.copy()
+        if self.biased:
+            residual -= self.global_mean + self.bi[rows]
+            # Augment with a constant column so the user bias is solved jointly
+            q = np.hstack([np.ones((len(rows), 1)), q])
+        a = q.T @ q + reg * np.eye(q.shape[1])
+        x = np.linalg.solve(a, q.T @ residual)
+        if self.biased:
+            return float(x[0]), x[1:]
+        return 0.0, x
+
+    def score_vector(self, bu, pu, item_rows=None, clip=True):
+        """Estimates of every item (or of the given inner ids) for a
+        (folded-in) user bias and vector.
+
+        `clip=False` leaves them unclipped, for ranking: clipping ties
+        every item estimated beyond the top of the rating scale.
+
+        """
+        item_rows = None if item_rows is None else np.asarray(item_rows, dtype=np.intp)
+        _, bi, qi = self._gather(item_rows, self.bi, self.qi)
+        est = (qi @ np.asarray(pu, dtype=qi.dtype)).astype(np.float64)
+        if self.biased:
+            est += self.global_mean + bu + bi
+        return self._clip(est) if clip else est
+
+    def score_vectors(self, bu, pu, clip=True):
+        """Estimates of every item for several (folded-in) users at once.
+
+        Parameters
+        ----------
+        bu : array-like (float)
+            User biases, one per user.
+        pu : array-like (float)
+            User vectors, one row per user.
+        clip : bool
+            Clip to the rating scale; unclipped estimates rank without ties
+            at its top.
+
+        Returns
+        -------
+        numpy.ndarray
+            Estimates of shape (len(bu), n_items), computed with a single
+            matrix product.
+
+        """
+        _, bi, qi = self._gather(None, self.bi, self.qi)
+        est = (np.asarray(pu, dtype=qi.dtype).reshape(-1, qi.shape[1]) @ qi.T).astype(np.float64)
+        if self.biased:
+            est += self.global_mean + np.asarray(bu, dtype=np.float64)[:, None] + bi[None, :]
+        return self._clip(est) if clip else est
+
+    def top_items_for_vector(self, bu, pu, k=10, exclude=()):
+        """The `k` best items for a (folded-in) user bias and vector.
+
+        Items are ranked on their unclipped estimates.
+
+        Returns
+        -------
+        tuple (numpy.ndarray, numpy.ndarray)
+            Raw item ids and their (clipped) estimates, highest first.
+
+        """
+        ids, scores = self._top_items(self.score_vector(bu, pu, clip=False), k, exclude)
+        return ids, self._clip(scores)
@@ -0,0 +1,314 @@
+"""
+
+    Offline evaluation of the recommenders: quality versus cost.
+
+    Author: Explore Data Science Academy.
+
+    Description: Splits the ratings into k random folds or one
+    time-ordered train/test split and, for every model configuration and
+    split, in parallel worker processes:
+
+    - trains SVD on the training ratings and reports its RMSE on the
+      held-out ratings;
+    - builds top-k lists for a sample of held-out users along the app's
+      paths (collaborative: the user's own SVD factors, fold-in:
+      three favourite movies folded into the SVD model, content: TF-IDF
+      similarity to the same favourites, hybrid: content, fold-in and
+      damped mean rating blended over a candidate set) and scores them with
+      precision, recall and NDCG@k against the user's held-out movies
+      rated at least `--relevant`;
+    - records train time, mean inference latency per request and model
+      size.
+
+    Results are averaged over the splits and printed with the
+    configurations on the NDCG@k / latency Pareto frontier marked.
+
+    Usage (from this directory):
+
+        python evaluate.py --split kfold --folds 5 --factors 50 100 200 \
+            --epochs 20 40 --output evaluation.csv
+
+"""
+# Script dependencies
+import argparse
+import itertools
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import surprise
+from surprise import SVD
+
+# Make the app's packages importable when run from this directory
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, REPO_ROOT)
+from recommenders.content_similarity import ContentSimilarity
+from recommenders.hybrid_ranker import HybridRanker
+from recommenders.model_store import artifact_size, export_factors
+from recommenders.svd_scorer import SVDScorer
+from utils.data_loader import load_catalogue
+from utils.genre_index import GenreIndex
+from utils.ingest import RATING_DTYPES, read_ratings
+from utils.rating_stats import RatingStats
+from utils.title_index import TitleIndex
+
+# Favourite movies per user, as picked on the app's Recommender page
+N_FAVOURITES = 3
+
+# Per-process data, loaded once by `_init_worker`
+_ratings = None
+_catalogue = None
+# Content features and indexes, built on first use by `_content_indexes`
+_content = None
+
+
+def kfold_splits(n_ratings, n_folds=5, seed=0):
+    """Random k-fold splits of the rating rows.
+
+    Returns
+    -------
+    list (tuple (numpy.ndarray, numpy.ndarray))
+        Train and test row positions of each fold.
+
+    """
+    fold = np.random.default_rng(seed).permutation(n_ratings) % n_folds
+    return [(np.flatnonzero(fold != f), np.flatnonzero(fold == f)) for f in range(n_folds)]
+
+
+def time_split(timestamps, test_fraction=0.2):
+    """One split holding out the most recent `test_fraction` of the ratings.
+
+    Returns
+    -------
+    list (tuple (numpy.ndarray, numpy.ndarray))
+        Train and test row positions of the single split.
+
+    """
+    order = np.argsort(timestamps, kind='stable')
+    cut = int(round(len(order) * (1 - test_fraction)))
+    return [(np.sort(order[:cut]), np.sort(order[cut:]))]
+
+
+def ranking_metrics(recommended, relevant, k):
+    """Precision, recall and NDCG of one top-k list.
+
+    Parameters
+    ----------
+    recommended : array-like
+        Recommended ids, best first.
+    relevant : set
+        Held-out ids the user liked.
+    k : int
+        Cut-off.
+
+    Returns
+    -------
+    tuple (float, float, float)
+
+    """
+    hits = np.array([r in relevant for r in list(recommended)[:k]], dtype=float)
+    discounts = 1 / np.log2(np.arange(2, k + 2))
+    ideal = discounts[:min(len(relevant), k)].sum()
+    dcg = (hits * discounts[:len(hits)]).sum()
+    return hits.sum() / k, hits.sum() / len(relevant), dcg / ideal if ideal else 0.0
+
+
+def train_svd(train, config, seed=0):
+    """Fit `surprise.SVD` on a ratings DataFrame and extract its scorer."""
+    reader = surprise.Reader(rating_scale=(0.5, 5.0))
+    data = surprise.Dataset.load_from_df(train[['userId', 'movieId', 'rating']], reader)
+    model = SVD(random_state=seed, **config).fit(data.build_full_trainset())
+    return SVDScorer.from_model(model)
+
+
+def _init_worker(path_to_ratings, path_to_movies, with_time):
+    global _ratings, _catalogue
+    dtypes = dict(RATING_DTYPES, timestamp=np.int64) if with_time else RATING_DTYPES
+    _ratings = read_ratings(path_to_ratings, dtypes=dtypes)
+    _catalogue = load_catalogue(path_to_movies)
+
+
+def _content_indexes():
+    """Content similarity, title index and genre index of the catalogue."""
+    global _content
+    if _content is None:
+        _content = (ContentSimilarity.from_movies(_catalogue.titles, _catalogue.genres),
+                    TitleIndex(_catalogue.ids, _catalogue.titles),
+                    GenreIndex(_catalogue.genres))
+    return _content
+
+
+def _by_user(frame):
+    """Movie IDs of each user in `frame`, in row order."""
+    users = frame['userId'].to_numpy()
+    keys, starts = np.unique(users, return_index=True)
+    if not np.all(users[:-1] <= users[1:]):
+        order = np.argsort(users, kind='stable')
+        frame, users = frame.iloc[order], users[order]
+        keys, starts = np.unique(users, return_index=True)
+    return dict(zip(keys.tolist(), np.split(frame['movieId'].to_numpy(), starts[1:])))
+
+
+def _test_users(train, test, relevant_rating, max_users, seed):
+    """Held-out users to rank for: their favourites and relevant movies."""
+    relevant = _by_user(test[test['rating'] >= relevant_rating])
+    seen = _by_user(train)
+    # Favourites: the user's best rated training movies, ties by Movie ID
+    favourites = _by_user(train.sort_values(['userId', 'rating', 'movieId'],
+                                            ascending=[True, False, True]))
+    users = np.intersect1d(list(relevant), list(favourites))
+    if max_users and len(users) > max_users:
+        users = np.sort(np.random.default_rng(seed).choice(users, max_users, replace=False))
+    return [(u, favourites[u][:N_FAVOURITES], seen[u], set(relevant[u].tolist()))
+            for u in users.tolist()]
+
+
+def _rank(paths, users, k):
+    """Mean precision, recall, NDCG and latency of each path's top-k lists."""
+    scores = {name: [] for name in paths}
+    for user, favourites, seen, relevant in users:
+        for name, recommend in paths.items():
+            start = time.perf_counter()
+            recommended = recommend(user, favourites, seen)
+            elapsed = time.perf_counter() - start
+            scores[name].append(ranking_metrics(recommended, relevant, k) + (elapsed,))
+    return {name: np.mean(values, axis=0) if values else np.full(4, np.nan)
+            for name, values in scores.items()}
+
+
+def evaluate_svd(config, split, train_rows, test_rows, k, relevant_rating, max_users, seed):
+    """Score one SVD configuration on one split (runs in a worker process)."""
+    train, test = _ratings.iloc[train_rows], _ratings.iloc[test_rows]
+    start = time.perf_counter()
+    scorer = train_svd(train, config, seed)
+    train_s = time.perf_counter() - start
+    rmse = float(np.sqrt(np.mean((scorer.predict(test['userId'].to_numpy(),
+                                                 test['movieId'].to_numpy())
+                                  - test['rating'].to_numpy()) ** 2)))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'SVD.factors')
+        export_factors(scorer, path)
+        size_mb = artifact_size(path) / 2 ** 20
+
+    def collab(user, favourites, seen):
+        return scorer.top_items(user, k, exclude=seen)[0]
+
+    def fold_in(user, favourites, seen):
+        bu, pu = scorer.fold_in(favourites)
+        return scorer.top_items_for_vector(bu, pu, k, exclude=seen)[0]
+
+    similarity, title_index, genre_index = _content_indexes()
+    ranker = HybridRanker(_catalogue.ids, similarity, scorer, genre_index,
+                          RatingStats.from_ratings(train))
+
+    def hybrid(user, favourites, seen):
+        rows = title_index.rows(favourites)
+        exclude = title_index.rows(seen)
+        best, _ = ranker.rank(rows[rows >= 0], k, exclude=exclude[exclude >= 0])
+        return title_index.ids[best]
+
+    users = _test_users(train, test, relevant_rating, max_users, seed)
+    metrics = _rank({'collab': collab, 'fold_in': fold_in, 'hybrid': hybrid}, users, k)
+    model = 'svd ' + ' '.join(f'{key}={value}' for key, value in config.items())
+    return [{'model': model, 'path': path, 'split': split, 'rmse': rmse,
+             'precision': m[0], 'recall': m[1], 'ndcg': m[2], 'latency_ms': m[3] * 1000,
+             'train_s': train_s, 'size_mb': size_mb, 'users': len(users)}
+            for path, m in metrics.items()]
+
+
+def evaluate_content(split, train_rows, test_rows, k, relevant_rating, max_users, seed):
+    """Score the TF-IDF content path on one split (runs in a worker process).
+
+    Content features do not depend on the ratings, so only the users and
+    their favourites change between splits.
+
+    """
+    train, test = _ratings.iloc[train_rows], _ratings.iloc[test_rows]
+    start = time.perf_counter()
+    similarity = ContentSimilarity.from_movies(_catalogue.titles, _catalogue.genres)
+    train_s = time.perf_counter() - start
+    title_index = TitleIndex(_catalogue.ids, _catalogue.titles)
+
+    def content(user, favourites, seen):
+        rows = title_index.rows(favourites)
+        exclude = title_index.rows(seen)
+        best, _ = similarity.top_similar(rows[rows >= 0], k, exclude=exclude[exclude >= 0])
+        return title_index.ids[best]
+
+    users = _test_users(train, test, relevant_rating, max_users, seed)
+    m = _rank({'content': content}, users, k)['content']
+    features = similarity.features
+    size_mb = (features.data.nbytes + features.indices.nbytes + features.indptr.nbytes) / 2 ** 20
+    return [{'model': 'content tf-idf', 'path': 'content', 'split': split, 'rmse': np.nan,
+             'precision': m[0], 'recall': m[1], 'ndcg': m[2], 'latency_ms': m[3] * 1000,
+             'train_s': train_s, 'size_mb': size_mb, 'users': len(users)}]
+
+
+def pareto_frontier(summary, quality='ndcg', cost='latency_ms'):
+    """Whether each row is on the quality/cost frontier: no other row is at
+    least as good on both and strictly better on one."""
+    q, c = summary[quality].to_numpy(), summary[cost].to_numpy()
+    dominated = [np.any((q >= q[i]) & (c <= c[i]) & ((q > q[i]) | (c < c[i])))
+                 for i in range(len(summary))]
+    return ~np.array(dominated, dtype=bool)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('Usage')[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ratings', default=os.path.join(REPO_ROOT, 'resources', 'data', 'ratings.csv'))
+    parser.add_argument('--movies', default=os.path.join(REPO_ROOT, 'resources', 'data', 'movies.csv'))
+    parser.add_argument('--split', choices=('kfold', 'time'), default='kfold')
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--test-fraction', type=float, default=0.2)
+    parser.add_argument('--factors', type=int, nargs='+', default=[50, 100, 200])
+    parser.add_argument('--epochs', type=int, nargs='+', default=[20, 40])
+    parser.add_argument('--lr', type=float, nargs='+', default=[0.005])
+    parser.add_argument('--reg', type=float, nargs='+', default=[0.02])
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--relevant', type=float, default=4.0,
+                        help="lowest held-out rating counted as relevant")
+    parser.add_argument('--max-users', type=int, default=500,
+                        help="held-out users ranked per split (0 for all)")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count())
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='evaluation.csv')
+    args = parser.parse_args()
+
+    with_time = args.split == 'time'
+    _init_worker(args.ratings, args.movies, with_time)
+    if with_time:
+        splits = time_split(_ratings['timestamp'].to_numpy(), args.test_fraction)
+    else:
+        splits = kfold_splits(len(_ratings), args.folds, args.seed)
+    configs = [dict(n_factors=f, n_epochs=e, lr_all=lr, reg_all=reg)
+               for f, e, lr, reg in itertools.product(args.factors, args.epochs, args.lr, args.reg)]
+    common = (args.k, args.relevant, args.max_users, args.seed)
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=args.jobs, initializer=_init_worker,
+                             initargs=(args.ratings, args.movies, with_time)) as pool:
+        futures = [pool.submit(evaluate_content, s, train, test, *common)
+                   for s, (train, test) in enumerate(splits)]
+        futures += [pool.submit(evaluate_svd, config, s, train, test, *common)
+                    for config in configs for s, (train, test) in enumerate(splits)]
+        for future in futures:
+            rows.extend(future.result())
+            print(f"{len(rows)} results", file=sys.stderr)
+
+    results = pd.DataFrame(rows)
+    summary = results.drop(columns='split').groupby(['model', 'path'], sort=False).mean()
+    summary['frontier'] = pareto_frontier(summary)
+    summary = summary.sort_values('ndcg', ascending=False)
+    pd.set_option('display.width', 200)
+    print(summary.round(4).to_string())
+    results.to_csv(args.output, index=False)
+    print(f"Per-split results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,360 @@
+"""
+
+    Alternating least squares (ALS) model training.
+
+    Author: Explore Data Science Academy.
+
+    Description: Trains the same biased matrix factorization the app
+    serves (global mean, user and item biases, user and item factors)
+    with alternating least squares instead of surprise's single-threaded
+    SGD. Each half-epoch fixes one side and solves every user (or item)
+    exactly with a ridge regression over its own ratings:
+
+    - the ratings are kept in sparse CSR form, user-major and item-major;
+    - rows are sorted by rating count and grouped into blocks of similar
+      length, so each block's Gram matrices and right-hand sides come from
+      two batched matrix products over a barely padded array, and the
+      whole block is solved with one batched `numpy.linalg.solve`;
+    - blocks are independent and NumPy releases the GIL in its BLAS and
+      LAPACK calls, so they are solved on a thread pool across the cores.
+
+    Training stops early once the RMSE on a held-out validation split
+    stops improving; the model is then refitted on every rating for the
+    best number of epochs and exported with `export_factors`, in the
+    layout `train_colbased.py` writes and the app loads.
+
+    Usage (from this directory):
+
+        python train_als.py --factors 200 --reg 0.05 --epochs 30 --output SVD.factors
+
+    BLAS threads compete with the block threads: with OpenBLAS or MKL,
+    OPENBLAS_NUM_THREADS=1 (or MKL_NUM_THREADS=1) is usually fastest.
+
+"""
+# Script dependencies
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import scipy.sparse as sparse
+
+# Make the app's packages importable when run from this directory
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, REPO_ROOT)
+from recommenders.model_store import export_factors
+from recommenders.svd_scorer import SVDScorer
+from utils.ingest import read_ratings
+
+# Largest padded block gathered at once, in factor-matrix elements
+BLOCK_ELEMENTS = 1 << 22
+# Most rows solved in one batch, so that the threads share the work evenly
+MAX_BLOCK_ROWS = 1024
+
+
+class RatingSplit:
+    """Ratings encoded to contiguous user and item rows.
+
+    Parameters
+    ----------
+    ratings : pandas.DataFrame
+        'userId', 'movieId' and 'rating' columns.
+    validation : float
+        Fraction of the ratings held out for early stopping (0 for none).
+    seed : int
+        Seed of the validation split.
+
+    """
+
+    def __init__(self, ratings, validation=0.0, seed=0):
+        self.user_ids, users = np.unique(ratings['userId'].to_numpy(), return_inverse=True)
+        self.item_ids, items = np.unique(ratings['movieId'].to_numpy(), return_inverse=True)
+        values = ratings['rating'].to_numpy(dtype=np.float32)
+        self.rating_scale = (float(values.min()), float(values.max()))
+        held_out = np.random.default_rng(seed).random(len(values)) < validation
+        self.validation = (users[held_out], items[held_out], values[held_out])
+        self.train = (users[~held_out], items[~held_out], values[~held_out])
+        self.all = (users, items, values)
+
+    @property
+    def shape(self):
+        return len(self.user_ids), len(self.item_ids)
+
+
+def latest_ratings(users, items, values, n_items):
+    """The last rating of every (user, item) pair, kept in file order.
+
+    A movie rated again by the same user keeps its latest rating; the
+    sparse matrix constructor would otherwise add the two up.
+
+    """
+    keys = np.asarray(users, dtype=np.int64) * n_items + items
+    # Positions of each key's last occurrence, found on the reversed keys
+    _, first_reversed = np.unique(keys[::-1], return_index=True)
+    keep = np.sort(len(keys) - 1 - first_reversed)
+    return users[keep], items[keep], values[keep]
+
+
+def _blocks(indptr, n_cols):
+    """Rows grouped by similar rating count into padded blocks.
+
+    Returns
+    -------
+    list (tuple (numpy.ndarray, numpy.ndarray))
+        Rows of each block and, per row, the positions of its ratings in
+        the CSR arrays, padded with one past the last position.
+
+    """
+    counts = np.diff(indptr)
+    order = np.argsort(counts, kind='stable')
+    budget = max(1, BLOCK_ELEMENTS // n_cols)
+    blocks = []
+    start = 0
+    while start < len(order):
+        # Counts are ascending: the last row of a block is its longest
+        end = start + 1
+        while (end < len(order) and end - start < MAX_BLOCK_ROWS
+               and (end + 1 - start) * max(counts[order[end]], 1) <= budget):
+            end += 1
+        rows = order[start:end]
+        offsets = np.arange(max(counts[rows[-1]], 1))
+        positions = np.where(offsets < counts[rows, None], indptr[rows, None] + offsets, indptr[-1])
+        blocks.append((rows, positions))
+        start = end
+    return blocks
+
+
+class _HalfStep:
+    """One side's least-squares problem: its ratings in CSR form and blocks."""
+
+    def __init__(self, csr, n_cols):
+        self.csr = csr
+        self.counts = np.diff(csr.indptr)
+        # Padding points at a sentinel rating of an all-zero fixed row
+        self.cols = np.append(csr.indices, csr.shape[1])
+        self.ratings = np.append(csr.data, np.float32(0))
+        self.blocks = _blocks(csr.indptr, n_cols)
+
+    def solve(self, fixed, fixed_bias, global_mean, reg, pool):
+        """Solve every row's factors and bias against the fixed side.
+
+        Parameters
+        ----------
+        fixed : numpy.ndarray
+            Factors of the fixed side.
+        fixed_bias : numpy.ndarray
+            Biases of the fixed side.
+
+        Returns
+        -------
+        tuple (numpy.ndarray, numpy.ndarray)
+            Factors and biases of this side.
+
+        """
+        n_factors = fixed.shape[1]
+        # Each rating is explained by [factors, 1] . [row factors, row bias]
+        design = np.zeros((len(fixed) + 1, n_factors + 1), dtype=np.float32)
+        design[:-1, :n_factors] = fixed
+        design[:-1, n_factors] = 1
+        residuals = self.ratings - global_mean - np.append(fixed_bias, 0)[self.cols]
+        residuals[-1] = 0
+        solution = np.empty((len(self.counts), n_factors + 1), dtype=np.float32)
+        diagonal = np.arange(n_factors + 1)
+
+        def solve_block(block):
+            rows, positions = block
+            x = design[self.cols[positions]]
+            xt = x.transpose(0, 2, 1)
+            target = residuals[positions][..., None]
+            # Weighted-lambda regularization: scaled by each row's rating count,
+            # and never zero, so that rows without ratings solve to zero
+            lam = reg * np.maximum(self.counts[rows], 1)[:, None]
+            if positions.shape[1] < n_factors + 1:
+                # Fewer ratings than unknowns: the same solution comes from the
+                # smaller system over the ratings, (X X' + lam I)^-1 then X'
+                kernel = np.matmul(x, xt)
+                padded = np.arange(positions.shape[1])
+                kernel[:, padded, padded] += lam
+                solution[rows] = np.matmul(xt, np.linalg.solve(kernel, target))[..., 0]
+            else:
+                gram = np.matmul(xt, x)
+                gram[:, diagonal, diagonal] += lam
+                solution[rows] = np.linalg.solve(gram, np.matmul(xt, target))[..., 0]
+
+        # Rows are disjoint across blocks, so the threads write without locking
+        list(pool.map(solve_block, self.blocks))
+        return solution[:, :n_factors], solution[:, n_factors]
+
+
+def solve_rows(matrix, rows, fixed, fixed_bias, global_mean, reg, workers=None):
+    """Re-solve only some rows of one side against the other, fixed side.
+
+    Updates a trained model for new ratings without a full fit: only the
+    users (or items) that received ratings are solved again.
+
+    Parameters
+    ----------
+    matrix : scipy.sparse.csr_matrix
+        Every rating, with this side's rows and the fixed side's columns.
+    rows : numpy.ndarray (int)
+        Rows to solve.
+    fixed, fixed_bias : numpy.ndarray
+        Factors and biases of the fixed side.
+    global_mean : float
+        Mean rating of the model.
+    reg : float
+        Regularization, scaled by each row's rating count.
+    workers : int, optional
+        Threads solving blocks; defaults to the number of CPUs.
+
+    Returns
+    -------
+    tuple (numpy.ndarray, numpy.ndarray)
+        Factors and biases of `rows`.
+
+    """
+    step = _HalfStep(matrix[rows], fixed.shape[1] + 1)
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        return step.solve(fixed, fixed_bias, global_mean, reg, pool)
+
+
+def rmse(users, items, values, params, rating_scale, chunk=1 << 16):
+    """Root mean squared error of clipped estimates on the given ratings."""
+    global_mean, bu, bi, pu, qi = params
+    if len(values) == 0:
+        return float('nan')
+    total = 0.0
+    for start in range(0, len(values), chunk):
+        u, i = users[start:start + chunk], items[start:start + chunk]
+        est = global_mean + bu[u] + bi[i] + np.einsum('ij,ij->i', pu[u], qi[i])
+        est = np.clip(est, *rating_scale)
+        total += float(np.square(est - values[start:start + chunk]).sum())
+    return float(np.sqrt(total / len(values)))
+
+
+def fit_als(split, ratings, n_factors=200, reg=0.05, n_epochs=30, init_std_dev=0.05,
+            patience=2, min_delta=1e-4, workers=None, seed=0, verbose=True):
+    """Alternating least squares on the given ratings.
+
+    Parameters
+    ----------
+    split : RatingSplit
+        Encoded ratings, including the validation split.
+    ratings : tuple (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        User rows, item rows and ratings to train on (e.g. `split.train`).
+    n_factors : int
+        Number of latent factors.
+    reg : float
+        Regularization, scaled by each user's (or item's) rating count.
+    n_epochs : int
+        Most epochs; each solves the users, then the items.
+    init_std_dev : float
+        Standard deviation of the initial item factors.
+    patience : int
+        Epochs without a validation improvement of at least `min_delta`
+        before stopping (no early stopping without a validation split).
+    workers : int, optional
+        Threads solving blocks; defaults to the number of CPUs.
+    seed : int
+        Seed of the initial factors.
+    verbose : bool
+        Print the validation RMSE of each epoch.
+
+    Returns
+    -------
+    tuple
+        Best parameters (global mean, bu, bi, pu, qi), the epoch they were
+        reached at, and the validation RMSE of each epoch.
+
+    """
+    n_users, n_items = split.shape
+    users, items, values = latest_ratings(*ratings, n_items)
+    matrix = sparse.csr_matrix((values, (users, items)), shape=(n_users, n_items),
+                               dtype=np.float32)
+    by_user = _HalfStep(matrix, n_factors + 1)
+    by_item = _HalfStep(matrix.T.tocsr(), n_factors + 1)
+    global_mean = float(values.mean())
+    rng = np.random.default_rng(seed)
+    qi = rng.normal(0, init_std_dev, (n_items, n_factors)).astype(np.float32)
+    bi = np.zeros(n_items, dtype=np.float32)
+    validation = split.validation if ratings is split.train else ((), (), ())
+    history = []
+    best, best_epoch = None, 0
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for epoch in range(1, n_epochs + 1):
+            start = time.perf_counter()
+            pu, bu = by_user.solve(qi, bi, global_mean, reg, pool)
+            qi, bi = by_item.solve(pu, bu, global_mean, reg, pool)
+            params = (global_mean, bu, bi, pu, qi)
+            if len(validation[2]) == 0:
+                best, best_epoch = params, epoch
+                continue
+            score = rmse(*validation, params, split.rating_scale)
+            history.append(score)
+            if verbose:
+                print(f"epoch {epoch}: validation RMSE {score:.4f} "
+                      f"({time.perf_counter() - start:.2f} s)", file=sys.stderr)
+            if best is None or score < min(history[:-1], default=np.inf) - min_delta:
+                best, best_epoch = params, epoch
+            elif epoch - best_epoch >= patience:
+                break
+    return best, best_epoch, history
+
+
+def train_als(path_to_ratings, save_path, n_factors=200, reg=0.05, n_epochs=30,
+              validation=0.05, patience=2, refit=True, workers=None, seed=0,
+              factor_dtype='float32'):
+    """Train with early stopping, refit on every rating and export.
+
+    Returns
+    -------
+    dict
+        The exported artifact's metadata header.
+
+    """
+    # Importing datasets: userId, movieId (int32) and rating (float32), parsed in chunks
+    ratings = read_ratings(path_to_ratings)
+    split = RatingSplit(ratings, validation, seed)
+    start = time.perf_counter()
+    params, best_epoch, history = fit_als(split, split.train, n_factors, reg, n_epochs,
+                                          patience=patience, workers=workers, seed=seed)
+    if refit and len(split.validation[2]):
+        # The held-out ratings are worth having in the served model
+        params, _, _ = fit_als(split, split.all, n_factors, reg, best_epoch,
+                               workers=workers, seed=seed, verbose=False)
+    train_seconds = time.perf_counter() - start
+    global_mean, bu, bi, pu, qi = params
+    scorer = SVDScorer(global_mean, bu, bi, pu, qi, split.user_ids, split.item_ids,
+                       split.rating_scale)
+    print(f"Training completed in {train_seconds:.1f} s ({best_epoch} epochs). "
+          f"Saving model to: {save_path}")
+    return export_factors(scorer, save_path, factor_dtype, algorithm='als', n_epochs=best_epoch,
+                          reg_all=reg, validation_rmse=min(history, default=None),
+                          train_seconds=round(train_seconds, 2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('Usage')[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ratings', default=os.path.join(REPO_ROOT, 'resources', 'data', 'ratings.csv'))
+    parser.add_argument('--output', default='SVD.factors')
+    parser.add_argument('--factors', type=int, default=200)
+    parser.add_argument('--reg', type=float, default=0.05)
+    parser.add_argument('--epochs', type=int, default=30, help="most epochs")
+    parser.add_argument('--validation', type=float, default=0.05,
+                        help="fraction of ratings held out for early stopping (0 for none)")
+    parser.add_argument('--patience', type=int, default=2)
+    parser.add_argument('--no-refit', dest='refit', action='store_false',
+                        help="export the early-stopped model instead of refitting on every rating")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dtype', default='float32', choices=('float16', 'float32', 'float64'))
+    args = parser.parse_args()
+    train_als(args.ratings, args.output, args.factors, args.reg, args.epochs, args.validation,
+              args.patience, args.refit, args.workers, args.seed, args.dtype)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,33 +7,367 @@
     Description: Simple script to train and save an instance of the
     SVDpp algorithm on MovieLens data.
 
+    Besides a single fit with the default hyperparameters, it can:
+
+    - search hyperparameters (grid or random) on a held-out validation
+      split across a pool of worker processes. The workers are forked
+      after the split is built, so they share the training data read-only.
+      Every trial is checkpointed: its model goes to the checkpoint
+      directory and a line to `trials.jsonl`. An interrupted search
+      resumes where it stopped. The best trial's hyperparameters are
+      refitted on every rating and saved;
+    - retrain incrementally when ratings were only appended since the
+      saved model was trained. Starting from the saved model, only the
+      users and items with new ratings are solved again, by alternating
+      least squares with the same regularization as the SGD fit. This
+      takes a fraction of a full fit. A rewritten ratings file falls
+      back to a full fit.
+
+    Usage (from this directory):
+
+        python train_colbased.py                        # one fit, default hyperparameters
+        python train_colbased.py float16                # same, half-size factors
+        python train_colbased.py --search random --trials 12 --jobs 4
+        python train_colbased.py --search grid --param n_factors=50,100 --param reg_all=0.02,0.05
+        python train_colbased.py --incremental          # nightly refresh
+
 """
 # Script dependencies
+import argparse
+import gc
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import numpy as np
 import pandas as pd
+import scipy.sparse as sparse
 from surprise import SVD
 import surprise
-import pickle
 
-# Importing datasets
-ratings = pd.read_csv('ratings.csv')
-ratings.drop('timestamp',axis=1,inplace=True)
+# Make the app's packages importable when run from this directory
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, REPO_ROOT)
+from recommenders.svd_scorer import SVDScorer
+from recommenders.model_store import export_factors, load_factors, read_meta
+from utils.ingest import iter_rating_chunks, read_ratings
+from train_als import solve_rows
+
+# Hyperparameters of a single fit
+DEFAULT_PARAMS = {'n_factors': 200, 'lr_all': 0.005, 'reg_all': 0.02, 'n_epochs': 40,
+                  'init_std_dev': 0.05}
+# Values tried by the hyperparameter search, unless given with --param
+SEARCH_SPACE = {'n_factors': [50, 100, 200], 'lr_all': [0.002, 0.005, 0.01],
+                'reg_all': [0.02, 0.05, 0.1], 'n_epochs': [20, 40],
+                'init_std_dev': [0.05, 0.1]}
+# Number of leading bytes of the ratings file fingerprinted to detect rewrites
+HEAD_BYTES = 1 << 16
+
+# Training data of the search, built before the workers are forked
+_search_data = {}
+
+def ratings_position(path_to_ratings):
+    """Byte offset past the last complete line of the ratings file, and a
+    digest of the bytes before it (up to `HEAD_BYTES`)."""
+    with open(path_to_ratings, 'rb') as f:
+        head = f.read(HEAD_BYTES)
+        size = os.fstat(f.fileno()).st_size
+        f.seek(max(0, size - 1))
+        # A trailing row without a newline is still being written
+        offset = size if f.read(1) == b'\n' else None
+    if offset is None:
+        with open(path_to_ratings, 'rb') as f:
+            offset = f.read().rfind(b'\n') + 1
+    return offset, hashlib.sha1(head[:min(offset, HEAD_BYTES)]).hexdigest()
+
+def appended_since(path_to_ratings, meta):
+    """Ratings appended since the model described by `meta` was trained.
+
+    Returns
+    -------
+    pandas.DataFrame or None
+        The new ratings, or None if the file was rewritten or the model
+        does not record which ratings it was trained on.
 
-def svd_pp(save_path):
+    """
+    offset = meta.get('ratings_offset')
+    if offset is None:
+        return None
+    with open(path_to_ratings, 'rb') as f:
+        head = f.read(min(offset, HEAD_BYTES))
+        size = os.fstat(f.fileno()).st_size
+    if size < offset or hashlib.sha1(head).hexdigest() != meta.get('ratings_digest'):
+        return None
+    chunks = [chunk for chunk, _ in iter_rating_chunks(path_to_ratings, offset)]
+    if not chunks:
+        return pd.DataFrame({'userId': [], 'movieId': [], 'rating': []})
+    return pd.concat(chunks, ignore_index=True)
+
+def build_trainset(ratings):
     # Check the range of the rating
-    min_rat = ratings['rating'].min()
-    max_rat = ratings['rating'].max()
+    min_rat = float(ratings['rating'].min())
+    max_rat = float(ratings['rating'].max())
     # Changing ratings to their standard form
     reader = surprise.Reader(rating_scale = (min_rat,max_rat))
     # Loading the data frame using surprice
-    data_load = surprise.Dataset.load_from_df(ratings, reader)
+    data_load = surprise.Dataset.load_from_df(ratings[['userId', 'movieId', 'rating']], reader)
+    return data_load.build_full_trainset()
+
+def svd_pp(path_to_ratings, save_path, factor_dtype='float32', params=None):
+    """Fit SVD on every rating and save its factors.
+
+    Parameters
+    ----------
+    path_to_ratings : str
+        Ratings .csv file.
+    save_path : str
+        Artifact directory written by `export_factors`.
+    factor_dtype : str
+        Storage type of the factors; 'float16' halves the size.
+    params : dict, optional
+        Hyperparameters of `surprise.SVD`; `DEFAULT_PARAMS` by default.
+
+    Returns
+    -------
+    dict
+        The saved artifact's metadata header.
+
+    """
+    params = dict(DEFAULT_PARAMS, **(params or {}))
+    # Recorded first: ratings appended while training are left for the next refresh
+    offset, digest = ratings_position(path_to_ratings)
+    # Importing datasets: userId, movieId (int32) and rating (float32), parsed in chunks
+    ratings = read_ratings(path_to_ratings)
     # Insatntiating surpricce
-    method = SVD(n_factors = 200 , lr_all = 0.005 , reg_all = 0.02 , n_epochs = 40 , init_std_dev = 0.05)
+    method = SVD(**params)
     # Loading a trainset into the model
-    model = method.fit(data_load.build_full_trainset())
+    model = method.fit(build_trainset(ratings))
     print (f"Training completed. Saving model to: {save_path}")
+    # Only biases, factors and id maps are kept; factor_dtype='float16' halves the size
+    return export_factors(SVDScorer.from_model(model), save_path, factor_dtype,
+                          ratings_offset=offset, ratings_digest=digest, **params)
+
+def prepare_search(path_to_ratings, validation=0.1, seed=0):
+    """Split the ratings and build the training set shared by the trials."""
+    ratings = read_ratings(path_to_ratings)
+    held_out = np.random.default_rng(seed).random(len(ratings)) < validation
+    test = ratings[held_out]
+    _search_data.update(trainset=build_trainset(ratings[~held_out]),
+                        users=test['userId'].to_numpy(), items=test['movieId'].to_numpy(),
+                        ratings=test['rating'].to_numpy(dtype=np.float64))
+
+def run_trial(number, params, checkpoint_dir, factor_dtype='float32', seed=0):
+    """Fit one set of hyperparameters on the training split and checkpoint it.
+
+    Returns
+    -------
+    dict
+        Trial number, hyperparameters, validation RMSE, training time and
+        the checkpoint's path.
+
+    """
+    start = time.perf_counter()
+    model = SVD(random_state=seed, **params).fit(_search_data['trainset'])
+    train_seconds = time.perf_counter() - start
+    scorer = SVDScorer.from_model(model)
+    error = scorer.predict(_search_data['users'], _search_data['items']) - _search_data['ratings']
+    rmse = float(np.sqrt(np.mean(np.square(error))))
+    path = os.path.join(checkpoint_dir, f'trial-{number:03d}.factors')
+    export_factors(scorer, path, factor_dtype, validation_rmse=rmse, **params)
+    return {'trial': number, **params, 'validation_rmse': rmse,
+            'train_seconds': round(train_seconds, 2), 'checkpoint': path}
+
+def search_configs(search, space, trials, seed=0):
+    """Hyperparameter sets of a grid or random search."""
+    grid = [dict(zip(space, values)) for values in itertools.product(*space.values())]
+    if search == 'grid':
+        return grid
+    picks = np.random.default_rng(seed).permutation(len(grid))[:trials]
+    return [grid[i] for i in sorted(picks)]
+
+def hyperparameter_search(path_to_ratings, save_path, configs, checkpoint_dir, jobs=None,
+                          validation=0.1, factor_dtype='float32', refit=True, seed=0):
+    """Run the trials in parallel, then save the best.
+
+    Trials already recorded in `checkpoint_dir/trials.jsonl` (with their
+    checkpoint still present) are not run again.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Every trial, best first.
+
+    """
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    log_path = os.path.join(checkpoint_dir, 'trials.jsonl')
+    done = []
+    if os.path.exists(log_path):
+        with open(log_path) as f:
+            done = [json.loads(line) for line in f if line.strip()]
+        done = [t for t in done if os.path.isdir(t['checkpoint'])]
+    finished = [{k: t[k] for k in DEFAULT_PARAMS} for t in done]
+    pending = [params for params in configs if params not in finished]
+    number = max((t['trial'] for t in done), default=0)
+    print(f"{len(pending)} trials to run, {len(configs) - len(pending)} already checkpointed",
+          file=sys.stderr)
+
+    if pending:
+        prepare_search(path_to_ratings, validation, seed)
+        # Keep the collector off the shared training data, so the forked
+        # workers do not copy the pages holding it
+        gc.freeze()
+        with ProcessPoolExecutor(max_workers=jobs or os.cpu_count(),
+                                 mp_context=multiprocessing.get_context('fork')) as pool:
+            futures = [pool.submit(run_trial, number + i, params, checkpoint_dir, factor_dtype, seed)
+                       for i, params in enumerate(pending, start=1)]
+            for future in as_completed(futures):
+                trial = future.result()
+                with open(log_path, 'a') as f:
+                    f.write(json.dumps(trial) + '\n')
+                done.append(trial)
+                print(f"trial {trial['trial']}: validation RMSE {trial['validation_rmse']:.4f} "
+                      f"({trial['train_seconds']} s)", file=sys.stderr)
+        gc.unfreeze()
+
+    # Only the trials of this search compete, not others logged in the same directory
+    trials = pd.DataFrame([t for t in done if {k: t[k] for k in DEFAULT_PARAMS} in configs])
+    trials = trials.sort_values('validation_rmse')
+    best = trials.iloc[0]
+    params = {k: type(DEFAULT_PARAMS[k])(best[k]) for k in DEFAULT_PARAMS}
+    print(f"Best trial {best['trial']}: {params}, validation RMSE {best['validation_rmse']:.4f}")
+    if refit:
+        # The held-out ratings are worth having in the saved model
+        svd_pp(path_to_ratings, save_path, factor_dtype, params)
+    else:
+        scorer = load_factors(best['checkpoint'], mmap=False)
+        export_factors(scorer, save_path, factor_dtype, validation_rmse=best['validation_rmse'],
+                       **params)
+    return trials
+
+def incremental_update(path_to_ratings, save_path, factor_dtype='float32', sweeps=2, reg=None,
+                       workers=None):
+    """Update the saved model for ratings appended since it was trained.
+
+    Starts from the saved model, adds users and items seen for the first
+    time, and solves the users, then the items, with new ratings again
+    against every rating; everything else is kept.
+
+    Parameters
+    ----------
+    sweeps : int
+        Rounds of solving the users, then the items.
+    reg : float, optional
+        Regularization, scaled by each row's rating count; defaults to
+        the model's `reg_all` (SGD's per-rating regularization amounts to
+        the same penalty).
+
+    Returns
+    -------
+    dict
+        The saved artifact's metadata header; a full fit's if the ratings
+        file was rewritten or the model does not record its ratings.
+
+    """
+    meta = read_meta(save_path) if os.path.isdir(save_path) else {}
+    new = appended_since(path_to_ratings, meta)
+    if new is None:
+        print("The saved model cannot be updated incrementally: running a full fit",
+              file=sys.stderr)
+        return svd_pp(path_to_ratings, save_path, factor_dtype,
+                      {k: meta.get(k, v) for k, v in DEFAULT_PARAMS.items()})
+    if len(new) == 0:
+        print("No new ratings since the saved model was trained")
+        return meta
+    offset, digest = ratings_position(path_to_ratings)
+    # A movie rated again by the same user keeps its latest rating
+    ratings = read_ratings(path_to_ratings).drop_duplicates(['userId', 'movieId'], keep='last')
+    model = load_factors(save_path, mmap=False)
+
+    start = time.perf_counter()
+    # Users and items seen for the first time start from zero
+    new_users = np.setdiff1d(new['userId'].to_numpy(), model.user_ids)
+    new_items = np.setdiff1d(new['movieId'].to_numpy(), model.item_ids)
+    user_ids = np.concatenate([model.user_ids, new_users.astype(model.user_ids.dtype)])
+    item_ids = np.concatenate([model.item_ids, new_items.astype(model.item_ids.dtype)])
+    n_factors = model.qi.shape[1]
+    pu = np.vstack([model.pu, np.zeros((len(new_users), n_factors))]).astype(np.float32)
+    qi = np.vstack([model.qi, np.zeros((len(new_items), n_factors))]).astype(np.float32)
+    bu = np.concatenate([model.bu, np.zeros(len(new_users))]).astype(np.float32)
+    bi = np.concatenate([model.bi, np.zeros(len(new_items))]).astype(np.float32)
+    extended = SVDScorer(model.global_mean, bu, bi, pu, qi, user_ids, item_ids,
+                         model.rating_scale)
+    users = extended.user_rows(ratings['userId'].to_numpy())
+    items = extended.item_rows(ratings['movieId'].to_numpy())
+    by_user = sparse.csr_matrix((ratings['rating'].to_numpy(dtype=np.float32), (users, items)),
+                                shape=(len(user_ids), len(item_ids)))
+    by_item = by_user.T.tocsr()
+    touched_users = np.unique(extended.user_rows(new['userId'].to_numpy()))
+    touched_items = np.unique(extended.item_rows(new['movieId'].to_numpy()))
+    if reg is None:
+        reg = meta.get('reg_all', DEFAULT_PARAMS['reg_all'])
+    for _ in range(sweeps):
+        pu[touched_users], bu[touched_users] = solve_rows(
+            by_user, touched_users, qi, bi, model.global_mean, reg, workers)
+        qi[touched_items], bi[touched_items] = solve_rows(
+            by_item, touched_items, pu, bu, model.global_mean, reg, workers)
+    print(f"Updated {len(touched_users)} users and {len(touched_items)} items for "
+          f"{len(new)} new ratings in {time.perf_counter() - start:.2f} s. "
+          f"Saving model to: {save_path}")
+    kept = {k: v for k, v in meta.items() if k in DEFAULT_PARAMS or k == 'source'}
+    return export_factors(extended, save_path, factor_dtype, ratings_offset=offset,
+                          ratings_digest=digest,
+                          incremental_updates=meta.get('incremental_updates', 0) + 1, **kept)
+
+def parse_space(overrides):
+    """The search space, with 'name=v1,v2' overrides from the command line."""
+    space = dict(SEARCH_SPACE)
+    for override in overrides:
+        name, _, values = override.partition('=')
+        if name not in DEFAULT_PARAMS:
+            raise SystemExit(f"Unknown hyperparameter: {name}")
+        space[name] = [type(DEFAULT_PARAMS[name])(v) for v in values.split(',')]
+    return space
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('Usage')[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('dtype', nargs='?', default='float32',
+                        choices=('float16', 'float32', 'float64'), help="factor storage type")
+    parser.add_argument('--ratings', default=os.path.join(REPO_ROOT, 'resources', 'data', 'ratings.csv'))
+    parser.add_argument('--output', default='SVD.factors')
+    parser.add_argument('--search', choices=('grid', 'random'),
+                        help="search hyperparameters instead of using the defaults")
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=V1,V2',
+                        help="values searched for one hyperparameter (repeatable)")
+    parser.add_argument('--trials', type=int, default=12, help="trials of a random search")
+    parser.add_argument('--validation', type=float, default=0.1)
+    parser.add_argument('--checkpoints', default='search_checkpoints')
+    parser.add_argument('--no-refit', dest='refit', action='store_false',
+                        help="save the best checkpoint instead of refitting on every rating")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count())
+    parser.add_argument('--incremental', action='store_true',
+                        help="update the saved model for appended ratings")
+    parser.add_argument('--sweeps', type=int, default=2, help="ALS sweeps of an incremental update")
+    parser.add_argument('--reg', type=float, default=None,
+                        help="regularization of an incremental update (defaults to the model's reg_all)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
 
-    return pickle.dump(model, open(save_path,'wb'))
+    if args.incremental:
+        incremental_update(args.ratings, args.output, args.dtype, args.sweeps, args.reg, args.jobs)
+    elif args.search:
+        configs = search_configs(args.search, parse_space(args.param), args.trials, args.seed)
+        trials = hyperparameter_search(args.ratings, args.output, configs, args.checkpoints,
+                                       args.jobs, args.validation, args.dtype, args.refit,
+                                       args.seed)
+        pd.set_option('display.width', 200)
+        print(trials.drop(columns='checkpoint').round(4).to_string(index=False))
+    else:
+        svd_pp(args.ratings, args.output, args.dtype)
 
 if __name__ == '__main__':
-    svd_pp('SVD.pkl')
+    main()
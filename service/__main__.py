@@ -0,0 +1,63 @@
+"""
+
+    Command line of the recommendation service.
+
+    Author: Explore Data Science Academy.
+
+    Description: `serve` runs the pre-fork HTTP server, `batch` answers a
+    JSON Lines file of requests offline. Both load the data and models
+    relative to the working directory, like the app.
+
+    Usage (from the repository root):
+
+        python -m service serve --listen 127.0.0.1:8765 --workers 4
+        python -m service serve --listen unix:/tmp/recommender.sock
+        python -m service batch requests.jsonl results.jsonl --jobs 4
+
+    Point the app at a running server with, e.g.,
+    RECOMMENDER_SERVICE=http://127.0.0.1:8765 streamlit run edsa_recommender.py
+
+"""
+# Script dependencies
+import argparse
+import sys
+import time
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m service', description=__doc__.split('Usage')[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve', help='run the pre-fork HTTP server')
+    serve.add_argument('--listen', default='127.0.0.1:8765',
+                       help="'host:port' or 'unix:/path/to.sock'")
+    serve.add_argument('--workers', type=int, default=None, help='defaults to the number of CPUs')
+    serve.add_argument('--verbose', action='store_true', help='log every request')
+    serve.add_argument('--reload-interval', type=float, default=60.0,
+                       help='seconds between checks for new data and models (0 disables)')
+    batch = commands.add_parser('batch', help='answer a JSON Lines file of requests')
+    batch.add_argument('input')
+    batch.add_argument('output')
+    batch.add_argument('--jobs', type=int, default=None, help='defaults to the number of CPUs')
+    batch.add_argument('--chunk-size', type=int, default=64)
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        # Loads every model, before the workers are forked
+        from service.server import serve as run_server
+        run_server(args.listen, args.workers, args.verbose, args.reload_interval)
+    else:
+        from service.batch import read_requests, run_batch, write_results
+        requests = read_requests(args.input)
+        start = time.perf_counter()
+        results = run_batch(requests, args.jobs, args.chunk_size)
+        elapsed = time.perf_counter() - start
+        write_results(results, args.output)
+        failed = sum('error' in r for r in results)
+        print(f"{len(results)} requests ({failed} failed) in {elapsed:.2f} s, "
+              f"{len(results) / max(elapsed, 1e-9):.0f} req/s; results written to {args.output}",
+              file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
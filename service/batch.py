@@ -0,0 +1,73 @@
+"""
+
+    Offline batch recommendations.
+
+    Author: Explore Data Science Academy.
+
+    Description: Answers a JSON Lines file of requests (one `service.engine`
+    request per line, optionally with an "id" echoed back) with a JSON
+    Lines file of results, in the same order. Requests are split into
+    chunks answered by forked worker processes, which share the models
+    loaded by the parent, and every chunk is answered as one batch.
+
+"""
+# Script dependencies
+import gc
+import json
+import multiprocessing
+import os
+
+from service import engine
+
+
+def read_requests(path):
+    """Requests of a JSON Lines file; blank lines are skipped."""
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _answer(chunk):
+    return engine.recommend_batch(chunk)
+
+
+def run_batch(requests, jobs=None, chunk_size=64):
+    """Answer requests in parallel batches.
+
+    Parameters
+    ----------
+    requests : list (dict)
+        Requests; see `service.engine`.
+    jobs : int, optional
+        Worker processes; defaults to the number of CPUs.
+    chunk_size : int
+        Requests answered per batch.
+
+    Returns
+    -------
+    list (dict)
+        One result per request, in order, carrying the request's "id"
+        when it has one.
+
+    """
+    jobs = jobs or os.cpu_count() or 1
+    chunks = [requests[i:i + chunk_size] for i in range(0, len(requests), chunk_size)]
+    if jobs == 1 or len(chunks) <= 1:
+        answers = [_answer(chunk) for chunk in chunks]
+    else:
+        # Forked workers share the models loaded by this process
+        gc.freeze()
+        context = multiprocessing.get_context('fork')
+        with context.Pool(jobs) as pool:
+            answers = pool.map(_answer, chunks)
+    results = [result for answer in answers for result in answer]
+    for request, result in zip(requests, results):
+        if isinstance(request, dict) and 'id' in request:
+            result['id'] = request['id']
+    return results
+
+
+def write_results(results, path):
+    """Write results as JSON Lines."""
+    with open(path, 'w', encoding='utf-8') as f:
+        for result in results:
+            f.write(json.dumps(result) + '\n')
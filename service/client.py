@@ -0,0 +1,142 @@
+"""
+
+    Thin client of the recommendation service.
+
+    Author: Explore Data Science Academy.
+
+    Description: Sends requests to a running `python -m service serve`
+    over HTTP or a Unix domain socket, one request per connection (the
+    server's workers are synchronous). Importing this module loads no
+    data or models, so the Streamlit app stays light when the service
+    does the work.
+
+"""
+# Script dependencies
+import http.client
+import json
+import socket
+import threading
+from urllib.parse import urlsplit
+
+
+class ServiceError(RuntimeError):
+    """The service rejected or failed a request."""
+
+
+class ServiceUnavailable(ServiceError):
+    """The service could not be reached."""
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP over a Unix domain socket."""
+
+    def __init__(self, path, timeout):
+        super().__init__('localhost', timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class RecommenderClient:
+    """Client of one recommendation service.
+
+    Parameters
+    ----------
+    address : str
+        'http://host:port', or 'unix:/path/to.sock' for a Unix domain socket.
+    timeout : float
+        Seconds to wait for the service.
+
+    """
+
+    def __init__(self, address, timeout=10.0):
+        self.address = address
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        if self.address.startswith('unix:'):
+            return _UnixHTTPConnection(self.address[len('unix:'):], self.timeout)
+        url = urlsplit(self.address)
+        return http.client.HTTPConnection(url.hostname, url.port or 80, timeout=self.timeout)
+
+    def _close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+        self._local.conn = None
+
+    def _call(self, method, path, payload=None):
+        body = None if payload is None else json.dumps(payload).encode('utf-8')
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        # Connecting can fail transiently, e.g. while the server restarts: retry
+        # that once, but never resend a request the service may be working on
+        for attempt in range(2):
+            conn = getattr(self._local, 'conn', None)
+            if conn is None:
+                conn = self._local.conn = self._connect()
+            try:
+                if conn.sock is None:
+                    conn.connect()
+                break
+            except (ConnectionRefusedError, FileNotFoundError) as e:
+                self._close()
+                if attempt:
+                    raise ServiceUnavailable(f"{self.address}: {e}") from e
+            except OSError as e:
+                # Including a connect timeout: waiting again would double it
+                self._close()
+                raise ServiceUnavailable(f"{self.address}: {e}") from e
+        try:
+            conn.request(method, path, body, headers)
+            response = conn.getresponse()
+            data = json.loads(response.read() or b'null')
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            self._close()
+            raise ServiceUnavailable(f"{self.address}: {e}") from e
+        if response.status != 200:
+            message = data.get('error') if isinstance(data, dict) else data
+            raise ServiceError(f"{response.status}: {message}")
+        return data
+
+    def health(self):
+        """The service's health report."""
+        return self._call('GET', '/health')
+
+    def recommend(self, algorithm, movie_list, top_n=10):
+        """Titles recommended by the service.
+
+        Parameters
+        ----------
+        algorithm : str
+            'content', 'collab' or 'hybrid'.
+        movie_list : list (str)
+            Favorite movies chosen by the app user.
+        top_n : int
+            Number of top recommendations to return to the user.
+
+        Raises
+        ------
+        ServiceError
+            If the request was rejected (e.g. an unknown movie) or failed.
+        ServiceUnavailable
+            If the service could not be reached.
+
+        """
+        return self._call('POST', '/recommend', {'algorithm': algorithm,
+                                                 'movie_list': list(movie_list),
+                                                 'top_n': int(top_n)})['titles']
+
+    def recommend_batch(self, requests):
+        """Results of several requests in one round trip.
+
+        Returns
+        -------
+        list (dict)
+            Per request, in order: {"titles": [...]} or {"error": "..."}.
+
+        """
+        return self._call('POST', '/recommend/batch', {'requests': list(requests)})['results']
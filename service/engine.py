@@ -0,0 +1,127 @@
+"""
+
+    Request handling shared by the recommendation server and batch mode.
+
+    Author: Explore Data Science Academy.
+
+    Description: Validates recommendation requests and dispatches them to
+    the recommenders. A request is a dict:
+
+        {"algorithm": "content" | "collab" | "hybrid",
+         "movie_list": ["Toy Story (1995)", ...], "top_n": 10}
+
+    Batches are grouped by algorithm, so collaborative fold-in requests
+    share one scoring pass. Importing this module loads every model; the
+    server does so once, before forking its workers, so they all share
+    the same memory-mapped arrays.
+
+"""
+# Script dependencies
+from recommenders.collaborative_based import collab_model, collab_model_batch
+from recommenders.content_based import content_model
+from recommenders.hybrid_based import hybrid_model
+
+# Most recommendations a single request may ask for
+MAX_TOP_N = 100
+
+
+def _one_by_one(model):
+    """Batch version of a `(movie_list, top_n)` recommender."""
+    def batch(movie_lists, top_n=10):
+        return [model(movie_list, top_n) for movie_list in movie_lists]
+    return batch
+
+
+# Single and batch entry points of each algorithm
+ALGORITHMS = {'content': (content_model, _one_by_one(content_model)),
+              'collab': (collab_model, collab_model_batch),
+              'hybrid': (hybrid_model, _one_by_one(hybrid_model))}
+
+
+class RequestError(ValueError):
+    """A malformed request, or one naming unknown movies."""
+
+
+def parse_request(request):
+    """Validate a request dict.
+
+    Returns
+    -------
+    tuple (str, tuple (str), int)
+        Algorithm, favourite movies and number of recommendations.
+
+    Raises
+    ------
+    RequestError
+        If a field is missing or invalid.
+
+    """
+    if not isinstance(request, dict):
+        raise RequestError("a request must be a JSON object")
+    algorithm = request.get('algorithm')
+    if algorithm not in ALGORITHMS:
+        raise RequestError(f"unknown algorithm {algorithm!r}; expected one of {sorted(ALGORITHMS)}")
+    movie_list = request.get('movie_list')
+    if not isinstance(movie_list, list) or not movie_list or \
+            not all(isinstance(m, str) for m in movie_list):
+        raise RequestError("movie_list must be a non-empty list of titles")
+    top_n = request.get('top_n', 10)
+    if not isinstance(top_n, int) or not 0 < top_n <= MAX_TOP_N:
+        raise RequestError(f"top_n must be an integer between 1 and {MAX_TOP_N}")
+    return algorithm, tuple(movie_list), top_n
+
+
+def recommend(request):
+    """Recommendations for one request.
+
+    Raises
+    ------
+    RequestError
+        If the request is invalid or names an unknown movie.
+
+    """
+    algorithm, movie_list, top_n = parse_request(request)
+    try:
+        return ALGORITHMS[algorithm][0](list(movie_list), top_n)
+    except KeyError as e:
+        raise RequestError(f"unknown movie {e.args[0]!r}") from None
+
+
+def recommend_batch(requests):
+    """Recommendations for several requests.
+
+    Requests are grouped by algorithm and number of recommendations and
+    answered with each algorithm's batch entry point; an invalid request
+    only fails itself.
+
+    Returns
+    -------
+    list (dict)
+        Per request, in order: {"titles": [...]} or {"error": "..."}.
+
+    """
+    results = [None] * len(requests)
+    groups = {}
+    for i, request in enumerate(requests):
+        try:
+            algorithm, movie_list, top_n = parse_request(request)
+        except RequestError as e:
+            results[i] = {'error': str(e)}
+            continue
+        groups.setdefault((algorithm, top_n), []).append((i, movie_list))
+    for (algorithm, top_n), members in groups.items():
+        batch = ALGORITHMS[algorithm][1]
+        try:
+            titles = batch([list(m) for _, m in members], top_n)
+        except KeyError:
+            # Some request names an unknown movie: answer them one at a time
+            titles = []
+            for _, movie_list in members:
+                try:
+                    titles.append(batch([list(movie_list)], top_n)[0])
+                except KeyError as e:
+                    titles.append(RequestError(f"unknown movie {e.args[0]!r}"))
+        for (i, _), result in zip(members, titles):
+            results[i] = {'error': str(result)} if isinstance(result, Exception) else \
+                {'titles': list(result)}
+    return results
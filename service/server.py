@@ -0,0 +1,211 @@
+"""
+
+    Pre-fork HTTP recommendation server.
+
+    Author: Explore Data Science Academy.
+
+    Description: Loads every model once in the parent process, binds one
+    listening socket (TCP or Unix domain) and forks a pool of worker
+    processes that accept connections from it. The workers share the
+    parent's memory copy-on-write, and the movie snapshot and SVD factors
+    are memory-mapped read-only, so each extra worker costs little memory
+    while throughput scales with the cores. Workers that die are
+    replaced; SIGTERM or SIGINT stops the pool. Each worker checks for new
+    data and model files and swaps them in without a restart.
+
+    Endpoints (JSON in and out, see `service.engine` for requests):
+
+        GET  /health            {"status": "ok", "pid": ..., "algorithms": [...],
+                                 "versions": {"content": "v1-...", ...}}
+        POST /recommend         request -> {"titles": [...]}
+        POST /recommend/batch   {"requests": [...]} -> {"results": [...]}
+
+"""
+# Script dependencies
+import gc
+import json
+import os
+import signal
+import socketserver
+import sys
+import time
+from http.server import BaseHTTPRequestHandler
+
+from service import engine
+from utils.model_registry import REGISTRIES, start_watcher
+from utils.result_cache import RESULT_CACHE
+
+# Largest request body accepted, in bytes
+MAX_BODY = 1 << 20
+# Most requests in one batch
+MAX_BATCH = 1000
+
+
+class RecommendationHandler(BaseHTTPRequestHandler):
+    """Answers the service's JSON endpoints."""
+
+    # One request per connection: a synchronous worker must not sit on a
+    # client's idle keep-alive connection while other clients queue
+    protocol_version = 'HTTP/1.0'
+    server_version = 'RecommenderService/1.0'
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY:
+            raise engine.RequestError(f"request body over {MAX_BODY} bytes")
+        try:
+            return json.loads(self.rfile.read(length) or b'null')
+        except ValueError:
+            raise engine.RequestError("request body is not valid JSON") from None
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send(200, {'status': 'ok', 'pid': os.getpid(),
+                             'algorithms': sorted(engine.ALGORITHMS),
+                             'versions': {r.name: r.status()['version'] for r in REGISTRIES}})
+        else:
+            self._send(404, {'error': f"no such endpoint: {self.path}"})
+
+    def do_POST(self):
+        try:
+            payload = self._read_json()
+            if self.path == '/recommend':
+                self._send(200, {'titles': engine.recommend(payload)})
+            elif self.path == '/recommend/batch':
+                requests = payload.get('requests') if isinstance(payload, dict) else None
+                if not isinstance(requests, list) or len(requests) > MAX_BATCH:
+                    raise engine.RequestError(f"requests must be a list of at most {MAX_BATCH}")
+                self._send(200, {'results': engine.recommend_batch(requests)})
+            else:
+                self._send(404, {'error': f"no such endpoint: {self.path}"})
+        except engine.RequestError as e:
+            self._send(400, {'error': str(e)})
+        except Exception as e:
+            # Keep the worker alive; the client sees what went wrong
+            self.log_message("%s", repr(e))
+            self._send(500, {'error': f"{type(e).__name__}: {e}"})
+
+    def log_message(self, format, *args):
+        # Unix socket peers have no address to report
+        sys.stderr.write(f"[worker {os.getpid()}] {format % args}\n")
+
+    def log_request(self, code='-', size='-'):
+        if self.server.verbose:
+            super().log_request(code, size)
+
+
+class _TCPServer(socketserver.TCPServer):
+    allow_reuse_address = True
+    request_queue_size = 128
+    verbose = False
+
+
+class _UnixServer(socketserver.UnixStreamServer):
+    request_queue_size = 128
+    verbose = False
+
+
+def make_server(address, verbose=False):
+    """Bind the listening socket.
+
+    Parameters
+    ----------
+    address : str
+        'host:port' for TCP, or 'unix:/path/to.sock' for a Unix domain socket.
+    verbose : bool
+        Log every request to stderr.
+
+    """
+    if address.startswith('unix:'):
+        path = address[len('unix:'):]
+        if os.path.exists(path):
+            # Left behind by a server that did not shut down cleanly
+            os.unlink(path)
+        server = _UnixServer(path, RecommendationHandler)
+    else:
+        host, _, port = address.rpartition(':')
+        server = _TCPServer((host or '127.0.0.1', int(port)), RecommendationHandler)
+    server.verbose = verbose
+    return server
+
+
+def serve(address, workers=None, verbose=False, reload_interval=60.0):
+    """Run the pre-fork server until SIGTERM or SIGINT.
+
+    Parameters
+    ----------
+    address : str
+        See `make_server`.
+    workers : int, optional
+        Worker processes; defaults to the number of CPUs.
+    verbose : bool
+        Log every request to stderr.
+    reload_interval : float
+        Seconds between each worker's checks for new data and model
+        files; 0 disables them.
+
+    """
+    workers = workers or os.cpu_count() or 1
+    server = make_server(address, verbose)
+    # Objects loaded so far are never collected: keeping the collector away
+    # from them keeps the pages the workers share from being copied
+    gc.freeze()
+    children = {}
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            # Workers must not race each other writing a persisted cache
+            RESULT_CACHE.path = None
+            # Threads do not survive the fork: each worker watches for itself
+            if reload_interval > 0:
+                start_watcher(reload_interval)
+            try:
+                server.serve_forever()
+            finally:
+                os._exit(0)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    for _ in range(workers):
+        spawn()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    print(f"Serving on {address} with {workers} workers (parent pid {os.getpid()})",
+          file=sys.stderr)
+    try:
+        while children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            started = children.pop(pid, None)
+            if not stopping and started is not None:
+                print(f"Worker {pid} exited with status {status}; restarting", file=sys.stderr)
+                # Do not spin on a worker that dies straight away
+                if time.monotonic() - started < 1.0:
+                    time.sleep(1.0)
+                spawn()
+    finally:
+        server.server_close()
+        if isinstance(server, _UnixServer) and os.path.exists(server.server_address):
+            os.unlink(server.server_address)
@@ -0,0 +1,34 @@
+"""
+
+    Tests of the recommendation result cache.
+
+    Author: Explore Data Science Academy.
+
+    Description: A result computed while the models' version changes must
+    not be cached under the version read before computing it.
+
+"""
+# Script dependencies
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from utils.result_cache import ResultCache, cached
+
+
+def test_result_is_not_stored_if_the_version_changes_while_computing():
+    cache = ResultCache(maxsize=8, ttl=0)
+    state = {'version': 'v1', 'calls': 0}
+
+    @cached('algo', lambda: state['version'], cache=cache)
+    def recommend(movie_list, top_n=10):
+        state['calls'] += 1
+        state['version'] = 'v2'
+        return ['built from v2']
+
+    assert recommend(['a'], 1) == ['built from v2']
+    assert len(cache) == 0
+
+    assert recommend(['a'], 1) == ['built from v2']
+    assert recommend(['a'], 1) == ['built from v2']
+    assert state['calls'] == 2
@@ -0,0 +1,42 @@
+"""
+
+    Tests of the ALS trainer.
+
+    Author: Explore Data Science Academy.
+
+    Description: Repeated ratings of a movie by the same user must count
+    once, with the latest rating, rather than be added up.
+
+"""
+# Script dependencies
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(REPO_ROOT, 'resources', 'models'))
+from train_als import RatingSplit, fit_als, latest_ratings
+
+
+def test_latest_ratings_keeps_the_last_of_repeated_pairs():
+    users = np.array([0, 0, 1, 0])
+    items = np.array([1, 2, 1, 1])
+    values = np.array([4.0, 3.0, 5.0, 2.0], dtype=np.float32)
+    kept = latest_ratings(users, items, values, n_items=3)
+    assert [tuple(map(float, row)) for row in zip(*kept)] == [(0, 2, 3.0), (1, 1, 5.0), (0, 1, 2.0)]
+
+
+def test_fit_als_does_not_add_up_repeated_ratings():
+    ratings = pd.DataFrame({'userId': [1, 1, 2, 2], 'movieId': [10, 10, 10, 20],
+                            'rating': [4.0, 2.0, 3.0, 5.0]})
+    split = RatingSplit(ratings)
+    params, _, _ = fit_als(split, split.all, n_factors=2, reg=1e-3, n_epochs=5,
+                           workers=1, verbose=False)
+    global_mean, bu, bi, pu, qi = params
+    # Mean of the ratings kept: 2.0, 3.0 and 5.0
+    assert global_mean == np.float32(10 / 3)
+    estimate = global_mean + bu[0] + bi[0] + pu[0] @ qi[0]
+    # The latest rating (2.0) is fitted, not the sum of both (6.0)
+    assert abs(estimate - 2.0) < 0.1
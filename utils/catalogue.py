@@ -0,0 +1,67 @@
+"""
+
+    Compact, column-wise movie catalogue.
+
+    Author: Explore Data Science Academy.
+
+    Description: Holds the movie catalogue as int32 Movie IDs, titles in
+    the snapshot's memory-mapped UTF-8 buffer (decoded only when
+    accessed) and dictionary-encoded genres: the ~62k genre strings
+    collapse to small integer codes into a table of the distinct genre
+    combinations. Every structure the recommenders derive from the
+    catalogue (title, genre and content indexes) shares these columns.
+
+"""
+# Data handling dependencies
+import numpy as np
+import pandas as pd
+
+from utils.snapshot import StringColumn
+
+
+class MovieCatalogue:
+    """Movie IDs, titles and genres, one entry per catalogue row.
+
+    Parameters
+    ----------
+    movie_ids : array-like (int)
+        MovieLens Movie IDs.
+    titles : StringColumn or sequence (str)
+        Titles aligned with `movie_ids`.
+    genres : pandas.Categorical or sequence (str)
+        Pipe-separated genres aligned with `movie_ids`.
+
+    """
+
+    def __init__(self, movie_ids, titles, genres):
+        self.ids = np.asarray(movie_ids, dtype=np.int32)
+        self.titles = titles if isinstance(titles, StringColumn) else \
+            StringColumn.from_strings(titles)
+        self.genres = genres if isinstance(genres, pd.Categorical) else \
+            pd.Categorical(np.asarray(genres, dtype=object))
+
+    @classmethod
+    def from_columns(cls, columns):
+        """Build the catalogue from `load_snapshot` columns."""
+        genres = columns['genres']
+        if isinstance(genres, StringColumn):
+            genres = genres.to_numpy()
+        return cls(columns['movieId'], columns['title'], pd.Categorical(genres))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def release_years(self):
+        """Release year parsed from the end of each title; NaN where absent."""
+        years = pd.Series(self.titles.to_numpy(), dtype=object).str.extract(
+            r'\((\d{4})(?:[-–]\d{0,4})?\)\s*$', expand=False)
+        return pd.to_numeric(years).to_numpy(dtype=np.float64)
+
+    def to_frame(self):
+        """The catalogue as a movieId/title/genres DataFrame.
+
+        Titles are decoded into Python strings; genres stay categorical.
+
+        """
+        return pd.DataFrame({'movieId': self.ids, 'title': self.titles.to_numpy(),
+                             'genres': self.genres})
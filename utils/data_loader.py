@@ -4,10 +4,80 @@
 
     Author: Explore Data Science Academy.
 
+    Description: Single data-access layer for the app. Each dataset is
+    loaded at most once per version of its file, from a memory-mapped
+    columnar snapshot that is regenerated whenever its .csv source
+    changes. Only the latest version of each file is cached, so data
+    superseded by a rewritten file is freed once the model versions
+    built from it are (see `utils.model_registry`). The movie catalogue
+    is kept in its compact form (`MovieCatalogue`) and only turned into
+    a DataFrame on request.
+
 """
 # Data handling dependencies
-import pandas as pd
+import functools
+import os
+import threading
 import numpy as np
+from utils.catalogue import MovieCatalogue
+from utils.genre_index import GenreIndex
+from utils.snapshot import load_snapshot
+from utils.title_index import TitleIndex
+from utils.tracing import TRACER
+
+# Column types kept in the movie snapshot (ratings are ingested in chunks,
+# see `utils.ingest`)
+MOVIE_DTYPES = {'movieId': np.int32, 'title': str, 'genres': str}
+
+def file_stamp(path):
+    """Size and modification time of a file, identifying its version."""
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+def cached_per_version(func):
+    """Cache `func(path)` for the current version of the file at `path` only.
+
+    A rewritten file is loaded afresh, replacing the cached result of its
+    previous version.
+
+    """
+    cache = {}
+    lock = threading.Lock()
+
+    @functools.wraps(func)
+    def wrapper(path):
+        stamp = file_stamp(path)
+        with lock:
+            entry = cache.get(path)
+            if entry is None or entry[0] != stamp:
+                entry = cache[path] = (stamp, func(path))
+            return entry[1]
+
+    wrapper.cache_clear = cache.clear
+    return wrapper
+
+@cached_per_version
+def load_catalogue(path_to_movies):
+    """Load the compact movie catalogue, once per version of the file.
+
+    Rows with missing values are dropped, so row positions are shared by
+    every structure built from the catalogue.
+
+    Parameters
+    ----------
+    path_to_movies : str
+        Relative or absolute path to movie database stored
+        in .csv format.
+
+    Returns
+    -------
+    MovieCatalogue
+        int32 Movie IDs, memory-mapped titles and categorical genres.
+
+    """
+    with TRACER.load(os.path.basename(path_to_movies)):
+        columns = load_snapshot(path_to_movies, MOVIE_DTYPES, dropna=True, lazy_strings=True)
+        return MovieCatalogue.from_columns(columns)
 
 def load_movie_titles(path_to_movies):
     """Load movie titles from database records.
@@ -20,11 +90,55 @@ def load_movie_titles(path_to_movies):
 
     Returns
     -------
-    list[str]
-        Movie titles.
+    StringColumn
+        Movie titles; indexing returns a str and slicing a list[str],
+        decoded from the shared memory-mapped snapshot on access.
 
     """
-    df = pd.read_csv(path_to_movies)
-    df = df.dropna()
-    movie_list = df['title'].to_list()
+    movie_list = load_catalogue(path_to_movies).titles
     return movie_list
+
+@cached_per_version
+def load_title_index(path_to_movies):
+    """Load the shared title/movieId lookup index.
+
+    The index is built once per version of the file and shared by every
+    caller passing the same path.
+
+    Parameters
+    ----------
+    path_to_movies : str
+        Relative or absolute path to movie database stored
+        in .csv format.
+
+    Returns
+    -------
+    TitleIndex
+        Lookups between titles, Movie IDs and row positions, with rows
+        in the same order as `load_movie_titles`.
+
+    """
+    catalogue = load_catalogue(path_to_movies)
+    with TRACER.load('title index'):
+        return TitleIndex(catalogue.ids, catalogue.titles)
+
+@cached_per_version
+def load_genre_index(path_to_movies):
+    """Load the shared genre bitmask index.
+
+    Parameters
+    ----------
+    path_to_movies : str
+        Relative or absolute path to movie database stored
+        in .csv format.
+
+    Returns
+    -------
+    GenreIndex
+        Genre bitmasks and posting lists, with rows in the same order as
+        `load_movie_titles`.
+
+    """
+    catalogue = load_catalogue(path_to_movies)
+    with TRACER.load('genre index'):
+        return GenreIndex(catalogue.genres)
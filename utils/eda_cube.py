@@ -0,0 +1,262 @@
+"""
+
+    Precomputed aggregates behind the Exploratory Data Analysis page.
+
+    Author: Explore Data Science Academy.
+
+    Description: Builds, in one pass over movies.csv and ratings.csv, the
+    small tables the EDA charts are drawn from: the rating histogram,
+    per-genre movie counts and rating histograms (hence counts, means and
+    quartiles), release counts per year and per-movie rating aggregates
+    for the all-time top movies. The cube is persisted next to the
+    ratings file and, like `RatingStats`, only folds in ratings appended
+    since its last sync; a changed movies file triggers a rebuild. Every
+    chart then renders from tables of at most a few hundred cells instead
+    of scanning the raw data.
+
+"""
+# Data handling dependencies
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+from utils.rating_stats import RatingStats
+from utils.snapshot import snapshot_version
+
+# Ratings are binned on the half-star scale: bin b holds rating b / 2
+RATING_BINS = np.arange(11) / 2
+
+
+def _rating_bins(ratings):
+    """Half-star bin of each rating, rounding off-scale values."""
+    return np.clip(np.rint(np.asarray(ratings, dtype=np.float64) * 2), 0, 10).astype(np.intp)
+
+
+def _quantile(hist, q):
+    """Rating at quantile `q` of each row of a (groups x bins) histogram."""
+    cum = np.cumsum(hist, axis=1)
+    total = cum[:, -1:]
+    idx = (cum < np.maximum(q * total, 1)).sum(axis=1)
+    return np.where(total[:, 0] > 0, RATING_BINS[np.minimum(idx, 10)], np.nan)
+
+
+class EDACube:
+    """Rating and catalogue aggregates, updated incrementally.
+
+    Parameters
+    ----------
+    movie_ids : array-like (int)
+        Catalogue Movie IDs.
+    genre_masks : array-like (unsigned int)
+        Genre bitmask of each movie (see `GenreIndex.masks`).
+    genres : array-like (str)
+        Genre name of each mask bit.
+    years : array-like (float)
+        Release year of each movie; NaN where unknown.
+    prior_weight : float
+        Damping weight of the per-movie mean ratings.
+
+    """
+
+    def __init__(self, movie_ids, genre_masks, genres, years, prior_weight=10.0):
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        order = np.argsort(movie_ids, kind='stable')
+        self.movie_ids = movie_ids[order]
+        self.genre_masks = np.asarray(genre_masks)[order]
+        self.genres = np.asarray(genres, dtype=object)
+        shifts = np.arange(len(self.genres), dtype=self.genre_masks.dtype)
+        bits = (self.genre_masks[:, None] >> shifts) & 1
+        self.genre_movies = bits.sum(axis=0).astype(np.int64)
+        years = np.asarray(years, dtype=np.float64)
+        self.years, self.year_counts = np.unique(years[np.isfinite(years)].astype(np.int64),
+                                                 return_counts=True)
+        self.stats = RatingStats(prior_weight)
+        self.rating_hist = np.zeros(len(RATING_BINS), dtype=np.int64)
+        self.genre_hist = np.zeros((len(self.genres), len(RATING_BINS)), dtype=np.int64)
+        self.genre_sum = np.zeros(len(self.genres), dtype=np.float64)
+        # snapshot_version of the movies file the catalogue tables came from
+        self.movies_version = ''
+        # Where `refresh` persists the cube, if anywhere
+        self.path = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_catalogue(cls, catalogue, genre_index, prior_weight=10.0):
+        """Build the catalogue tables from a `MovieCatalogue` and its `GenreIndex`."""
+        return cls(catalogue.ids, genre_index.masks, genre_index.genres,
+                   catalogue.release_years(), prior_weight)
+
+    def add_ratings(self, chunk):
+        """Fold a chunk of ratings (movieId and rating columns) into the
+        rating and genre histograms."""
+        bins = _rating_bins(chunk['rating'])
+        ratings = np.asarray(chunk['rating'], dtype=np.float64)
+        self.rating_hist += np.bincount(bins, minlength=len(RATING_BINS))
+        movie_ids = np.asarray(chunk['movieId'], dtype=np.int64)
+        pos = np.searchsorted(self.movie_ids, movie_ids)
+        pos[pos == len(self.movie_ids)] = 0
+        known = self.movie_ids[pos] == movie_ids if len(self.movie_ids) else \
+            np.zeros(len(movie_ids), dtype=bool)
+        masks = np.where(known, self.genre_masks[pos], 0) if len(self.movie_ids) else \
+            np.zeros(len(movie_ids), dtype=np.uint32)
+        for j in range(len(self.genres)):
+            rows = np.flatnonzero((masks >> j) & 1)
+            self.genre_hist[j] += np.bincount(bins[rows], minlength=len(RATING_BINS))
+            self.genre_sum[j] += ratings[rows].sum()
+
+    def sync(self, path_to_ratings):
+        """Fold ratings appended to the ratings file since the last sync.
+
+        Returns
+        -------
+        int
+            Number of new ratings.
+
+        Raises
+        ------
+        ValueError
+            If the file was rewritten rather than appended to.
+
+        """
+        with self._lock:
+            return self.stats.sync(path_to_ratings, on_chunk=self.add_ratings)
+
+    def refresh(self, path_to_ratings):
+        """`sync`, then persist the cube if ratings were added."""
+        added = self.sync(path_to_ratings)
+        if added and self.path:
+            with self._lock:
+                self.save(self.path)
+        return added
+
+    def rating_distribution(self):
+        """Number of ratings per rating value."""
+        return pd.DataFrame({'ratings': self.rating_hist},
+                            index=pd.Index(RATING_BINS, name='rating'))
+
+    def rating_summary(self):
+        """Count, mean, median and mode of every rating."""
+        total = self.rating_hist.sum()
+        return {'ratings': int(total), 'mean': self.stats.global_mean,
+                'median': float(_quantile(self.rating_hist[None, :], 0.5)[0]),
+                'mode': float(RATING_BINS[np.argmax(self.rating_hist)]) if total else np.nan}
+
+    def genre_summary(self):
+        """Movies, ratings, mean and rating quartiles per genre."""
+        counts = self.genre_hist.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = self.genre_sum / counts
+        return pd.DataFrame({'movies': self.genre_movies, 'ratings': counts, 'mean_rating': mean,
+                             'q1': _quantile(self.genre_hist, 0.25),
+                             'median': _quantile(self.genre_hist, 0.5),
+                             'q3': _quantile(self.genre_hist, 0.75)},
+                            index=pd.Index(self.genres, name='genre'))
+
+    def releases_per_year(self):
+        """Number of catalogue movies released each year."""
+        return pd.DataFrame({'movies': self.year_counts},
+                            index=pd.Index(self.years, name='year'))
+
+    def top_movies(self, n=15, min_count=50, title_index=None):
+        """Movies with the highest damped mean rating.
+
+        Parameters
+        ----------
+        n : int
+            Number of movies.
+        min_count : int
+            Fewest ratings a movie needs to be listed.
+        title_index : TitleIndex, optional
+            Adds a title column when given.
+
+        """
+        ids = self.stats.top(n, min_count)
+        table = pd.DataFrame({'ratings': self.stats.lookup(ids, 'count'),
+                              'mean_rating': self.stats.lookup(ids, 'mean'),
+                              'damped_mean': self.stats.lookup(ids, 'damped_mean')},
+                             index=pd.Index(ids, name='movieId'))
+        if title_index is not None:
+            rows = title_index.rows(ids)
+            table.insert(0, 'title', [title_index.titles[r] if r >= 0 else '' for r in rows])
+        return table
+
+    def save(self, path):
+        """Persist the cube as a .npz file."""
+        tmp = f"{path}.tmp.npz"
+        stats = self.stats
+        np.savez(tmp, movie_ids=self.movie_ids, genre_masks=self.genre_masks,
+                 genres=self.genres.astype(str), years=self.years, year_counts=self.year_counts,
+                 rating_hist=self.rating_hist, genre_hist=self.genre_hist,
+                 genre_sum=self.genre_sum, movies_version=self.movies_version,
+                 stats_movie_ids=stats.movie_ids, stats_count=stats.count, stats_sum=stats.sum,
+                 prior_weight=stats.prior_weight, offset=stats.offset,
+                 head_digest=stats.head_digest)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load a cube previously written by `save`."""
+        with np.load(path) as data:
+            cube = cls(data['movie_ids'], data['genre_masks'], data['genres'], [],
+                       float(data['prior_weight']))
+            cube.years, cube.year_counts = data['years'], data['year_counts']
+            cube.rating_hist = data['rating_hist']
+            cube.genre_hist = data['genre_hist']
+            cube.genre_sum = data['genre_sum']
+            cube.movies_version = str(data['movies_version'])
+            cube.stats.movie_ids = data['stats_movie_ids']
+            cube.stats.count = data['stats_count']
+            cube.stats.sum = data['stats_sum']
+            cube.stats.offset = int(data['offset'])
+            cube.stats.head_digest = str(data['head_digest'])
+        return cube
+
+
+def load_eda_cube(path_to_movies, path_to_ratings, catalogue, genre_index, path_to_store=None):
+    """Load the persisted cube, catching up with appended ratings.
+
+    The cube is rebuilt from scratch when the movies file changed or the
+    ratings file was rewritten.
+
+    Parameters
+    ----------
+    path_to_movies, path_to_ratings : str
+        Relative or absolute paths to the .csv files.
+    catalogue : MovieCatalogue
+        The catalogue loaded from `path_to_movies`.
+    genre_index : GenreIndex
+        Genre index of `catalogue`.
+    path_to_store : str, optional
+        Where the cube is persisted. Defaults to a `.eda.npz` file next
+        to the ratings file.
+
+    Returns
+    -------
+    EDACube
+        Aggregates covering every complete row of the ratings file.
+
+    """
+    if path_to_store is None:
+        path_to_store = os.path.splitext(path_to_ratings)[0] + '.eda.npz'
+    version = snapshot_version(path_to_movies)
+    cube = None
+    if os.path.exists(path_to_store):
+        cube = EDACube.load(path_to_store)
+        if cube.movies_version != version:
+            cube = None
+        else:
+            try:
+                added = cube.sync(path_to_ratings)
+            except ValueError:
+                cube = None
+            else:
+                if added:
+                    cube.save(path_to_store)
+    if cube is None:
+        cube = EDACube.from_catalogue(catalogue, genre_index)
+        cube.movies_version = version
+        cube.sync(path_to_ratings)
+        cube.save(path_to_store)
+    cube.path = path_to_store
+    return cube
@@ -0,0 +1,174 @@
+"""
+
+    Bounded background execution of recommendation requests.
+
+    Author: Explore Data Science Academy.
+
+    Description: Recommendation requests run on a small, process-wide
+    thread pool instead of inside the Streamlit script run. Each request
+    has a deadline: if the model has not answered in time, a cheap
+    fallback result is returned and the request's cancel token is set, so
+    the model stops at its next traced stage instead of occupying a worker.
+    When every worker is busy and the queue is full, new requests get the
+    fallback straight away, which keeps tail latency bounded under load.
+
+"""
+# Script dependencies
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+_local = threading.local()
+
+
+class Cancelled(Exception):
+    """Raised inside a request whose cancel token was set."""
+
+
+class CancelToken:
+    """Cooperative cancellation flag shared by a request and its caller."""
+
+    __slots__ = ('_event',)
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+
+def check_cancelled():
+    """Raise `Cancelled` if the request running on this thread was cancelled."""
+    token = getattr(_local, 'token', None)
+    if token is not None and token.cancelled:
+        raise Cancelled()
+
+
+class DeadlineExecutor:
+    """Thread pool running `(movie_list, top_n)` calls under a deadline.
+
+    Parameters
+    ----------
+    max_workers : int
+        Worker threads; the heavy lifting is NumPy/SciPy code that
+        releases the GIL, and threads share the memory-mapped models.
+    max_pending : int
+        Requests admitted at once (running or queued); further requests
+        are answered by their fallback without being queued.
+
+    """
+
+    def __init__(self, max_workers=4, max_pending=16):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers,
+                                        thread_name_prefix='recommender')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self.timeouts = 0
+        self.rejected = 0
+        self.cancelled = 0
+
+    def _run(self, token, func, args):
+        _local.token = token
+        try:
+            check_cancelled()
+            return func(*args)
+        finally:
+            _local.token = None
+            self._slots.release()
+
+    def call(self, func, args, timeout, fallback, token=None):
+        """Run `func(*args)` in the pool, waiting at most `timeout` seconds.
+
+        Parameters
+        ----------
+        func : callable
+            The request, e.g. `collab_model`.
+        args : tuple
+            Its arguments.
+        timeout : float
+            Seconds to wait for the result.
+        fallback : callable
+            Called with `args` for the result returned instead when the
+            deadline passes, the request is cancelled or the pool is full.
+        token : CancelToken, optional
+            Token the caller can use to cancel the request.
+
+        Returns
+        -------
+        tuple (object, str)
+            The result, and how it was obtained: 'ok', 'timeout',
+            'cancelled' or 'rejected'.
+
+        Raises
+        ------
+        Exception
+            Whatever `func` raised, other than `Cancelled`.
+
+        """
+        token = token or CancelToken()
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            return fallback(*args), 'rejected'
+        future = self._pool.submit(self._run, token, func, args)
+        deadline = time.monotonic() + timeout
+        try:
+            # Wait in short slices so a cancelled token is noticed promptly
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError()
+                try:
+                    return future.result(timeout=min(remaining, 0.05)), 'ok'
+                except TimeoutError:
+                    if token.cancelled:
+                        raise Cancelled()
+        except TimeoutError:
+            token.cancel()
+            self.timeouts += 1
+            return fallback(*args), 'timeout'
+        except Cancelled:
+            token.cancel()
+            self.cancelled += 1
+            return fallback(*args), 'cancelled'
+        except BaseException:
+            # e.g. the script run was stopped: let the worker give up too
+            token.cancel()
+            raise
+
+    def stats(self):
+        return {'timeouts': self.timeouts, 'rejected': self.rejected,
+                'cancelled': self.cancelled}
+
+
+def with_deadline(func, executor, timeout, fallback, new_token=CancelToken, on_fallback=None):
+    """Wrap a `(movie_list, top_n)` recommender to run under a deadline.
+
+    Parameters
+    ----------
+    func : callable
+        Recommender, e.g. `content_model`.
+    executor : DeadlineExecutor
+        Pool the requests run on.
+    timeout : float
+        Seconds before `fallback` is used.
+    fallback : callable
+        Cheap `(movie_list, top_n)` recommender.
+    new_token : callable
+        Returns the cancel token of each request, e.g. one that also
+        cancels the same session's previous request.
+    on_fallback : callable, optional
+        Called with the reason ('timeout', 'cancelled' or 'rejected')
+        whenever the fallback result is returned.
+
+    """
+    @functools.wraps(func)
+    def wrapper(movie_list, top_n=10):
+        result, status = executor.call(func, (movie_list, top_n), timeout, fallback, new_token())
+        if status != 'ok' and on_fallback is not None:
+            on_fallback(status)
+        return result
+    return wrapper
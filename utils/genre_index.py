@@ -0,0 +1,156 @@
+"""
+
+    Bitmask genre index used for content-based candidate selection.
+
+    Author: Explore Data Science Academy.
+
+    Description: Encodes the genres of every movie as one small integer
+    bitmask (bit j set when the movie belongs to genre j) and keeps int32
+    per-genre posting lists, built once at load time from the distinct
+    genre combinations of the catalogue. Candidate selection and genre
+    scoring are then vectorized bit and set operations instead of string
+    scans over the whole catalogue.
+
+"""
+# Data handling dependencies
+import numpy as np
+import pandas as pd
+
+# Set bits of every byte value, for counting bits in any integer width
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def popcount(masks):
+    """Number of set bits of each unsigned integer in `masks`."""
+    masks = np.ascontiguousarray(masks)
+    return _POPCOUNT[masks.view(np.uint8).reshape(len(masks), -1)].sum(axis=1, dtype=np.int32)
+
+
+class GenreIndex:
+    """Per-movie genre bitmasks plus per-genre posting lists.
+
+    Rows of the index follow the row order of the genres column it was
+    built from, so row positions can be used directly against the movie
+    catalogue.
+
+    Parameters
+    ----------
+    genres : pandas.Categorical or array-like (str)
+        Pipe-separated genre strings, one per movie.
+    sep : str
+        Separator between genre tokens.
+
+    Raises
+    ------
+    ValueError
+        If there are more than 64 distinct genres.
+
+    """
+
+    def __init__(self, genres, sep='|'):
+        genres = genres if isinstance(genres, pd.Categorical) else \
+            pd.Categorical(pd.Series(genres, dtype=object).astype(str).to_numpy())
+        combos = [str(c).split(sep) for c in genres.categories]
+        # Sorted vocabulary, matching the `classes_` order of a MultiLabelBinarizer
+        self.genres = np.unique([g for combo in combos for g in combo]).astype(object)
+        if len(self.genres) > 64:
+            raise ValueError(f"{len(self.genres)} genres do not fit a 64-bit mask")
+        self.genre_ids = {g: j for j, g in enumerate(self.genres)}
+        dtype = np.uint32 if len(self.genres) <= 32 else np.uint64
+        combo_masks = np.zeros(len(combos) + 1, dtype=dtype)
+        for c, combo in enumerate(combos):
+            for g in combo:
+                combo_masks[c] |= dtype(1) << dtype(self.genre_ids[g])
+        # Missing genres (code -1) pick the trailing empty mask
+        self.masks = combo_masks[np.asarray(genres.codes)]
+        # Posting lists: sorted row positions of the movies in each genre
+        self.postings = {g: np.flatnonzero(self.masks & (dtype(1) << dtype(j))).astype(np.int32)
+                         for j, g in enumerate(self.genres)}
+
+    def __len__(self):
+        return len(self.masks)
+
+    def genres_of(self, rows):
+        """Sorted union of the genres of the given movie rows.
+
+        Parameters
+        ----------
+        rows : array-like (int)
+            Row positions of movies within the index.
+
+        Returns
+        -------
+        numpy.ndarray (str)
+            Genre names shared by at least one of the movies.
+
+        """
+        mask = int(np.bitwise_or.reduce(self.masks[np.asarray(rows, dtype=np.intp)],
+                                        initial=self.masks.dtype.type(0)))
+        return self.genres[[j for j in range(len(self.genres)) if mask >> j & 1]]
+
+    def query_mask(self, genres):
+        """Bitmask of the known genres among `genres`."""
+        mask = 0
+        for g in genres:
+            if g in self.genre_ids:
+                mask |= 1 << self.genre_ids[g]
+        return self.masks.dtype.type(mask)
+
+    def query_vector(self, genres):
+        """Dense 0/1 indicator vector over the genre vocabulary."""
+        vec = np.zeros(len(self.genres), dtype=np.float32)
+        vec[[self.genre_ids[g] for g in genres if g in self.genre_ids]] = 1
+        return vec
+
+    def overlap(self, genres, rows=None):
+        """Number of the given genres each movie belongs to.
+
+        Parameters
+        ----------
+        genres : iterable (str)
+            Genres to score against.
+        rows : array-like (int), optional
+            Restrict scoring to these movie rows.
+
+        Returns
+        -------
+        numpy.ndarray (int32)
+            Genre overlap count per movie (or per requested row).
+
+        """
+        masks = self.masks if rows is None else self.masks[np.asarray(rows, dtype=np.intp)]
+        return popcount(masks & self.query_mask(genres))
+
+    def narrow(self, genres, candidates, min_size):
+        """Successively intersect candidates with each genre's posting list.
+
+        Genres are applied in the given order. Narrowing stops before the
+        candidate set would shrink to `min_size` movies or fewer, so the
+        returned set always keeps more than `min_size` movies whenever the
+        initial candidate set does.
+
+        Parameters
+        ----------
+        genres : iterable (str)
+            Genres to narrow by, most significant first.
+        candidates : array-like (int)
+            Sorted, unique row positions to start from.
+        min_size : int
+            Lower bound on the size of the returned candidate set.
+
+        Returns
+        -------
+        numpy.ndarray (int)
+            Sorted row positions of the narrowed candidate set.
+
+        """
+        selected = np.asarray(candidates, dtype=np.intp)
+        for genre in genres:
+            posting = self.postings.get(genre)
+            if posting is None:
+                continue
+            narrowed = np.intersect1d(selected, posting, assume_unique=True)
+            if len(narrowed) <= min_size:
+                break
+            selected = narrowed
+        return selected
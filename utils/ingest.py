@@ -0,0 +1,179 @@
+"""
+
+    Streaming, chunked ingestion of the ratings file.
+
+    Author: Explore Data Science Academy.
+
+    Description: Reads ratings.csv in blocks of complete lines with compact
+    column types (int32 ids, float32 ratings) and never keeps the raw text
+    or the unused timestamp column around. `RatingIngest` accumulates the
+    chunks into sorted user/item id maps and half-star encoded (uint8)
+    rating triples, and turns them into a CSR matrix with int32 indices
+    and float32 values, so the ratings are held at 9 bytes per row while
+    ingesting instead of as float64/int64 DataFrames.
+
+"""
+# Data handling dependencies
+import io
+
+import numpy as np
+import pandas as pd
+
+# Columns kept from the ratings file, with their in-memory types
+RATING_DTYPES = {'userId': np.int32, 'movieId': np.int32, 'rating': np.float32}
+# Bytes of the ratings file parsed per chunk
+CHUNK_BYTES = 4 << 20
+
+
+def iter_rating_chunks(path_to_ratings, start=None, chunk_bytes=CHUNK_BYTES,
+                       dtypes=RATING_DTYPES):
+    """Parse a ratings .csv file in chunks of complete lines.
+
+    Parameters
+    ----------
+    path_to_ratings : str
+        Ratings .csv file with a header line.
+    start : int, optional
+        Byte offset of the first line to parse; defaults to the line
+        after the header.
+    chunk_bytes : int
+        Approximate number of bytes parsed per chunk.
+    dtypes : dict
+        Columns to keep and their types.
+
+    Yields
+    ------
+    tuple (pandas.DataFrame, int)
+        The `dtypes` columns of the chunk's rows (by default userId,
+        movieId and rating as int32, int32, float32), and the byte offset
+        just past its last line. A trailing
+        line without a newline (i.e. still being written) is not parsed.
+
+    """
+    with open(path_to_ratings, 'rb') as f:
+        header_line = f.readline()
+        names = header_line.decode().strip().split(',')
+        offset = len(header_line) if start is None else start
+        f.seek(offset)
+        pending = b''
+        while True:
+            block = f.read(chunk_bytes)
+            data = pending + block
+            cut = data.rfind(b'\n') + 1
+            if cut:
+                chunk = pd.read_csv(io.BytesIO(data[:cut]), header=None, names=names,
+                                    usecols=list(dtypes), dtype=dtypes)
+                offset += cut
+                yield chunk, offset
+            pending = data[cut:]
+            if not block:
+                return
+
+
+def encode_ratings(ratings):
+    """Ratings on a half-star scale as uint8 codes (twice the rating).
+
+    Raises
+    ------
+    ValueError
+        If a rating is not a multiple of 0.5 within [0, 127.5].
+
+    """
+    doubled = np.asarray(ratings, dtype=np.float32) * 2
+    codes = np.rint(doubled)
+    if len(codes) and (codes.min() < 0 or codes.max() > 255 or np.any(codes != doubled)):
+        raise ValueError("Ratings are not on a half-star scale")
+    return codes.astype(np.uint8)
+
+
+def decode_ratings(codes):
+    """Inverse of `encode_ratings`, as float32."""
+    return np.asarray(codes, dtype=np.float32) / 2
+
+
+class RatingIngest:
+    """Accumulates rating chunks into id maps and a sparse rating matrix.
+
+    Memory held is the sorted user and item id maps plus 9 bytes per
+    rating (int32 user, int32 item, uint8 rating code); ratings that are
+    not on a half-star scale fall back to float32 values.
+
+    """
+
+    def __init__(self):
+        self.user_ids = np.array([], dtype=np.int32)
+        self.item_ids = np.array([], dtype=np.int32)
+        self.rows = 0
+        self._users, self._items, self._values = [], [], []
+        self._encoded = True
+
+    def add(self, chunk):
+        """Add a chunk with userId, movieId and rating columns."""
+        users = np.asarray(chunk['userId'], dtype=np.int32)
+        items = np.asarray(chunk['movieId'], dtype=np.int32)
+        ratings = np.asarray(chunk['rating'], dtype=np.float32)
+        self.user_ids = np.union1d(self.user_ids, users)
+        self.item_ids = np.union1d(self.item_ids, items)
+        if self._encoded:
+            try:
+                values = encode_ratings(ratings)
+            except ValueError:
+                self._values = [decode_ratings(v) for v in self._values]
+                self._encoded = False
+        if not self._encoded:
+            values = ratings
+        self._users.append(users)
+        self._items.append(items)
+        self._values.append(values)
+        self.rows += len(users)
+
+    @staticmethod
+    def _positions(chunks, sorted_ids):
+        """Positions of buffered ids within `sorted_ids` as int32, consuming
+        the buffer chunk by chunk."""
+        out = np.empty(sum(len(c) for c in chunks), dtype=np.int32)
+        start = 0
+        while chunks:
+            ids = chunks.pop(0)
+            out[start:start + len(ids)] = np.searchsorted(sorted_ids, ids)
+            start += len(ids)
+        return out
+
+    def to_csr(self):
+        """The accumulated ratings as a (n_users, n_items) CSR matrix.
+
+        Rows and columns follow `user_ids` and `item_ids`; repeated
+        (user, item) pairs keep their mean rating. The chunk buffers are
+        released as they are consumed.
+
+        """
+        # Imported here: streaming the ratings file alone does not need SciPy
+        import scipy.sparse
+        shape = (len(self.user_ids), len(self.item_ids))
+        rows = self._positions(self._users, self.user_ids)
+        cols = self._positions(self._items, self.item_ids)
+        values = np.concatenate(self._values or [np.array([], dtype=np.uint8)])
+        self._values = []
+        data = decode_ratings(values) if self._encoded else values.astype(np.float32)
+        del values
+        csr = scipy.sparse.coo_matrix((data, (rows, cols)), shape=shape).tocsr()
+        if csr.nnz < len(data):
+            counts = scipy.sparse.coo_matrix(
+                (np.ones(len(data), dtype=np.float32), (rows, cols)), shape=shape).tocsr()
+            csr.data /= counts.data
+        return csr
+
+
+def read_ratings(path_to_ratings, chunk_bytes=CHUNK_BYTES, dtypes=RATING_DTYPES):
+    """Read userId, movieId and rating into one compact DataFrame.
+
+    Parsed chunk by chunk, so the raw text and the timestamp column are
+    never held in memory. Pass `dtypes` to keep other columns, e.g.
+    `dict(RATING_DTYPES, timestamp=np.int64)`.
+
+    """
+    chunks = [chunk for chunk, _ in iter_rating_chunks(path_to_ratings, chunk_bytes=chunk_bytes,
+                                                       dtypes=dtypes)]
+    if not chunks:
+        return pd.DataFrame({c: np.array([], dtype=t) for c, t in dtypes.items()})
+    return pd.concat(chunks, ignore_index=True)
@@ -0,0 +1,115 @@
+"""
+
+    Deferred imports of the heavy recommender modules.
+
+    Author: Explore Data Science Academy.
+
+    Description: Importing a recommender module loads its data and models
+    (and scikit-learn or surprise with them), which takes seconds. A
+    `LazyModule` stands in for such a module and imports it on first
+    attribute access, so pages that never recommend never pay for it;
+    `preload` imports modules on a background thread instead, e.g. once
+    the first page has been drawn. `lazy_module` hands out one instance
+    per module and process, so Streamlit reruns share them. Import times are recorded in
+    `TRACER.loads`, next to the data and model loads they trigger.
+
+"""
+# Script dependencies
+import importlib
+import sys
+import threading
+import time
+
+from utils.tracing import TRACER
+
+
+class LazyModule:
+    """A module imported on first attribute access.
+
+    Parameters
+    ----------
+    name : str
+        Absolute module name, e.g. 'recommenders.content_based'.
+
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        """Whether the module has been imported."""
+        return self._module is not None
+
+    def load(self):
+        """Import the module (once) and return it."""
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    if self._name in sys.modules:
+                        # Imported, or still being imported by another thread:
+                        # import_module waits for that import to finish
+                        self._module = importlib.import_module(self._name)
+                    else:
+                        with TRACER.load(f'import {self._name}'):
+                            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        return getattr(self.load(), attr)
+
+    def __reduce__(self):
+        # Pickled (and hashed, e.g. by st.cache) by name only
+        return lazy_module, (self._name,)
+
+    def __repr__(self):
+        state = 'loaded' if self.loaded else 'not loaded'
+        return f"<LazyModule {self._name!r} ({state})>"
+
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def lazy_module(name):
+    """The process-wide `LazyModule` of a module name."""
+    with _instances_lock:
+        if name not in _instances:
+            _instances[name] = LazyModule(name)
+        return _instances[name]
+
+
+def preload(modules, delay=0.0):
+    """Import lazy modules on a background daemon thread.
+
+    Parameters
+    ----------
+    modules : iterable (LazyModule)
+        Modules to import, in order.
+    delay : float
+        Seconds to wait first, e.g. to let the current page finish drawing.
+
+    Returns
+    -------
+    threading.Thread
+        The started thread.
+
+    """
+    modules = list(modules)
+
+    def run():
+        time.sleep(delay)
+        for module in modules:
+            try:
+                module.load()
+            except Exception:
+                # Surfaces again, with its traceback, on first real use
+                pass
+
+    thread = threading.Thread(target=run, name='preload', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,133 @@
+"""
+
+    Memory accounting of the app's in-process data structures.
+
+    Author: Explore Data Science Academy.
+
+    Description: Estimates the bytes held by each named structure (NumPy
+    arrays, SciPy sparse matrices, DataFrames, Python containers and the
+    objects built from them), separating private heap memory from
+    read-only memory-mapped files, which are shared by every worker
+    process on the host. Objects reachable from several structures are
+    counted once, under the first structure reporting them.
+
+"""
+# Script dependencies
+import mmap
+import sys
+
+import numpy as np
+import pandas as pd
+
+
+def _is_mapped(array):
+    """Whether an array's memory belongs to a memory-mapped file."""
+    while array is not None:
+        if isinstance(array, (np.memmap, mmap.mmap)):
+            return True
+        array = getattr(array, 'base', None)
+    return False
+
+
+def sizeof(obj, seen=None):
+    """Approximate memory held by an object and everything it references.
+
+    Parameters
+    ----------
+    obj : object
+        Structure to measure.
+    seen : set, optional
+        Ids of objects already counted; shared between calls to avoid
+        counting shared objects twice.
+
+    Returns
+    -------
+    tuple (int, int)
+        Private bytes and memory-mapped (file-backed, shared) bytes.
+
+    """
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0, 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        if _is_mapped(obj):
+            return 0, obj.nbytes
+        # Views own none of their buffer; count the base array instead
+        base = obj.base if isinstance(obj.base, np.ndarray) else None
+        private = 0 if base is not None else obj.nbytes
+        mapped = 0
+        if base is not None:
+            p, m = sizeof(base, seen)
+            private, mapped = private + p, mapped + m
+        if obj.dtype == object:
+            for value in obj.ravel():
+                p, m = sizeof(value, seen)
+                private, mapped = private + p, mapped + m
+        return private, mapped
+    # Sparse matrices can only exist once SciPy has been imported
+    sparse = sys.modules.get('scipy.sparse')
+    if sparse is not None and sparse.issparse(obj):
+        parts = [getattr(obj, name) for name in ('data', 'indices', 'indptr', 'row', 'col')
+                 if hasattr(obj, name)]
+        return _sum(parts, seen)
+    if isinstance(obj, (pd.DataFrame, pd.Series, pd.Index, pd.Categorical)):
+        usage = obj.memory_usage(deep=True)
+        return int(usage.sum() if hasattr(usage, 'sum') else usage), 0
+    if isinstance(obj, (str, bytes, int, float, bool, type(None))):
+        return sys.getsizeof(obj), 0
+    own = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        p, m = _sum(list(obj.keys()) + list(obj.values()), seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        p, m = _sum(obj, seen)
+    else:
+        attrs = list(getattr(obj, '__dict__', {}).values())
+        for cls in type(obj).__mro__:
+            attrs.extend(getattr(obj, name) for name in getattr(cls, '__slots__', ())
+                         if hasattr(obj, name))
+        if callable(obj) and not attrs:
+            return 0, 0
+        p, m = _sum(attrs, seen)
+    return own + p, m
+
+
+def _sum(objs, seen):
+    private = mapped = 0
+    for obj in objs:
+        p, m = sizeof(obj, seen)
+        private, mapped = private + p, mapped + m
+    return private, mapped
+
+
+def process_rss():
+    """Resident set size of this process in bytes (0 where unavailable)."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def memory_report(structures):
+    """Bytes held per named structure.
+
+    Parameters
+    ----------
+    structures : dict
+        Structure name -> object, e.g. {'movies': movies, ...}.
+
+    Returns
+    -------
+    Pandas Dataframe
+        private_mb and mapped_mb per structure, plus a 'total' row.
+
+    """
+    seen = set()
+    rows = {name: sizeof(obj, seen) for name, obj in structures.items()}
+    report = pd.DataFrame(rows, index=['private_mb', 'mapped_mb']).T / 2 ** 20
+    report.loc['total'] = report.sum()
+    return report.round(2)
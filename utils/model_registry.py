@@ -0,0 +1,290 @@
+"""
+
+    Versioned, hot-swappable sets of data and models.
+
+    Author: Explore Data Science Academy.
+
+    Description: Each recommender keeps the data and models it serves from
+    in a `ModelRegistry` instead of module globals. A request takes the
+    active `ModelVersion` for its whole duration (`registry.use()`), so it
+    always sees one consistent set. When the files behind the active
+    version change (a retrained SVD.pkl, a refreshed ratings.csv, ...),
+    `refresh` builds and validates the new version on a background
+    thread, off the request path, then swaps it in atomically. Requests
+    already running finish on the old version, which is freed as soon as
+    the last of them releases it. A version that fails to build or
+    validate is never swapped in; the active one keeps serving.
+
+"""
+# Script dependencies
+import hashlib
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from utils.tracing import TRACER
+
+# Every registry of the process, in creation order (dependencies first)
+REGISTRIES = []
+
+
+class ModelVersion:
+    """One immutable set of data and models.
+
+    Components are read as attributes, e.g. `version.scorer`.
+
+    Parameters
+    ----------
+    number : int
+        Sequence number within the registry.
+    fingerprint : str
+        Identifies the files the version was built from.
+    models : dict
+        Component name -> object.
+    load_seconds : float
+        Time taken to build the version.
+
+    """
+
+    def __init__(self, number, fingerprint, models, load_seconds=0.0):
+        self.number = number
+        self.fingerprint = fingerprint
+        self.tag = f"v{number}-{hashlib.sha1(fingerprint.encode()).hexdigest()[:8]}"
+        self.models = dict(models)
+        self.load_seconds = load_seconds
+        self.loaded_at = time.strftime('%Y-%m-%d %H:%M:%S')
+        # Requests currently using this version
+        self.refs = 0
+        self.retired = False
+
+    def __getattr__(self, name):
+        models = self.__dict__.get('models')
+        if models is None or name not in models:
+            raise AttributeError(name)
+        return models[name]
+
+    def free(self):
+        """Drop every component; memory goes once nothing else references it."""
+        self.models.clear()
+
+    def __repr__(self):
+        return f"<ModelVersion {self.tag} ({len(self.models)} components, {self.refs} in use)>"
+
+
+class ModelRegistry:
+    """The active version of a set of data and models, with hot swapping.
+
+    Parameters
+    ----------
+    name : str
+        Name shown in diagnostics.
+    build : callable
+        Loads the data and models; returns a dict of components.
+    fingerprint : callable
+        Cheap token of the files `build` reads (e.g. sizes and modification
+        times); a change means a new version is due.
+    validate : callable, optional
+        Called with a freshly built `ModelVersion`; raises (e.g.
+        ValueError) if it must not serve requests.
+
+    """
+
+    def __init__(self, name, build, fingerprint, validate=None):
+        self.name = name
+        self._build = build
+        self._fingerprint = fingerprint
+        self._validate = validate
+        self._active = None
+        self._lock = threading.Lock()
+        self._loading = threading.Lock()
+        self._numbers = itertools.count(1)
+        # Retired versions still serving in-flight requests
+        self._draining = []
+        self.last_error = None
+        # Fingerprint of the last version that failed, not retried until it changes
+        self._rejected = None
+        self.history = deque(maxlen=20)
+        REGISTRIES.append(self)
+
+    def _log(self, version, event):
+        self.history.append({'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                             'version': version, 'event': event})
+
+    def _load_version(self, fingerprint):
+        start = time.perf_counter()
+        with TRACER.load(f'{self.name} models'):
+            models = self._build()
+        version = ModelVersion(next(self._numbers), fingerprint, models,
+                               time.perf_counter() - start)
+        if self._validate is not None:
+            self._validate(version)
+        return version
+
+    def load(self):
+        """Build and activate the first version, synchronously.
+
+        Raises whatever `build` or `validate` raised: there is nothing
+        to fall back on yet.
+
+        """
+        with self._loading:
+            if self._active is None:
+                version = self._load_version(self._fingerprint())
+                self._swap(version)
+        return self._active
+
+    @property
+    def current(self):
+        """The active version, loading the first one if needed."""
+        return self._active or self.load()
+
+    @contextmanager
+    def use(self):
+        """Hold the active version for the duration of a request."""
+        if self._active is None:
+            self.load()
+        # Taken under the lock `_swap` retires versions under, so the
+        # version cannot be retired (and freed) before it is held
+        with self._lock:
+            version = self._active
+            version.refs += 1
+        try:
+            yield version
+        finally:
+            self._release(version)
+
+    def _release(self, version):
+        with self._lock:
+            version.refs -= 1
+            done = version.retired and version.refs == 0
+            if done and version in self._draining:
+                self._draining.remove(version)
+        if done:
+            version.free()
+            self._log(version.tag, 'freed')
+
+    def _swap(self, version):
+        with self._lock:
+            old, self._active = self._active, version
+            if old is not None:
+                old.retired = True
+                if old.refs:
+                    # Freed by the last request to release it
+                    self._draining.append(old)
+                    old = None
+        self._log(version.tag, f'activated (built in {version.load_seconds:.2f} s)')
+        if old is not None:
+            old.free()
+            self._log(old.tag, 'freed')
+
+    def stale(self):
+        """Whether the files behind the active version have changed (to
+        anything but a version already rejected)."""
+        fingerprint = self._fingerprint()
+        return self._active is None or fingerprint not in (self._active.fingerprint,
+                                                            self._rejected)
+
+    def refresh(self, block=False):
+        """Build, validate and swap in a new version if the files changed.
+
+        Parameters
+        ----------
+        block : bool
+            Build on the calling thread instead of a background thread.
+
+        Returns
+        -------
+        bool
+            Whether a new version is being (or was) loaded.
+
+        """
+        if not self.stale() or not self._loading.acquire(blocking=False):
+            return False
+
+        def run():
+            fingerprint = self._fingerprint()
+            try:
+                # Requests on this thread are not being served: keep them untraced
+                with TRACER.muted():
+                    version = self._load_version(fingerprint)
+            except Exception as e:
+                self.last_error = f'{type(e).__name__}: {e}'
+                self._rejected = fingerprint
+                self._log(None, f'rejected: {self.last_error}')
+            else:
+                self.last_error = None
+                self._rejected = None
+                self._swap(version)
+            finally:
+                self._loading.release()
+
+        if block:
+            run()
+        else:
+            threading.Thread(target=run, name=f'{self.name}-loader', daemon=True).start()
+        return True
+
+    def status(self):
+        """Active version, in-flight requests and draining versions."""
+        active = self._active
+        with self._lock:
+            draining = [f'{v.tag} ({v.refs} in use)' for v in self._draining]
+        return {'registry': self.name,
+                'version': active.tag if active else None,
+                'loaded_at': active.loaded_at if active else None,
+                'load_s': round(active.load_seconds, 3) if active else None,
+                'in_use': active.refs if active else 0,
+                'draining': ', '.join(draining),
+                'loading': self._loading.locked(),
+                'last_error': self.last_error or ''}
+
+
+def refresh_all():
+    """Refresh every registry in turn, building on the calling thread.
+
+    Registries are refreshed in creation order, so one built from
+    another's active version (e.g. the hybrid ranker) sees its new
+    version in the same pass.
+
+    """
+    return [registry.name for registry in list(REGISTRIES) if registry.refresh(block=True)]
+
+
+def start_watcher(interval=60.0):
+    """Check for new data and models every `interval` seconds, on a
+    background daemon thread.
+
+    Returns
+    -------
+    threading.Thread
+        The started thread.
+
+    """
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                refresh_all()
+            except Exception:
+                # Recorded per registry; keep watching
+                pass
+
+    thread = threading.Thread(target=run, name='model-watcher', daemon=True)
+    thread.start()
+    return thread
+
+
+def file_fingerprint(*paths):
+    """Size and modification time of each file ('-' where missing)."""
+    parts = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            parts.append(f'{path}:-')
+        else:
+            parts.append(f'{path}:{st.st_size}:{st.st_mtime_ns}')
+    return '|'.join(parts)
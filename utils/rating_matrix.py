@@ -0,0 +1,226 @@
+"""
+
+    Sparse user-by-item rating matrix store.
+
+    Author: Explore Data Science Academy.
+
+    Description: Holds every rating as a CSR (user rows) matrix, plus a
+    CSC (item columns) copy built only when first needed, with sorted raw
+    user and item id maps. The matrix is
+    persisted next to the ratings file and rebuilt only when that file
+    changes, streaming the file in one pass that also refreshes the
+    per-movie rating aggregates. Collaborative filtering slices neighbour
+    users and candidate items straight out of it, computing item
+    similarities sparsely instead of through a dense pivot table.
+
+"""
+# Data handling dependencies
+import os
+
+import numpy as np
+import scipy.sparse
+from utils.ingest import RatingIngest
+from utils.rating_stats import RatingStats
+
+
+def _lookup(sorted_ids, ids):
+    """Positions of `ids` within `sorted_ids`; -1 where absent."""
+    ids = np.asarray(ids, dtype=np.int64)
+    if len(sorted_ids) == 0:
+        return np.full(len(ids), -1, dtype=np.intp)
+    pos = np.searchsorted(sorted_ids, ids)
+    pos[pos == len(sorted_ids)] = 0
+    return np.where(sorted_ids[pos] == ids, pos, -1)
+
+
+class RatingMatrix:
+    """Ratings as a sparse matrix with raw user/item id maps.
+
+    Parameters
+    ----------
+    csr : scipy.sparse.csr_matrix
+        Ratings of shape (n_users, n_items).
+    user_ids, item_ids : numpy.ndarray (int)
+        Sorted raw user ids and item ids labelling the rows and columns.
+
+    """
+
+    def __init__(self, csr, user_ids, item_ids):
+        self.csr = csr.tocsr()
+        self.csr.sort_indices()
+        self._csc = None
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.item_ids = np.asarray(item_ids, dtype=np.int64)
+
+    @classmethod
+    def from_arrays(cls, user_ids, item_ids, ratings):
+        """Build the matrix from aligned rating triples.
+
+        Repeated (user, item) pairs keep their mean rating.
+
+        """
+        users, rows = np.unique(np.asarray(user_ids, dtype=np.int64), return_inverse=True)
+        items, cols = np.unique(np.asarray(item_ids, dtype=np.int64), return_inverse=True)
+        shape = (len(users), len(items))
+        values = scipy.sparse.coo_matrix(
+            (np.asarray(ratings, dtype=np.float32), (rows.ravel(), cols.ravel())), shape=shape).tocsr()
+        counts = scipy.sparse.coo_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows.ravel(), cols.ravel())), shape=shape).tocsr()
+        if counts.nnz and counts.data.max() > 1:
+            values.data /= counts.data
+        return cls(values, users, items)
+
+    @classmethod
+    def from_ratings(cls, ratings):
+        """Build the matrix from a ratings DataFrame or dict of columns."""
+        return cls.from_arrays(np.asarray(ratings['userId']), np.asarray(ratings['movieId']),
+                               np.asarray(ratings['rating']))
+
+    @property
+    def csc(self):
+        """Column-major copy of the ratings, built on first use."""
+        if self._csc is None:
+            self._csc = self.csr.tocsc()
+        return self._csc
+
+    @property
+    def shape(self):
+        return self.csr.shape
+
+    @property
+    def nnz(self):
+        return self.csr.nnz
+
+    def user_rows(self, uids):
+        """Row of each raw user id; -1 for unknown users."""
+        return _lookup(self.user_ids, uids)
+
+    def item_cols(self, iids):
+        """Column of each raw item id; -1 for unknown items."""
+        return _lookup(self.item_ids, iids)
+
+    def users(self, uids):
+        """CSR slice of the rows of the given (known) raw user ids."""
+        rows = self.user_rows(uids)
+        return self.csr[rows[rows >= 0]]
+
+    def items(self, iids):
+        """CSC slice of the columns of the given (known) raw item ids."""
+        cols = self.item_cols(iids)
+        return self.csc[:, cols[cols >= 0]]
+
+    def items_rated_by(self, uids):
+        """Raw ids of every item rated by at least one of the given users."""
+        return self.item_ids[np.unique(self.users(uids).indices)]
+
+    def save(self, path, source_stamp=None):
+        """Persist the matrix as a .npz file.
+
+        Parameters
+        ----------
+        path : str
+            Destination file.
+        source_stamp : tuple (int, int), optional
+            (size, mtime_ns) of the ratings file the matrix was built from.
+
+        """
+        tmp = f"{path}.tmp.npz"
+        np.savez(tmp, data=self.csr.data, indices=self.csr.indices, indptr=self.csr.indptr,
+                 shape=np.array(self.csr.shape), user_ids=self.user_ids,
+                 item_ids=self.item_ids,
+                 source_stamp=np.array(source_stamp if source_stamp else (-1, -1), dtype=np.int64))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load a matrix written by `save`, with the stamp of its source file."""
+        with np.load(path) as data:
+            csr = scipy.sparse.csr_matrix((data['data'], data['indices'], data['indptr']),
+                                          shape=tuple(data['shape']))
+            matrix = cls(csr, data['user_ids'], data['item_ids'])
+            stamp = tuple(int(v) for v in data['source_stamp'])
+        return matrix, stamp
+
+
+def cosine_to_columns(matrix, query):
+    """Cosine similarity between every column of a sparse matrix and a few
+    dense query columns.
+
+    Parameters
+    ----------
+    matrix : scipy.sparse matrix
+        Shape (n_rows, n_items), e.g. the ratings of a set of neighbours.
+    query : numpy.ndarray
+        Shape (n_rows, n_queries), the query items over the same rows.
+
+    Returns
+    -------
+    numpy.ndarray
+        Similarities of shape (n_items, n_queries); 0 for empty columns.
+
+    """
+    matrix = scipy.sparse.csc_matrix(matrix, dtype=np.float64)
+    query = np.asarray(query, dtype=np.float64)
+    dots = np.asarray(matrix.T @ query)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    qnorms = np.linalg.norm(query, axis=0)
+    denom = norms[:, None] * qnorms[None, :]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(denom > 0, dots / denom, 0.0)
+
+
+def ingest_ratings(path_to_ratings, prior_weight=10.0):
+    """Stream the ratings file once into rating aggregates and a sparse matrix.
+
+    Parameters
+    ----------
+    path_to_ratings : str
+        Relative or absolute path to the ratings .csv file.
+    prior_weight : float
+        Damping weight of the rating aggregates.
+
+    Returns
+    -------
+    tuple (RatingStats, RatingMatrix)
+        Per-movie aggregates (positioned for incremental syncs) and the
+        rating matrix, both covering every complete row of the file.
+
+    """
+    ingest = RatingIngest()
+    stats = RatingStats(prior_weight)
+    stats.sync(path_to_ratings, on_chunk=ingest.add)
+    return stats, RatingMatrix(ingest.to_csr(), ingest.user_ids, ingest.item_ids)
+
+
+def load_rating_matrix(path_to_ratings, path_to_store=None):
+    """Load the persisted rating matrix, rebuilding it if the ratings changed.
+
+    Parameters
+    ----------
+    path_to_ratings : str
+        Relative or absolute path to the ratings .csv file.
+    path_to_store : str, optional
+        Where the matrix is persisted. Defaults to a `.matrix.npz` file
+        next to the ratings file.
+
+    Returns
+    -------
+    RatingMatrix
+        Sparse matrix of every rating in the file. When it is rebuilt, the
+        rating aggregates are rewritten to their default `.stats.npz`
+        store as well.
+
+    """
+    if path_to_store is None:
+        path_to_store = os.path.splitext(path_to_ratings)[0] + '.matrix.npz'
+    st = os.stat(path_to_ratings)
+    stamp = (st.st_size, st.st_mtime_ns)
+    if os.path.exists(path_to_store):
+        matrix, saved = RatingMatrix.load(path_to_store)
+        if saved == stamp:
+            return matrix
+    stats, matrix = ingest_ratings(path_to_ratings)
+    matrix.save(path_to_store, stamp)
+    # The aggregates come for free from the same pass
+    stats.save(os.path.splitext(path_to_ratings)[0] + '.stats.npz')
+    return matrix
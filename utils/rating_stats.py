@@ -0,0 +1,267 @@
+"""
+
+    Per-movie rating aggregates for popularity ranking.
+
+    Author: Explore Data Science Academy.
+
+    Description: Maintains count, sum, mean and Bayesian-damped mean
+    rating per movie. The table is built once from the ratings file,
+    persisted next to it and then updated incrementally from rows
+    appended to the file, so ranking a candidate set is an indexed
+    lookup rather than a filter and groupby over every rating.
+
+"""
+# Data handling dependencies
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+from utils.ingest import iter_rating_chunks
+
+# Number of leading bytes of the ratings file fingerprinted to detect rewrites
+_HEAD_BYTES = 1 << 16
+
+
+class RatingStats:
+    """Per-movie rating count and sum, indexed by sorted movie ID.
+
+    Parameters
+    ----------
+    prior_weight : float
+        Number of pseudo-ratings at the global mean blended into each
+        movie's damped mean.
+
+    """
+
+    def __init__(self, prior_weight=10.0):
+        self.prior_weight = float(prior_weight)
+        self.movie_ids = np.array([], dtype=np.int64)
+        self.count = np.array([], dtype=np.int64)
+        self.sum = np.array([], dtype=np.float64)
+        # Position within the source ratings file up to which rows are counted
+        self.offset = 0
+        self.head_digest = ''
+
+    @classmethod
+    def from_ratings(cls, ratings, prior_weight=10.0):
+        """Build the table from a ratings DataFrame or dict of columns."""
+        stats = cls(prior_weight)
+        stats.update(np.asarray(ratings['movieId']), np.asarray(ratings['rating']))
+        return stats
+
+    def __len__(self):
+        return len(self.movie_ids)
+
+    def update(self, movie_ids, ratings):
+        """Add a batch of (movieId, rating) observations to the table.
+
+        Parameters
+        ----------
+        movie_ids : array-like (int)
+            MovieLens Movie IDs of the new ratings.
+        ratings : array-like (float)
+            Rating values aligned with `movie_ids`.
+
+        """
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        if len(movie_ids) == 0:
+            return
+        uniq, inv = np.unique(movie_ids, return_inverse=True)
+        batch_count = np.bincount(inv.ravel(), minlength=len(uniq))
+        batch_sum = np.bincount(inv.ravel(), weights=np.asarray(ratings, dtype=np.float64),
+                                minlength=len(uniq))
+        new_ids = np.setdiff1d(uniq, self.movie_ids, assume_unique=True)
+        if len(new_ids):
+            merged = np.union1d(self.movie_ids, new_ids)
+            pos = np.searchsorted(merged, self.movie_ids)
+            count = np.zeros(len(merged), dtype=np.int64)
+            total = np.zeros(len(merged), dtype=np.float64)
+            count[pos] = self.count
+            total[pos] = self.sum
+            self.movie_ids, self.count, self.sum = merged, count, total
+        pos = np.searchsorted(self.movie_ids, uniq)
+        self.count[pos] += batch_count
+        self.sum[pos] += batch_sum
+
+    @property
+    def global_mean(self):
+        """Mean of every rating in the table."""
+        total = self.count.sum()
+        return float(self.sum.sum() / total) if total else 0.0
+
+    @property
+    def mean(self):
+        """Raw mean rating per movie, aligned with `movie_ids`."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.sum / self.count
+
+    @property
+    def damped_mean(self):
+        """Mean rating shrunk towards the global mean, aligned with `movie_ids`.
+
+        A movie with `n` ratings is blended with `prior_weight` pseudo-ratings
+        at the global mean, so a single 5-star rating no longer outranks a
+        movie with hundreds of 4.5-star ratings.
+
+        """
+        m = self.prior_weight
+        return (self.sum + m * self.global_mean) / (self.count + m)
+
+    def positions(self, movie_ids):
+        """Row of each movie ID within the table, or -1 if it has no ratings."""
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        pos = np.searchsorted(self.movie_ids, movie_ids)
+        pos[pos == len(self.movie_ids)] = 0
+        found = len(self.movie_ids) > 0
+        hit = (self.movie_ids[pos] == movie_ids) if found else np.zeros(len(movie_ids), bool)
+        return np.where(hit, pos, -1)
+
+    def lookup(self, movie_ids, column='damped_mean'):
+        """Aggregate values for the given movie IDs.
+
+        Parameters
+        ----------
+        movie_ids : array-like (int)
+            MovieLens Movie IDs to look up.
+        column : str
+            One of 'count', 'sum', 'mean' or 'damped_mean'.
+
+        Returns
+        -------
+        numpy.ndarray
+            Values aligned with `movie_ids`; unrated movies get 0 for
+            'count'/'sum', NaN for 'mean' and the global mean for
+            'damped_mean'.
+
+        """
+        pos = self.positions(movie_ids)
+        hit = pos >= 0
+        if column in ('count', 'sum'):
+            out = np.zeros(len(pos), dtype=getattr(self, column).dtype)
+        elif column == 'mean':
+            out = np.full(len(pos), np.nan)
+        elif column == 'damped_mean':
+            out = np.full(len(pos), self.global_mean)
+        else:
+            raise ValueError(f"Unknown rating statistic: {column}")
+        out[hit] = getattr(self, column)[pos[hit]]
+        return out
+
+    def to_frame(self):
+        """The full table as a DataFrame indexed by movieId."""
+        return pd.DataFrame({'count': self.count, 'sum': self.sum,
+                             'mean': self.mean, 'damped_mean': self.damped_mean},
+                            index=pd.Index(self.movie_ids, name='movieId'))
+
+    def top(self, n=10, min_count=1):
+        """Movie IDs with the highest damped mean rating."""
+        damped = np.where(self.count >= min_count, self.damped_mean, -np.inf)
+        order = np.argsort(-damped, kind='stable')[:n]
+        return self.movie_ids[order[np.isfinite(damped[order])]]
+
+    def save(self, path):
+        """Persist the table (and its source file position) as a .npz file."""
+        tmp = f"{path}.tmp.npz"
+        np.savez(tmp, movie_ids=self.movie_ids, count=self.count, sum=self.sum,
+                 prior_weight=self.prior_weight, offset=self.offset,
+                 head_digest=self.head_digest)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load a table previously written by `save`."""
+        with np.load(path) as data:
+            stats = cls(float(data['prior_weight']))
+            stats.movie_ids = data['movie_ids']
+            stats.count = data['count']
+            stats.sum = data['sum']
+            stats.offset = int(data['offset'])
+            stats.head_digest = str(data['head_digest'])
+        return stats
+
+    def sync(self, path_to_ratings, on_chunk=None):
+        """Fold rows appended to the ratings file since the last sync.
+
+        The new rows are streamed in chunks (see `utils.ingest`), so the
+        file is never held in memory as a whole.
+
+        Parameters
+        ----------
+        path_to_ratings : str
+            Path to the ratings .csv file the table was built from.
+        on_chunk : callable, optional
+            Called with every parsed chunk (userId, movieId and rating
+            columns), to feed other structures in the same pass.
+
+        Returns
+        -------
+        int
+            Number of new ratings added to the table.
+
+        Raises
+        ------
+        ValueError
+            If the file was rewritten rather than appended to; the table
+            then has to be rebuilt from scratch.
+
+        """
+        with open(path_to_ratings, 'rb') as f:
+            head = f.read(_HEAD_BYTES)
+            size = os.fstat(f.fileno()).st_size
+        start = self.offset or len(head.split(b'\n', 1)[0]) + 1
+        digest = hashlib.sha1(head[:min(start, _HEAD_BYTES)]).hexdigest()
+        if self.offset and digest != self.head_digest:
+            raise ValueError(f"{path_to_ratings} was rewritten since the last sync")
+        if size < start:
+            raise ValueError(f"{path_to_ratings} was truncated since the last sync")
+        # Only complete lines are consumed; a partially written row is picked up next time
+        added = 0
+        end = start
+        for chunk, end in iter_rating_chunks(path_to_ratings, start):
+            self.update(chunk['movieId'].to_numpy(), chunk['rating'].to_numpy())
+            if on_chunk is not None:
+                on_chunk(chunk)
+            added += len(chunk)
+        self.offset = end
+        self.head_digest = hashlib.sha1(head[:min(self.offset, _HEAD_BYTES)]).hexdigest()
+        return added
+
+
+def load_rating_stats(path_to_ratings, path_to_store=None, prior_weight=10.0):
+    """Load the persisted rating table, catching up with appended ratings.
+
+    Parameters
+    ----------
+    path_to_ratings : str
+        Relative or absolute path to the ratings .csv file.
+    path_to_store : str, optional
+        Where the table is persisted. Defaults to a `.stats.npz` file
+        next to the ratings file.
+    prior_weight : float
+        Damping weight used when the table has to be (re)built.
+
+    Returns
+    -------
+    RatingStats
+        Aggregates covering every complete row of the ratings file.
+
+    """
+    if path_to_store is None:
+        path_to_store = os.path.splitext(path_to_ratings)[0] + '.stats.npz'
+    stats = None
+    if os.path.exists(path_to_store):
+        stats = RatingStats.load(path_to_store)
+        stats.prior_weight = float(prior_weight)
+        try:
+            added = stats.sync(path_to_ratings)
+        except ValueError:
+            stats = None
+        else:
+            if added:
+                stats.save(path_to_store)
+    if stats is None:
+        stats = RatingStats(prior_weight)
+        stats.sync(path_to_ratings)
+        stats.save(path_to_store)
+    return stats
@@ -0,0 +1,247 @@
+"""
+
+    Process-wide cache of recommendation results.
+
+    Author: Explore Data Science Academy.
+
+    Description: The Recommender page only offers three fixed slices of
+    the catalogue, so the same favourite-movie combinations come up again
+    and again. Results are cached per (algorithm, order-normalized movie
+    list, top_n) in a thread-safe LRU with a time-to-live, shared by every
+    Streamlit session of the process and optionally persisted to disk.
+    Each algorithm's entries carry a version token (data snapshot and
+    model version), and are dropped as soon as that token changes. A
+    background warm-up can precompute the most popular combinations.
+
+"""
+# Script dependencies
+import atexit
+import functools
+import itertools
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.tracing import TRACER, stage
+
+# Interval between writes of a persistent cache, in seconds
+_SAVE_INTERVAL = 30.0
+
+
+class ResultCache:
+    """Thread-safe LRU cache with per-entry expiry and per-algorithm versions.
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of cached results.
+    ttl : float
+        Seconds a result stays valid; 0 or None keeps results until evicted.
+    path : str, optional
+        File the cache is persisted to and restored from.
+
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600.0, path=None):
+        self.maxsize = int(maxsize)
+        self.ttl = float(ttl or 0)
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = time.time()
+        if path and os.path.exists(path):
+            self.load()
+        if path:
+            atexit.register(self.save)
+
+    @staticmethod
+    def key(algorithm, movie_list, top_n):
+        """Cache key; the order of the favourite movies does not matter."""
+        return (algorithm, tuple(sorted(movie_list)), int(top_n))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def set_version(self, algorithm, version):
+        """Record an algorithm's current version, dropping its entries if it changed."""
+        with self._lock:
+            if self._versions.get(algorithm, version) != version:
+                for key in [k for k in self._entries if k[0] == algorithm]:
+                    del self._entries[key]
+                self._dirty = True
+            self._versions[algorithm] = version
+
+    def get(self, key):
+        """Cached result for `key`, or None if absent or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl and time.time() - entry[1] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[0])
+
+    def put(self, key, result):
+        """Store a result, evicting the least recently used beyond `maxsize`."""
+        with self._lock:
+            self._entries[key] = (list(result), time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            self._dirty = True
+            due = self.path and time.time() - self._saved_at > _SAVE_INTERVAL
+        if due:
+            self.save()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._dirty = True
+
+    def save(self):
+        """Write the cache to `path` (if set and changed since the last save)."""
+        if not self.path or not self._dirty:
+            return
+        with self._lock:
+            state = {'versions': dict(self._versions), 'entries': list(self._entries.items())}
+            self._dirty = False
+            self._saved_at = time.time()
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path)
+
+    def load(self):
+        """Restore entries written by `save`; an unreadable file is ignored."""
+        try:
+            with open(self.path, 'rb') as f:
+                state = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return
+        with self._lock:
+            self._versions.update(state['versions'])
+            self._entries.update(state['entries'][-self.maxsize:])
+
+    def stats(self):
+        """Hit/miss counters and current size."""
+        total = self.hits + self.misses
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0}
+
+
+# Shared by every session of the app process
+RESULT_CACHE = ResultCache(maxsize=int(os.environ.get('RESULT_CACHE_SIZE', 4096)),
+                           ttl=float(os.environ.get('RESULT_CACHE_TTL', 24 * 3600)),
+                           path=os.environ.get('RESULT_CACHE_PATH') or None)
+
+
+def cached(algorithm, version, cache=RESULT_CACHE):
+    """Decorator caching a `(movie_list, top_n)` recommender's results.
+
+    Parameters
+    ----------
+    algorithm : str
+        Name the results are cached under.
+    version : callable
+        Returns the algorithm's current version token (e.g. data snapshot
+        and model version); cached results are dropped when it changes,
+        and a result is only stored if it did not change while computing.
+    cache : ResultCache
+        Cache to use.
+
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(movie_list, top_n=10):
+            with stage('cache lookup') as s:
+                token = version()
+                cache.set_version(algorithm, token)
+                key = cache.key(algorithm, movie_list, top_n)
+                result = cache.get(key)
+                s.rows = int(result is not None)
+            if result is None:
+                result = func(movie_list, top_n)
+                # A version swapped in while computing may have produced the
+                # result; it must not be stored under the old token
+                if version() == token:
+                    cache.put(key, result)
+            return result
+        return wrapper
+    return decorator
+
+
+def popular_combinations(title_list, ranges, popularity, per_range=5, limit=100):
+    """The most popular favourite-movie combinations offered by the app.
+
+    Parameters
+    ----------
+    title_list : sequence (str)
+        Movie titles, as shown by the app.
+    ranges : iterable (tuple)
+        (start, stop) slice of `title_list` behind each selection box.
+    popularity : array-like
+        Popularity of each title (e.g. its number of ratings), aligned
+        with `title_list`.
+    per_range : int
+        Most popular titles considered from each selection box.
+    limit : int
+        Number of combinations returned.
+
+    Returns
+    -------
+    list (list (str))
+        Combinations, most popular (highest summed popularity) first.
+
+    """
+    popularity = np.asarray(popularity, dtype=np.float64)
+    options = []
+    for lo, hi in ranges:
+        order = np.argsort(-popularity[lo:hi], kind='stable')[:per_range]
+        options.append([(title_list[lo + i], popularity[lo + i]) for i in order])
+    combos = sorted(itertools.product(*options), key=lambda c: -sum(p for _, p in c))
+    return [[title for title, _ in combo] for combo in combos[:limit]]
+
+
+def warm_up(recommenders, combinations, top_n=10):
+    """Precompute results in a background daemon thread.
+
+    Parameters
+    ----------
+    recommenders : iterable (callable)
+        Cached `(movie_list, top_n)` recommenders, e.g. `content_model`.
+    combinations : list (list (str))
+        Favourite-movie combinations to precompute.
+    top_n : int
+        Number of recommendations requested by the app.
+
+    Returns
+    -------
+    threading.Thread
+        The started thread.
+
+    """
+    def run():
+        with TRACER.muted():
+            for movie_list in combinations:
+                for recommend in recommenders:
+                    try:
+                        recommend(movie_list, top_n)
+                    except Exception:
+                        # A failing combination fails the same way when requested
+                        continue
+
+    thread = threading.Thread(target=run, name='result-cache-warm-up', daemon=True)
+    thread.start()
+    return thread
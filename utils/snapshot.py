@@ -0,0 +1,281 @@
+"""
+
+    Columnar binary snapshots of the .csv datasets.
+
+    Author: Explore Data Science Academy.
+
+    Description: Each .csv file is parsed once into a directory of typed
+    NumPy column files (`<name>.snapshot/`) that later processes open with
+    `mmap_mode='r'` instead of re-parsing text. The snapshot records the
+    size, modification time and SHA-1 hash of its source file and is
+    regenerated automatically when the file's contents change.
+
+"""
+# Data handling dependencies
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# Bumped whenever the on-disk layout changes, forcing a rebuild
+SNAPSHOT_VERSION = 1
+# Separator between the values of a string column
+_SEP = '\x00'
+
+
+class StringColumn:
+    """Read-only sequence of strings stored as one UTF-8 buffer plus offsets.
+
+    This is the on-disk layout of a snapshot's text columns; when the
+    buffers are memory-mapped the strings cost no private memory and are
+    only decoded when accessed.
+
+    Parameters
+    ----------
+    encoded : numpy.ndarray (uint8)
+        The strings' UTF-8 bytes, separated by NUL bytes.
+    offsets : numpy.ndarray (int64)
+        Start of each string within `encoded`, plus one past the end of
+        the buffer.
+
+    """
+
+    def __init__(self, encoded, offsets):
+        self.encoded = encoded
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, values):
+        """Encode a sequence of strings."""
+        values = [str(v) for v in values]
+        encoded = _SEP.join(values).encode('utf-8')
+        lengths = np.fromiter((len(v.encode('utf-8')) for v in values), dtype=np.int64,
+                              count=len(values))
+        offsets = np.zeros(len(values) + 1, dtype=np.int64)
+        np.cumsum(lengths + 1, out=offsets[1:])
+        return cls(np.frombuffer(encoded, dtype=np.uint8), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def _decode(self, i):
+        return self.encoded[self.offsets[i]:self.offsets[i + 1] - 1].tobytes().decode('utf-8')
+
+    def __getitem__(self, key):
+        """A string for an integer, a list for a slice, an object array otherwise."""
+        if isinstance(key, (int, np.integer)) and 0 <= key < len(self.offsets) - 1:
+            # Fast path for the common in-range scalar lookup
+            return self._decode(key)
+        if isinstance(key, slice):
+            return [self._decode(i) for i in range(*key.indices(len(self)))]
+        if np.ndim(key) == 0:
+            i = int(key)
+            if i < 0:
+                i += len(self)
+            if not 0 <= i < len(self):
+                raise IndexError('string column index out of range')
+            return self._decode(i)
+        rows = np.asarray(key)
+        rows = np.flatnonzero(rows) if rows.dtype == bool else np.where(rows < 0, rows + len(self), rows)
+        out = np.empty(len(rows), dtype=object)
+        out[:] = [self._decode(i) for i in rows]
+        return out
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._decode(i)
+
+    def to_numpy(self):
+        """Every string, decoded into an object array."""
+        return self[np.arange(len(self))]
+
+    @property
+    def nbytes(self):
+        return self.encoded.nbytes + self.offsets.nbytes
+
+
+def file_sha1(path, chunk_size=1 << 20):
+    """SHA-1 hex digest of a file's contents."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def default_snapshot_dir(path_to_csv):
+    """Snapshot directory used for a .csv file: `<name>.snapshot/` beside it."""
+    return os.path.splitext(path_to_csv)[0] + '.snapshot'
+
+
+def _read_meta(snapshot_dir):
+    try:
+        with open(os.path.join(snapshot_dir, 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(snapshot_dir, meta):
+    tmp = os.path.join(snapshot_dir, 'meta.json.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(meta, f, indent=1)
+    os.replace(tmp, os.path.join(snapshot_dir, 'meta.json'))
+
+
+def _raw_to_npy(raw_path, npy_path, dtype, rows, block_rows=1 << 22):
+    """Copy a raw spooled column into a .npy file, one block at a time."""
+    out = np.lib.format.open_memmap(npy_path, mode='w+', dtype=dtype, shape=(rows,))
+    with open(raw_path, 'rb') as f:
+        for start in range(0, rows, block_rows):
+            block = np.fromfile(f, dtype=dtype, count=min(block_rows, rows - start))
+            out[start:start + len(block)] = block
+    out.flush()
+    del out
+    os.remove(raw_path)
+
+
+def build_snapshot(path_to_csv, dtypes, snapshot_dir=None, dropna=False, chunk_rows=1 << 20):
+    """Parse a .csv file and write it as a columnar snapshot.
+
+    Parameters
+    ----------
+    path_to_csv : str
+        Source .csv file.
+    dtypes : dict
+        Column name -> NumPy dtype, or `str` for text columns. Only these
+        columns are kept.
+    snapshot_dir : str, optional
+        Destination directory; defaults to `default_snapshot_dir`.
+    dropna : bool
+        Drop rows with missing values before writing.
+    chunk_rows : int
+        Rows parsed at a time; numeric columns are never held in memory
+        as a whole.
+
+    Returns
+    -------
+    dict
+        The snapshot's metadata.
+
+    """
+    snapshot_dir = snapshot_dir or default_snapshot_dir(path_to_csv)
+    st = os.stat(path_to_csv)
+    sha1 = file_sha1(path_to_csv)
+    parent = os.path.dirname(os.path.abspath(snapshot_dir))
+    tmp_dir = tempfile.mkdtemp(prefix='.snapshot-', dir=parent)
+    # Stream the file: numeric columns are spooled to raw files chunk by chunk
+    raw = {name: open(os.path.join(tmp_dir, f'{name}.raw'), 'wb')
+           for name, dtype in dtypes.items() if dtype is not str}
+    text = {name: [] for name, dtype in dtypes.items() if dtype is str}
+    rows = 0
+    reader = pd.read_csv(path_to_csv, usecols=list(dtypes), chunksize=chunk_rows,
+                         dtype={c: (object if t is str else t) for c, t in dtypes.items()})
+    with reader:
+        for df in reader:
+            if dropna:
+                df = df.dropna()
+            rows += len(df)
+            for name, f in raw.items():
+                f.write(df[name].to_numpy(dtype=dtypes[name]).tobytes())
+            for name, parts in text.items():
+                parts.append(df[name].astype(str).to_numpy())
+    columns = {}
+    for name, dtype in dtypes.items():
+        if dtype is str:
+            values = np.concatenate(text.pop(name)) if rows else np.array([], dtype=object)
+            column = StringColumn.from_strings(values)
+            np.save(os.path.join(tmp_dir, f'{name}.bytes.npy'), column.encoded)
+            np.save(os.path.join(tmp_dir, f'{name}.offsets.npy'), column.offsets)
+            columns[name] = 'str'
+        else:
+            raw[name].close()
+            _raw_to_npy(os.path.join(tmp_dir, f'{name}.raw'),
+                        os.path.join(tmp_dir, f'{name}.npy'), np.dtype(dtype), rows)
+            columns[name] = np.dtype(dtype).str
+    meta = {'version': SNAPSHOT_VERSION, 'rows': rows, 'columns': columns, 'dropna': dropna,
+            'source': {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha1': sha1}}
+    _write_meta(tmp_dir, meta)
+    # Swap the new snapshot in; readers holding mmaps of the old files keep them
+    if os.path.isdir(snapshot_dir):
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+    os.replace(tmp_dir, snapshot_dir)
+    return meta
+
+
+def _is_current(meta, path_to_csv, snapshot_dir, dtypes, dropna):
+    """Whether a snapshot still matches its source file, column spec and
+    handling of missing values."""
+    if meta is None or meta.get('version') != SNAPSHOT_VERSION:
+        return False
+    if set(meta['columns']) != set(dtypes) or meta.get('dropna') != dropna:
+        return False
+    st = os.stat(path_to_csv)
+    source = meta['source']
+    if (source['size'], source['mtime_ns']) == (st.st_size, st.st_mtime_ns):
+        return True
+    # Touched but possibly unchanged: fall back to comparing content hashes
+    if source['size'] != st.st_size or file_sha1(path_to_csv) != source['sha1']:
+        return False
+    source['mtime_ns'] = st.st_mtime_ns
+    _write_meta(snapshot_dir, meta)
+    return True
+
+
+def load_snapshot(path_to_csv, dtypes, snapshot_dir=None, dropna=False, mmap=True,
+                  lazy_strings=False):
+    """Open the columnar snapshot of a .csv file, (re)building it if stale.
+
+    Parameters
+    ----------
+    path_to_csv : str
+        Source .csv file.
+    dtypes : dict
+        Column name -> NumPy dtype, or `str` for text columns.
+    snapshot_dir : str, optional
+        Snapshot directory; defaults to `default_snapshot_dir`.
+    dropna : bool
+        Drop rows with missing values when (re)building.
+    mmap : bool
+        Memory-map numeric columns instead of reading them into memory.
+    lazy_strings : bool
+        Return text columns as `StringColumn`s over the (memory-mapped)
+        snapshot buffers instead of decoding them.
+
+    Returns
+    -------
+    dict
+        Column name -> numpy.ndarray. Numeric columns are read-only
+        memory maps; text columns are decoded into object arrays, or
+        are `StringColumn`s with `lazy_strings`.
+
+    """
+    snapshot_dir = snapshot_dir or default_snapshot_dir(path_to_csv)
+    meta = _read_meta(snapshot_dir)
+    if not _is_current(meta, path_to_csv, snapshot_dir, dtypes, dropna):
+        meta = build_snapshot(path_to_csv, dtypes, snapshot_dir, dropna)
+    mode = 'r' if mmap else None
+    columns = {}
+    for name, kind in meta['columns'].items():
+        if kind == 'str':
+            encoded = np.load(os.path.join(snapshot_dir, f'{name}.bytes.npy'), mmap_mode=mode)
+            if lazy_strings:
+                offsets = np.load(os.path.join(snapshot_dir, f'{name}.offsets.npy'), mmap_mode=mode)
+                columns[name] = StringColumn(encoded, offsets)
+                continue
+            text = encoded.tobytes().decode('utf-8')
+            values = text.split(_SEP) if meta['rows'] else []
+            columns[name] = np.array(values, dtype=object)
+        else:
+            columns[name] = np.load(os.path.join(snapshot_dir, f'{name}.npy'), mmap_mode=mode)
+    return columns
+
+
+def snapshot_version(path_to_csv, snapshot_dir=None):
+    """SHA-1 of the source file behind a .csv file's snapshot ('' if none)."""
+    meta = _read_meta(snapshot_dir or default_snapshot_dir(path_to_csv))
+    return meta['source']['sha1'] if meta else ''
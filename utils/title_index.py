@@ -0,0 +1,120 @@
+"""
+
+    Bidirectional title / movieId lookup index.
+
+    Author: Explore Data Science Academy.
+
+    Description: Resolves titles to MovieLens Movie IDs, Movie IDs back
+    to titles and Movie IDs to row positions with binary searches over
+    compact sorted arrays, replacing the linear DataFrame scans previously
+    repeated inside the recommenders' inner loops. The index holds no
+    Python objects per movie: titles stay in the catalogue's memory-mapped
+    buffer and are looked up through their sorted 64-bit hashes.
+
+"""
+# Data handling dependencies
+import numpy as np
+
+from utils.snapshot import StringColumn
+
+
+class TitleIndex:
+    """Logarithmic-time lookups between titles, movie IDs and row positions.
+
+    A handful of titles occur more than once in the MovieLens catalogue
+    (remakes released in the same year, re-listings). Scalar title lookups
+    resolve to the first occurrence, matching the behaviour of the original
+    `df[df['title'] == title].index[0]` scans, while `movie_ids` returns
+    every Movie ID sharing the title.
+
+    Parameters
+    ----------
+    movie_ids : array-like (int)
+        MovieLens Movie IDs, in catalogue row order.
+    titles : StringColumn or array-like (str)
+        Movie titles aligned with `movie_ids`.
+
+    """
+
+    def __init__(self, movie_ids, titles):
+        self.ids = np.asarray(movie_ids, dtype=np.int32)
+        self.titles = titles if isinstance(titles, StringColumn) else \
+            np.asarray(titles, dtype=object)
+        # Sorted title hashes; rows sharing a hash stay in row order
+        hashes = np.fromiter((hash(t) for t in self.titles), dtype=np.int64,
+                             count=len(self.titles))
+        self._hash_order = np.argsort(hashes, kind='stable').astype(np.int32)
+        self._sorted_hashes = hashes[self._hash_order]
+        # Sorted view of the IDs for vectorized lookups
+        self._id_order = np.argsort(self.ids, kind='stable').astype(np.int32)
+        self._sorted_ids = self.ids[self._id_order]
+
+    @classmethod
+    def from_frame(cls, movies):
+        """Build the index from a movies DataFrame in its current row order."""
+        return cls(movies['movieId'].to_numpy(), movies['title'].to_numpy())
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, title):
+        return len(self._find(title)) > 0
+
+    def _find(self, title):
+        """Rows holding `title`, ascending; empty if unknown."""
+        h = hash(title)
+        lo = np.searchsorted(self._sorted_hashes, h, side='left')
+        hi = np.searchsorted(self._sorted_hashes, h, side='right')
+        return [int(r) for r in self._hash_order[lo:hi] if self.titles[r] == title]
+
+    @property
+    def duplicate_titles(self):
+        """Titles shared by more than one Movie ID."""
+        same = np.flatnonzero(self._sorted_hashes[1:] == self._sorted_hashes[:-1])
+        titles = {self.titles[self._hash_order[i]] for i in same}
+        return [t for t in titles if len(self._find(t)) > 1]
+
+    def title_rows(self, title):
+        """Row positions of every movie with the given title."""
+        rows = self._find(title)
+        if not rows:
+            raise KeyError(title)
+        return rows
+
+    def title_row(self, title):
+        """Row position of the first movie with the given title."""
+        return self.title_rows(title)[0]
+
+    def movie_id(self, title):
+        """Movie ID of the first movie with the given title."""
+        return int(self.ids[self.title_row(title)])
+
+    def movie_ids(self, title):
+        """Movie IDs of every movie with the given title."""
+        return [int(self.ids[r]) for r in self.title_rows(title)]
+
+    def row(self, movie_id):
+        """Row position of the given Movie ID."""
+        row = int(self.rows([movie_id])[0])
+        if row < 0:
+            raise KeyError(movie_id)
+        return row
+
+    def title(self, movie_id):
+        """Title of the given Movie ID."""
+        return self.titles[self.row(movie_id)]
+
+    def rows(self, movie_ids):
+        """Row positions of several Movie IDs; -1 for unknown IDs."""
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        if len(self.ids) == 0:
+            return np.full(len(movie_ids), -1, dtype=np.intp)
+        pos = np.searchsorted(self._sorted_ids, movie_ids)
+        pos[pos == len(self._sorted_ids)] = 0
+        hit = self._sorted_ids[pos] == movie_ids
+        return np.where(hit, self._id_order[pos], -1)
+
+    def titles_of(self, movie_ids):
+        """Titles of several Movie IDs, skipping unknown IDs."""
+        rows = self.rows(movie_ids)
+        return list(self.titles[rows[rows >= 0]])
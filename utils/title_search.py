@@ -0,0 +1,193 @@
+"""
+
+    Type-ahead title search over the full movie catalogue.
+
+    Author: Explore Data Science Academy.
+
+    Description: Normalizes every title (accents, case, punctuation and
+    MovieLens' trailing articles, so "Matrix, The (1999)" is found as
+    "the matrix" as well as "matrix") into a sorted key array that serves
+    as an implicit prefix trie: all titles starting with a query are one
+    contiguous range found by binary search. A trigram index catches
+    typos and matches inside titles when the prefix range is too small.
+    Matches are ranked by popularity, so a query is answered without
+    scanning the catalogue and the page never has to ship the whole
+    title list to a widget.
+
+"""
+# Script dependencies
+import bisect
+import re
+import unicodedata
+
+import numpy as np
+
+from utils.snapshot import StringColumn
+
+# Articles MovieLens moves to the end of a title: "Matrix, The (1999)"
+_TRAILING_ARTICLE = re.compile(
+    r"^(?P<body>.+?), (?P<article>the|a|an|la|le|les|l'|el|il|lo|los|las|die|der|das|den|det)"
+    r"(?P<rest>\s*\(.*\))?\s*$", re.IGNORECASE)
+_LEADING_ARTICLE = re.compile(r"^(?:the|a|an|la|le|les|l|el|il|lo|los|las|die|der|das|den|det) ")
+_NON_WORD = re.compile(r'[\W_]+')
+_YEAR = re.compile(r' \d{4}(?: \d{4})?$')
+# Sorts after every other character, closing a prefix range
+_MAX_CHAR = chr(0x10FFFF)
+
+
+def normalize(text):
+    """Lower-case, accent-free, punctuation-free form of a title or query.
+
+    A trailing article is moved to the front, e.g. 'Matrix, The (1999)'
+    becomes 'the matrix 1999'.
+
+    """
+    match = _TRAILING_ARTICLE.match(text.strip())
+    if match:
+        text = f"{match.group('article')} {match.group('body')}{match.group('rest') or ''}"
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return _NON_WORD.sub(' ', text.lower()).strip()
+
+
+def trigrams(text):
+    """Set of character trigrams of a normalized string, padded with spaces."""
+    padded = f' {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TitleSearch:
+    """Prefix and typo-tolerant search over movie titles.
+
+    Parameters
+    ----------
+    titles : StringColumn or sequence (str)
+        Titles, e.g. the output of `load_movie_titles`.
+    popularity : array-like (float), optional
+        Ranking weight of each title (e.g. its number of ratings);
+        higher comes first.
+
+    """
+
+    def __init__(self, titles, popularity=None):
+        self.titles = titles
+        n = len(titles)
+        self.popularity = np.zeros(n, dtype=np.float32) if popularity is None else \
+            np.asarray(popularity, dtype=np.float32)
+        # Rows from most to least popular (ties by row) and each row's rank
+        self._by_popularity = np.lexsort((np.arange(n), -self.popularity)).astype(np.int32)
+        self._rank = np.empty(n, dtype=np.int32)
+        self._rank[self._by_popularity] = np.arange(n, dtype=np.int32)
+        keys, rows = [], []
+        gram_ids, gram_rows, gram_cols = {}, [], []
+        self._gram_counts = np.zeros(n, dtype=np.uint16)
+        for row, title in enumerate(titles):
+            key = normalize(title)
+            bare = _LEADING_ARTICLE.sub('', key)
+            keys.append(key)
+            rows.append(row)
+            if bare != key:
+                keys.append(bare)
+                rows.append(row)
+            # Release years would dilute the similarity of typed titles
+            grams = trigrams(_YEAR.sub('', bare))
+            self._gram_counts[row] = len(grams)
+            for gram in grams:
+                gram_rows.append(gram_ids.setdefault(gram, len(gram_ids)))
+                gram_cols.append(row)
+        # Prefix index: sorted normalized keys and the row of each key
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self._keys = StringColumn.from_strings([keys[i] for i in order])
+        self._key_rows = np.asarray(rows, dtype=np.int32)[order]
+        self._key_ranks = self._rank[self._key_rows]
+        # Trigram index: CSR-style posting lists of rows per trigram
+        self._gram_ids = gram_ids
+        gram_rows = np.asarray(gram_rows, dtype=np.int32)
+        gram_order = np.argsort(gram_rows, kind='stable')
+        self._postings = np.asarray(gram_cols, dtype=np.int32)[gram_order]
+        self._indptr = np.zeros(len(gram_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(gram_rows, minlength=len(gram_ids)), out=self._indptr[1:])
+
+    def __len__(self):
+        return len(self.popularity)
+
+    def _most_popular(self, ranks, limit):
+        """Rows of up to `limit` distinct popularity ranks, most popular first."""
+        # A row appears at most twice (with and without its article)
+        if len(ranks) > 2 * limit:
+            ranks = ranks[np.argpartition(ranks, 2 * limit - 1)[:2 * limit]]
+        return self._by_popularity[np.unique(ranks)[:limit]]
+
+    def prefix_rows(self, query, limit=10):
+        """Rows of the most popular titles starting with the query.
+
+        Titles whose article was moved to the end match with or without
+        the article, e.g. 'matrix' and 'the matrix'.
+
+        """
+        key = normalize(query)
+        lo = bisect.bisect_left(self._keys, key)
+        hi = bisect.bisect_left(self._keys, key + _MAX_CHAR, lo)
+        return self._most_popular(self._key_ranks[lo:hi], limit)
+
+    def fuzzy_rows(self, query, limit=10, min_similarity=0.3):
+        """Rows of the titles sharing the most trigrams with the query.
+
+        Similarity is the Dice coefficient of the trigram sets; ties are
+        broken by popularity.
+
+        Returns
+        -------
+        tuple (numpy.ndarray, numpy.ndarray)
+            Rows and their similarity, best first.
+
+        """
+        query_grams = trigrams(_LEADING_ARTICLE.sub('', normalize(query)))
+        grams = [self._gram_ids[g] for g in query_grams if g in self._gram_ids]
+        if not grams:
+            return np.array([], dtype=np.int32), np.array([], dtype=np.float32)
+        hits = np.concatenate([self._postings[self._indptr[g]:self._indptr[g + 1]] for g in grams])
+        # Linear-time counting: posting lists of common trigrams are long
+        shared = np.bincount(hits, minlength=len(self))
+        # Titles sharing too few trigrams cannot reach `min_similarity`
+        rows = np.flatnonzero(shared >= min_similarity * len(query_grams) / 2)
+        shared = shared[rows]
+        similarity = 2 * shared / (len(query_grams) + self._gram_counts[rows]).astype(np.float32)
+        keep = similarity >= min_similarity
+        if keep.sum() > limit:
+            # Only the best `limit` similarities (and ties) need sorting
+            kth = -np.partition(-similarity[keep], limit - 1)[limit - 1]
+            keep &= similarity >= kth
+        rows, similarity = rows[keep], similarity[keep]
+        order = np.lexsort((self._rank[rows], -similarity))[:limit]
+        return rows[order], similarity[order]
+
+    def search_rows(self, query, limit=10):
+        """Prefix matches, topped up with fuzzy matches when there are too few."""
+        if not query.strip():
+            return self._by_popularity[:limit]
+        rows = self.prefix_rows(query, limit)
+        if len(rows) < limit:
+            fuzzy, _ = self.fuzzy_rows(query, limit + len(rows))
+            rows = np.concatenate([rows, fuzzy[~np.isin(fuzzy, rows)]])[:limit]
+        return rows
+
+    def search(self, query, limit=10):
+        """Titles best matching a type-ahead query.
+
+        Parameters
+        ----------
+        query : str
+            What the user typed so far; may be misspelt, and may put
+            articles either first ('the matrix') or last ('matrix, the').
+        limit : int
+            Maximum number of titles returned.
+
+        Returns
+        -------
+        list (str)
+            Matching titles: prefix matches by popularity, then fuzzy
+            matches by similarity.
+
+        """
+        return [self.titles[int(r)] for r in self.search_rows(query, limit)]
@@ -0,0 +1,211 @@
+"""
+
+    Lightweight per-request, per-stage timing instrumentation.
+
+    Author: Explore Data Science Academy.
+
+    Description: Records how long each stage of a recommendation request
+    takes (preprocessing, candidate filtering, model scoring, similarity,
+    ranking), how many rows it produced, and whether the request failed,
+    plus one-off data and model load times. Completed requests are kept in
+    a bounded in-memory ring buffer for the app's Diagnostics page. The
+    cost per stage is two `perf_counter` calls and a tuple append, so
+    tracing can stay enabled in production.
+
+"""
+# Script dependencies
+import functools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+from utils.executor import check_cancelled
+
+# Set RECOMMENDER_TRACING=0 to turn recording off entirely
+TRACING_ENABLED = os.environ.get('RECOMMENDER_TRACING', '1') != '0'
+
+
+class StageHandle:
+    """Handle yielded by `Tracer.stage`; set `rows` to record a row count."""
+
+    __slots__ = ('rows',)
+
+    def __init__(self):
+        self.rows = None
+
+
+class RequestTrace:
+    """Timings of a single traced request.
+
+    Attributes
+    ----------
+    name : str
+        Traced operation, e.g. 'content_model'.
+    started : float
+        Wall-clock start time (seconds since the epoch).
+    duration : float
+        Total duration in seconds.
+    stages : list (tuple)
+        (stage name, duration in seconds, row count or None) in call order.
+    error : str or None
+        Exception raised by the request, if any.
+    tags : dict
+        Free-form request attributes (e.g. top_n).
+
+    """
+
+    __slots__ = ('name', 'started', 'duration', 'stages', 'error', 'tags')
+
+    def __init__(self, name, tags):
+        self.name = name
+        self.started = time.time()
+        self.duration = 0.0
+        self.stages = []
+        self.error = None
+        self.tags = tags
+
+    def as_dict(self):
+        """Flat summary, suitable for a DataFrame row."""
+        summary = {'request': self.name,
+                   'started': time.strftime('%H:%M:%S', time.localtime(self.started)),
+                   'total_ms': round(self.duration * 1000, 2), 'error': self.error or ''}
+        for stage, seconds, rows in self.stages:
+            summary[f'{stage}_ms'] = round(seconds * 1000, 2)
+            if rows is not None:
+                summary[f'{stage}_rows'] = rows
+        summary.update(self.tags)
+        return summary
+
+
+class Tracer:
+    """Collects request traces and load timings for the whole process.
+
+    Parameters
+    ----------
+    maxlen : int
+        Number of most recent requests kept.
+
+    """
+
+    def __init__(self, maxlen=1000):
+        self.requests = deque(maxlen=maxlen)
+        self.loads = {}
+        self._local = threading.local()
+
+    @contextmanager
+    def request(self, name, **tags):
+        """Trace one request; nested requests are recorded as stages."""
+        if not TRACING_ENABLED or getattr(self._local, 'muted', False):
+            yield None
+            return
+        parent = getattr(self._local, 'current', None)
+        if parent is not None:
+            with self.stage(name) as handle:
+                yield parent
+            return
+        trace = RequestTrace(name, tags)
+        self._local.current = trace
+        start = time.perf_counter()
+        try:
+            yield trace
+        except BaseException as e:
+            trace.error = f'{type(e).__name__}: {e}'
+            raise
+        finally:
+            trace.duration = time.perf_counter() - start
+            self._local.current = None
+            self.requests.append(trace)
+
+    @contextmanager
+    def stage(self, name):
+        """Time one stage of the current request.
+
+        Yields a `StageHandle`; assign its `rows` attribute to record how
+        many rows (candidates, users, ...) the stage produced. Outside a
+        traced request this is a no-op. Stages double as cancellation
+        checkpoints: entering one raises `utils.executor.Cancelled` if the
+        request running on this thread was cancelled.
+
+        """
+        check_cancelled()
+        handle = StageHandle()
+        trace = getattr(self._local, 'current', None)
+        if trace is None:
+            yield handle
+            return
+        start = time.perf_counter()
+        try:
+            yield handle
+        finally:
+            trace.stages.append((name, time.perf_counter() - start, handle.rows))
+
+    @contextmanager
+    def muted(self):
+        """Suspend request tracing on this thread (e.g. for background work)."""
+        self._local.muted = True
+        try:
+            yield
+        finally:
+            self._local.muted = False
+
+    @contextmanager
+    def load(self, name):
+        """Time a one-off data or model load."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.loads[name] = time.perf_counter() - start
+
+    def recent(self, name=None, window=None):
+        """Most recent traces, oldest first, optionally for one request name."""
+        traces = [t for t in list(self.requests) if name is None or t.name == name]
+        return traces[-window:] if window else traces
+
+    def stage_durations(self, name=None, window=None):
+        """Recent durations in milliseconds per stage (plus 'total')."""
+        durations = {}
+        for trace in self.recent(name, window):
+            durations.setdefault('total', []).append(trace.duration * 1000)
+            for stage, seconds, _ in trace.stages:
+                durations.setdefault(stage, []).append(seconds * 1000)
+        return {stage: np.asarray(values) for stage, values in durations.items()}
+
+    def histogram(self, stage, name=None, window=None, bins=20):
+        """Histogram (counts, bin edges in ms) of a stage's recent durations."""
+        values = self.stage_durations(name, window).get(stage, np.array([]))
+        if len(values) == 0:
+            return np.array([], dtype=int), np.array([])
+        return np.histogram(values, bins=bins)
+
+    def slowest(self, n=10, name=None, window=None):
+        """The `n` slowest recent traces, slowest first."""
+        return sorted(self.recent(name, window), key=lambda t: t.duration, reverse=True)[:n]
+
+    def errors(self, n=10):
+        """The `n` most recent failed traces, newest first."""
+        return [t for t in reversed(list(self.requests)) if t.error][:n]
+
+    def clear(self):
+        self.requests.clear()
+
+
+# Process-wide tracer shared by the recommenders and the app
+TRACER = Tracer()
+stage = TRACER.stage
+load = TRACER.load
+
+
+def traced(name):
+    """Decorator tracing every call of a function as one request."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with TRACER.request(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator